@@ -0,0 +1,154 @@
+"""
+Activity Tracker
+Coalesced write-behind for users.last_activity and users.last_login
+
+Requests only record a touch in memory. A background thread per web worker
+flushes everything recorded since the previous flush as one
+UPDATE ... FROM (VALUES ...) statement every ACTIVITY_FLUSH_INTERVAL seconds,
+so presence data lags by at most that interval and a busy worker writes one
+statement instead of one row update per request.
+
+The UPDATE goes around the ORM on purpose: updated_at is left alone (a page
+view is not an edit) and cached current users are not evicted.
+"""
+
+from datetime import datetime
+from models import db
+from sqlalchemy import text
+import atexit
+import os
+import threading
+
+
+class ActivityTracker:
+    """Buffers activity per user and flushes it in batches"""
+
+    def __init__(self, interval=5, max_batch=1000):
+        self.interval = interval
+        self.max_batch = max_batch
+        self.app = None
+        self._pending = {}          # user_id -> [last_activity, last_login or None]
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        self.stats = {'touches': 0, 'flushes': 0, 'rows_written': 0, 'errors': 0}
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('ACTIVITY_FLUSH_INTERVAL', self.interval)
+        atexit.register(self.flush)
+
+    # ---- recording ---------------------------------------------------------
+
+    def touch(self, user_id, login=False, at=None):
+        """Record activity (and optionally a login) for a user"""
+        if not user_id:
+            return
+        at = at or datetime.utcnow()
+        with self._lock:
+            entry = self._pending.get(user_id)
+            if entry is None:
+                self._pending[user_id] = [at, at if login else None]
+            else:
+                entry[0] = max(entry[0], at)
+                if login:
+                    entry[1] = max(entry[1] or at, at)
+            self.stats['touches'] += 1
+        self._ensure_thread()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    # ---- flushing ----------------------------------------------------------
+
+    def _ensure_thread(self):
+        """Start the flusher in this process (gunicorn forks after import)"""
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._run, name='activity-flusher', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Write all buffered activity
+
+        Returns:
+            Number of users updated
+        """
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+
+        # In user_id order, so workers flushing overlapping users lock them in the same order
+        items = sorted(batch.items())
+        written = 0
+        try:
+            with self.app.app_context():
+                for start in range(0, len(items), self.max_batch):
+                    written += self._write(items[start:start + self.max_batch])
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += written
+        except Exception as e:
+            print(f"✗ Error flushing user activity: {e}")
+            self.stats['errors'] += 1
+            self._requeue(batch)
+        return written
+
+    def _write(self, items):
+        values = []
+        params = {}
+        for i, (user_id, (last_activity, last_login)) in enumerate(items):
+            values.append(f"(CAST(:id{i} AS integer), CAST(:a{i} AS timestamp), CAST(:l{i} AS timestamp))")
+            params[f'id{i}'] = user_id
+            params[f'a{i}'] = last_activity
+            params[f'l{i}'] = last_login
+
+        # GREATEST/COALESCE keep a newer value another worker already wrote.
+        # The rows are locked in id order first: UPDATE ... FROM visits them in
+        # whatever order the join plan picks, which could deadlock another flush.
+        sql = text(f"""
+            WITH v(id, last_activity, last_login) AS (VALUES {', '.join(values)}),
+            locked AS (
+                SELECT u.id FROM users u JOIN v ON v.id = u.id
+                ORDER BY u.id
+                FOR UPDATE OF u
+            )
+            UPDATE users AS u SET
+                last_activity = GREATEST(u.last_activity, v.last_activity),
+                last_login = CASE WHEN v.last_login IS NULL THEN u.last_login
+                                  ELSE GREATEST(u.last_login, v.last_login) END
+            FROM v
+            WHERE u.id = v.id AND u.id IN (SELECT id FROM locked)
+        """)
+        with db.engine.begin() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def _requeue(self, batch):
+        """Put a failed batch back, keeping the newest timestamps"""
+        with self._lock:
+            for user_id, (last_activity, last_login) in batch.items():
+                entry = self._pending.get(user_id)
+                if entry is None:
+                    self._pending[user_id] = [last_activity, last_login]
+                else:
+                    entry[0] = max(entry[0], last_activity)
+                    if last_login:
+                        entry[1] = max(entry[1] or last_login, last_login)
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, 'pending': len(self._pending), 'interval': self.interval}
+
+
+tracker = ActivityTracker()
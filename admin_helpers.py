@@ -5,8 +5,13 @@ Allows dynamic management of fields, entities, and system configuration
 
 from models import (
     db, CustomEntityType, CustomEntity, SystemConfiguration,
-    QuestionPool, Question, Role, User, Department
+    QuestionPool, Question, Role, User, Department, Survey
 )
+from custom_fields_query import (
+    CUSTOM_FIELD_MODELS, SEARCHABLE_FIELDS_CONFIG_KEY,
+    validate_field_name, build_custom_field_index_in_background, drop_custom_field_index
+)
+import stats_service
 from datetime import datetime
 import json
 
@@ -296,6 +301,73 @@ def add_custom_field_to_question_pool(pool_id, field_name, field_config):
         return 0
 
 
+def mark_custom_field_searchable(model_name, field_name, modified_by_id=None):
+    """
+    Mark a custom field as searchable and start building its GIN index
+    
+    The index is built in the background; filtering on the field works
+    (without it) in the meantime.
+    
+    Args:
+        model_name: Key of CUSTOM_FIELD_MODELS (e.g. 'checklist_submission')
+        field_name: Top-level custom field name
+        modified_by_id: User ID making the change
+    
+    Returns:
+        Name of the index or None if error
+    """
+    try:
+        model = CUSTOM_FIELD_MODELS.get(model_name)
+        if not model:
+            print(f"✗ Unknown model '{model_name}'")
+            return None
+        
+        validate_field_name(field_name)
+        
+        searchable = dict(get_config(SEARCHABLE_FIELDS_CONFIG_KEY, {}) or {})
+        fields = set(searchable.get(model_name, []))
+        fields.add(field_name)
+        searchable[model_name] = sorted(fields)
+        
+        set_config(
+            SEARCHABLE_FIELDS_CONFIG_KEY, searchable, modified_by_id=modified_by_id,
+            description='Custom fields with a jsonb_path_ops GIN index, by model',
+            category='search', data_type='json'
+        )
+        
+        index_name = build_custom_field_index_in_background(model, field_name)
+        print(f"✓ Custom field '{field_name}' on {model_name} is searchable ({index_name} building)")
+        return index_name
+        
+    except Exception as e:
+        print(f"✗ Error marking field searchable: {e}")
+        db.session.rollback()
+        return None
+
+
+def unmark_custom_field_searchable(model_name, field_name, modified_by_id=None):
+    """Stop indexing a custom field and drop its GIN index"""
+    try:
+        model = CUSTOM_FIELD_MODELS.get(model_name)
+        if not model:
+            print(f"✗ Unknown model '{model_name}'")
+            return False
+        
+        searchable = dict(get_config(SEARCHABLE_FIELDS_CONFIG_KEY, {}) or {})
+        searchable[model_name] = [f for f in searchable.get(model_name, []) if f != field_name]
+        set_config(SEARCHABLE_FIELDS_CONFIG_KEY, searchable, modified_by_id=modified_by_id,
+                   category='search', data_type='json')
+        
+        drop_custom_field_index(model, field_name)
+        print(f"✓ Custom field '{field_name}' on {model_name} is no longer searchable")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Error unmarking searchable field: {e}")
+        db.session.rollback()
+        return False
+
+
 # ============================================================================
 # ROLE & PERMISSION MANAGEMENT
 # ============================================================================
@@ -360,48 +432,13 @@ def add_permission_to_role(role_id, permission_key, value=True):
 # ============================================================================
 
 def get_hierarchy_stats():
-    """Get statistics about organizational hierarchy"""
-    stats = {
-        'total_users': User.query.filter_by(is_deleted=False).count(),
-        'active_users': User.query.filter_by(is_deleted=False, is_active=True).count(),
-        'total_departments': Department.query.filter_by(is_deleted=False).count(),
-        'active_departments': Department.query.filter_by(is_deleted=False, is_active=True).count(),
-        'users_by_role': {}
-    }
-    
-    # Users by role
-    roles = Role.query.all()
-    for role in roles:
-        count = User.query.filter_by(role_id=role.id, is_deleted=False).count()
-        stats['users_by_role'][role.display_name] = count
-    
-    return stats
+    """Get statistics about organizational hierarchy (cached, see stats_service.py)"""
+    return stats_service.get_hierarchy_stats()
 
 
 def get_activity_summary(days=30):
-    """Get activity summary for recent days"""
-    from datetime import timedelta
-    from sqlalchemy import func
-    
-    since_date = datetime.utcnow() - timedelta(days=days)
-    
-    summary = {
-        'survey_responses': db.session.query(func.count()).select_from(SurveyResponse).filter(
-            SurveyResponse.created_at >= since_date
-        ).scalar(),
-        'checklist_submissions': db.session.query(func.count()).select_from(ChecklistSubmission).filter(
-            ChecklistSubmission.created_at >= since_date
-        ).scalar(),
-        'messages_sent': db.session.query(func.count()).select_from(Message).filter(
-            Message.created_at >= since_date,
-            Message.is_deleted == False
-        ).scalar(),
-        'location_updates': db.session.query(func.count()).select_from(UserLocation).filter(
-            UserLocation.created_at >= since_date
-        ).scalar(),
-    }
-    
-    return summary
+    """Get activity summary for recent days (cached, see stats_service.py)"""
+    return stats_service.get_activity_summary(days)
 
 
 # ============================================================================
@@ -0,0 +1,390 @@
+"""
+Columnar Analytics Export
+Flattens checklist submissions and survey answers into typed columns and writes
+them as month-partitioned Parquet files for offline analysis (pandas, Arrow, DuckDB)
+
+Layout of the export directory:
+    <export_dir>/submission_month=2026-10/part-checklist-<first id>-<last id>.parquet
+    <export_dir>/submission_month=2026-10/part-survey-<first id>-<last id>.parquet
+    <export_dir>/_export_state.json   (high-water marks for incremental runs)
+
+Each run only reads submissions with an id above the stored high-water mark and
+appends new part files, so existing files are never rewritten. Rows are written
+out every flush_rows rows (at a submission boundary) and the high-water mark is
+saved after each flush, so memory stays bounded on a first run or a backfill
+and an interrupted run resumes where it stopped.
+
+Ids are assigned at insert, not at commit, so a submission can become visible
+after one with a higher id. Each run stops at the newest submission created
+more than settle_seconds ago and moves the high-water mark there, also past
+submissions without answers; a transaction that stays open longer than that
+can still be passed over by the high-water mark.
+
+Checklist answers only store the question text. question_id is filled in when
+exactly one live question has that text (as answer_stats matches them) and
+left empty when none or several do.
+"""
+
+from models import (
+    db, User, Department, ChecklistSubmission,
+    SurveyResponse, SurveyAnswer, Question, UserLocation
+)
+from sqlalchemy import func, select
+from datetime import datetime, timedelta
+import pyarrow as pa
+import pyarrow.parquet as pq
+import json
+import os
+
+
+STATE_FILE = '_export_state.json'
+
+ANSWER_SCHEMA = pa.schema([
+    ('source', pa.string()),
+    ('submission_id', pa.int64()),
+    ('submission_uuid', pa.string()),
+    ('user_id', pa.int64()),
+    ('company_number', pa.string()),
+    ('username', pa.string()),
+    ('department_id', pa.int64()),
+    ('department', pa.string()),
+    ('question_id', pa.int64()),
+    ('question', pa.string()),
+    ('answer', pa.string()),
+    ('answer_number', pa.float64()),
+    ('reason', pa.string()),
+    ('status', pa.string()),
+    ('latitude', pa.float64()),
+    ('longitude', pa.float64()),
+    ('submission_date', pa.timestamp('us')),
+    ('created_at', pa.timestamp('us')),
+])
+
+
+# ============================================================================
+# STATE
+# ============================================================================
+
+def load_export_state(export_dir):
+    """Read the high-water marks of the previous run"""
+    path = os.path.join(export_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {'checklist_submission_id': 0, 'survey_response_id': 0}
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_export_state(export_dir, state):
+    """Atomically replace the state file so an interrupted run never corrupts it"""
+    path = os.path.join(export_dir, STATE_FILE)
+    tmp_path = path + '.tmp'
+
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+
+    os.replace(tmp_path, path)
+
+
+# ============================================================================
+# ROW FLATTENING
+# ============================================================================
+
+def _to_float(value):
+    """Best-effort numeric conversion for answers stored as text"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _answer_to_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+class _PartitionBuffer:
+    """Accumulates flattened rows per month as column lists"""
+
+    def __init__(self):
+        self.partitions = {}
+        self.rows = 0
+
+    def append(self, row):
+        month = row['submission_date'].strftime('%Y-%m')
+        columns = self.partitions.get(month)
+        if columns is None:
+            columns = {name: [] for name in ANSWER_SCHEMA.names}
+            self.partitions[month] = columns
+
+        for name in ANSWER_SCHEMA.names:
+            columns[name].append(row.get(name))
+        self.rows += 1
+
+    def write(self, export_dir, source, first_id, last_id, compression):
+        """Write one part file per month and return the number of rows written"""
+        written = 0
+        for month, columns in self.partitions.items():
+            partition_dir = os.path.join(export_dir, f'submission_month={month}')
+            os.makedirs(partition_dir, exist_ok=True)
+
+            table = pa.Table.from_pydict(columns, schema=ANSWER_SCHEMA)
+            path = os.path.join(partition_dir, f'part-{source}-{first_id}-{last_id}.parquet')
+            pq.write_table(table, path, compression=compression)
+            written += table.num_rows
+
+        self.partitions = {}
+        self.rows = 0
+        return written
+
+
+class _QuestionIds:
+    """Question text -> id of the one live question with that text, else None"""
+
+    def __init__(self):
+        self.ids = {}
+
+    def __call__(self, question_text):
+        if question_text not in self.ids:
+            ids = db.session.execute(
+                select(Question.id).where(
+                    Question.question_text == question_text,
+                    Question.is_deleted == False
+                ).limit(2)
+            ).scalars().all()
+            self.ids[question_text] = ids[0] if len(ids) == 1 else None
+        return self.ids[question_text]
+
+
+def _iter_checklist_rows(after_id, end_id, batch_size):
+    """Yield flattened answer rows for checklist submissions with after_id < id <= end_id"""
+    question_ids = _QuestionIds()
+    query = db.session.query(
+        ChecklistSubmission.id,
+        ChecklistSubmission.uuid,
+        ChecklistSubmission.user_id,
+        User.company_number,
+        User.username,
+        ChecklistSubmission.department_id_at_submission,
+        Department.name,
+        ChecklistSubmission.status,
+        ChecklistSubmission.submission_date,
+        ChecklistSubmission.created_at,
+        ChecklistSubmission.custom_fields
+    ).outerjoin(
+        User, User.id == ChecklistSubmission.user_id
+    ).outerjoin(
+        Department, Department.id == ChecklistSubmission.department_id_at_submission
+    ).filter(
+        ChecklistSubmission.id > after_id,
+        ChecklistSubmission.id <= end_id
+    ).order_by(ChecklistSubmission.id).yield_per(batch_size)
+
+    for (submission_id, submission_uuid, user_id, company_number, username,
+         department_id, department, status, submission_date, created_at, custom_fields) in query:
+        custom_fields = custom_fields or {}
+        location = custom_fields.get('location') or {}
+        if isinstance(location, list):
+            location = location[0] if location else {}
+
+        base = {
+            'source': 'checklist',
+            'submission_id': submission_id,
+            'submission_uuid': str(submission_uuid),
+            'user_id': user_id,
+            'company_number': company_number,
+            'username': username,
+            'department_id': department_id,
+            'department': department,
+            'status': status,
+            'latitude': _to_float(location.get('latitude')),
+            'longitude': _to_float(location.get('longitude')),
+            'submission_date': submission_date,
+            'created_at': created_at,
+        }
+
+        for answer in custom_fields.get('answers') or []:
+            value = answer.get('answer')
+            row = dict(base)
+            row['question_id'] = question_ids(answer.get('question'))
+            row['question'] = answer.get('question')
+            row['answer'] = _answer_to_text(value)
+            row['answer_number'] = _to_float(value)
+            row['reason'] = answer.get('reason')
+            yield row
+
+
+def _iter_survey_rows(after_id, end_id, batch_size):
+    """Yield flattened answer rows for survey responses with after_id < id <= end_id"""
+    query = db.session.query(
+        SurveyResponse.id,
+        SurveyResponse.uuid,
+        SurveyResponse.user_id,
+        User.company_number,
+        User.username,
+        SurveyResponse.department_id_at_submission,
+        Department.name,
+        SurveyResponse.status,
+        SurveyResponse.submission_date,
+        SurveyResponse.created_at,
+        UserLocation.latitude,
+        UserLocation.longitude,
+        SurveyAnswer.question_id,
+        Question.question_text,
+        SurveyAnswer.answer_text,
+        SurveyAnswer.answer_number,
+        SurveyAnswer.answer_json
+    ).join(
+        SurveyAnswer, SurveyAnswer.response_id == SurveyResponse.id
+    ).join(
+        Question, Question.id == SurveyAnswer.question_id
+    ).outerjoin(
+        User, User.id == SurveyResponse.user_id
+    ).outerjoin(
+        Department, Department.id == SurveyResponse.department_id_at_submission
+    ).outerjoin(
+        UserLocation, UserLocation.id == SurveyResponse.location_id
+    ).filter(
+        SurveyResponse.id > after_id,
+        SurveyResponse.id <= end_id
+    ).order_by(SurveyResponse.id, SurveyAnswer.id).yield_per(batch_size)
+
+    for (response_id, response_uuid, user_id, company_number, username,
+         department_id, department, status, submission_date, created_at,
+         latitude, longitude, question_id, question_text,
+         answer_text, answer_number, answer_json) in query:
+        yield {
+            'source': 'survey',
+            'submission_id': response_id,
+            'submission_uuid': str(response_uuid),
+            'user_id': user_id,
+            'company_number': company_number,
+            'username': username,
+            'department_id': department_id,
+            'department': department,
+            'question_id': question_id,
+            'question': question_text,
+            'answer': answer_text if answer_text is not None else _answer_to_text(answer_json),
+            'answer_number': float(answer_number) if answer_number is not None else _to_float(answer_text),
+            'reason': None,
+            'status': status,
+            'latitude': _to_float(latitude),
+            'longitude': _to_float(longitude),
+            'submission_date': submission_date,
+            'created_at': created_at,
+        }
+
+
+# ============================================================================
+# EXPORT JOB
+# ============================================================================
+
+def _export_end_id(model, after_id, created_before):
+    """Newest id above after_id created before the settle cutoff, or None"""
+    return db.session.execute(
+        select(func.max(model.id)).where(model.id > after_id, model.created_at < created_before)
+    ).scalar()
+
+
+def _export_source(export_dir, source, rows, state, state_key, end_id, flush_rows, compression):
+    """
+    Write rows of one source as part files of about flush_rows rows each
+
+    A part file always ends at a submission boundary, and the high-water mark
+    in state is saved after every file, so the next run (or a restarted one)
+    continues after the last submission written. Once all rows are written
+    the mark moves to end_id, past trailing submissions without answers.
+    """
+    buffer = _PartitionBuffer()
+    first_id = last_id = None
+    written = 0
+
+    def flush():
+        nonlocal first_id, written
+        written += buffer.write(export_dir, source, first_id, last_id, compression)
+        state[state_key] = last_id
+        save_export_state(export_dir, state)
+        first_id = None
+
+    for row in rows:
+        submission_id = row['submission_id']
+        if submission_id != last_id and buffer.rows >= flush_rows:
+            flush()
+        if first_id is None:
+            first_id = submission_id
+        last_id = submission_id
+        buffer.append(row)
+
+    if buffer.rows:
+        flush()
+    if state[state_key] != end_id:
+        state[state_key] = end_id
+        save_export_state(export_dir, state)
+    return written
+
+
+def export_answers_to_parquet(export_dir, batch_size=1000, flush_rows=100000, settle_seconds=300,
+                              compression='zstd'):
+    """
+    Append all submissions newer than the previous run to the Parquet export
+
+    Args:
+        export_dir: Root directory of the partitioned dataset
+        batch_size: Rows fetched per database round-trip
+        flush_rows: Rows buffered in memory before a part file is written
+        settle_seconds: Only export submissions created at least this long ago
+        compression: Parquet compression codec
+
+    Returns:
+        Dict with rows written per source and the new high-water marks
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    state = load_export_state(export_dir)
+    created_before = datetime.utcnow() - timedelta(seconds=settle_seconds)
+
+    sources = (
+        ('checklist', ChecklistSubmission, _iter_checklist_rows, 'checklist_submission_id'),
+        ('survey', SurveyResponse, _iter_survey_rows, 'survey_response_id'),
+    )
+    written = {}
+    for source, model, iter_rows, state_key in sources:
+        end_id = _export_end_id(model, state[state_key], created_before)
+        if end_id is None:
+            written[source] = 0
+            continue
+        written[source] = _export_source(
+            export_dir, source, iter_rows(state[state_key], end_id, batch_size),
+            state, state_key, end_id, flush_rows, compression
+        )
+    checklist_rows, survey_rows = written['checklist'], written['survey']
+
+    state['exported_at'] = datetime.utcnow().isoformat()
+    save_export_state(export_dir, state)
+
+    print(f"✓ Exported {checklist_rows} checklist answers and {survey_rows} survey answers to {export_dir}")
+
+    return {
+        'checklist_rows': checklist_rows,
+        'survey_rows': survey_rows,
+        'state': state,
+    }
+
+
+# ============================================================================
+# MAIN EXECUTION
+# ============================================================================
+
+if __name__ == '__main__':
+    from app import app
+    import sys
+
+    with app.app_context():
+        target_dir = sys.argv[1] if len(sys.argv) > 1 else app.config['ANALYTICS_EXPORT_DIR']
+        export_answers_to_parquet(
+            target_dir,
+            flush_rows=app.config['ANALYTICS_EXPORT_FLUSH_ROWS'],
+            settle_seconds=app.config['ANALYTICS_EXPORT_SETTLE_SECONDS']
+        )
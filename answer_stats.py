@@ -0,0 +1,353 @@
+"""
+Per-Question Answer Statistics
+Loads every answer for a set of questions as NumPy arrays and computes counts,
+yes/no ratios, numeric distributions, option frequencies and per-department
+breakdowns in batch
+
+Answers are gathered from all three places they can live:
+    - survey_answers typed columns (answer_number / answer_text / answer_json)
+    - checklist_item_responses.is_checked for checklist items created from the question
+    - the answers list inside checklist_submissions.custom_fields (matched by question text)
+
+Results are cached per question set and department scope and keyed by the
+highest submission ids they were computed from, so repeated dashboard loads
+cost one tiny query. On a miss the submission blobs are narrowed to those
+containing one of the question texts through the GIN index on their
+question lists, instead of unnesting every submission.
+"""
+
+from models import db, Question
+from sqlalchemy import text
+from collections import OrderedDict
+import numpy as np
+import threading
+import json
+
+
+YES_VALUES = {'yes', 'y', 'true', '1', 'checked', 'pass'}
+NO_VALUES = {'no', 'n', 'false', '0', 'unchecked', 'fail'}
+NUMERIC_TYPES = {'number', 'rating'}
+
+PERCENTILES = [5, 25, 50, 75, 95]
+HISTOGRAM_BINS = 10
+TOP_OPTIONS = 20
+CACHE_SIZE = 128
+MAX_QUESTIONS = 50
+
+NO_DEPARTMENT = -1
+
+
+# ============================================================================
+# LOADING
+# ============================================================================
+
+_SURVEY_ANSWERS_SQL = text("""
+    SELECT sa.question_id, r.department_id_at_submission,
+           sa.answer_number, sa.answer_text, sa.answer_json
+    FROM survey_answers sa
+    JOIN survey_responses r ON r.id = sa.response_id
+    WHERE sa.question_id = ANY(:question_ids)
+      AND (CAST(:department_ids AS integer[]) IS NULL OR r.department_id_at_submission = ANY(:department_ids))
+""")
+
+_ITEM_RESPONSES_SQL = text("""
+    SELECT i.title, s.department_id_at_submission, ir.is_checked
+    FROM checklist_item_responses ir
+    JOIN checklist_items i ON i.id = ir.item_id
+    JOIN checklist_submissions s ON s.id = ir.submission_id
+    WHERE i.title = ANY(:question_texts)
+      AND (CAST(:department_ids AS integer[]) IS NULL OR s.department_id_at_submission = ANY(:department_ids))
+""")
+
+_BLOB_ANSWERS_SQL = text("""
+    SELECT answer ->> 'question', s.department_id_at_submission, answer -> 'answer'
+    FROM checklist_submissions s
+    CROSS JOIN LATERAL jsonb_array_elements(
+        CASE WHEN jsonb_typeof(s.custom_fields -> 'answers') = 'array'
+             THEN s.custom_fields -> 'answers' ELSE '[]'::jsonb END
+    ) AS answer
+    WHERE s.status = 'completed'
+      AND jsonb_path_query_array(s.custom_fields, '$.answers[*].question') ?| CAST(:question_texts AS text[])
+      AND (CAST(:department_ids AS integer[]) IS NULL OR s.department_id_at_submission = ANY(:department_ids))
+      AND answer ->> 'question' = ANY(:question_texts)
+""")
+
+_WATERMARK_SQL = text("""
+    SELECT (SELECT MAX(id) FROM checklist_submissions),
+           (SELECT MAX(id) FROM survey_responses)
+""")
+
+
+def _normalize_answer(value):
+    """Split a raw answer into (numeric, text, options) parts"""
+    if isinstance(value, str) and value[:1] in ('[', '{'):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+
+    if isinstance(value, list):
+        options = [str(v) for v in value]
+        return np.nan, ', '.join(options), options
+
+    if isinstance(value, bool):
+        label = 'yes' if value else 'no'
+        return np.nan, label, [label]
+
+    if value is None:
+        return np.nan, None, []
+
+    label = str(value).strip()
+    try:
+        number = float(label)
+    except ValueError:
+        number = np.nan
+
+    # 1, 1.0 and '1.0' share one label, so they count as yes and as one option
+    if np.isfinite(number) and number.is_integer():
+        label = str(int(number))
+
+    return number, label, [label] if label else []
+
+
+class _AnswerColumns:
+    """Column buffers for one question, turned into NumPy arrays once loaded"""
+
+    def __init__(self):
+        self.departments = []
+        self.numbers = []
+        self.labels = []
+        self.options = []
+
+    def add(self, department_id, number, label, options):
+        department_id = NO_DEPARTMENT if department_id is None else department_id
+        self.departments.append(department_id)
+        self.numbers.append(number)
+        self.labels.append(label)
+        self.options.extend(options)
+
+    def to_arrays(self):
+        return {
+            'departments': np.asarray(self.departments, dtype=np.int64),
+            'numbers': np.asarray(self.numbers, dtype=np.float64),
+            'labels': np.asarray(
+                [label.lower() if label else '' for label in self.labels], dtype=object
+            ),
+            'options': np.asarray(self.options, dtype=object),
+        }
+
+
+def load_answer_arrays(questions, department_ids=None):
+    """
+    Load every answer for the given questions in three set-based queries
+
+    Args:
+        questions: List of Question objects
+        department_ids: Only answers submitted in these departments (default: all)
+
+    Returns:
+        Dict of question id -> dict of NumPy arrays
+    """
+    columns = {q.id: _AnswerColumns() for q in questions}
+    ids_by_text = {}
+    for q in questions:
+        ids_by_text.setdefault(q.question_text, []).append(q.id)
+
+    params = {
+        'question_ids': list(columns),
+        'question_texts': list(ids_by_text),
+        'department_ids': None if department_ids is None else list(department_ids),
+    }
+
+    for question_id, department_id, answer_number, answer_text, answer_json in db.session.execute(
+        _SURVEY_ANSWERS_SQL, params
+    ):
+        if answer_number is not None:
+            value = float(answer_number)
+        elif answer_json is not None:
+            value = answer_json
+        else:
+            value = answer_text
+        columns[question_id].add(department_id, *_normalize_answer(value))
+
+    for title, department_id, is_checked in db.session.execute(_ITEM_RESPONSES_SQL, params):
+        for question_id in ids_by_text.get(title, []):
+            columns[question_id].add(department_id, *_normalize_answer(bool(is_checked)))
+
+    for question_text, department_id, answer in db.session.execute(_BLOB_ANSWERS_SQL, params):
+        for question_id in ids_by_text.get(question_text, []):
+            columns[question_id].add(department_id, *_normalize_answer(answer))
+
+    return {question_id: buffer.to_arrays() for question_id, buffer in columns.items()}
+
+
+# ============================================================================
+# STATISTICS
+# ============================================================================
+
+def _yes_no_stats(labels):
+    yes = np.isin(labels, list(YES_VALUES))
+    no = np.isin(labels, list(NO_VALUES))
+    yes_count = int(yes.sum())
+    no_count = int(no.sum())
+    total = yes_count + no_count
+    return {
+        'yes': yes_count,
+        'no': no_count,
+        'yes_ratio': yes_count / total if total else None,
+    }, yes
+
+
+def _numeric_stats(numbers):
+    values = numbers[np.isfinite(numbers)]
+    if values.size == 0:
+        return None
+
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+    percentiles = np.percentile(values, PERCENTILES)
+
+    return {
+        'count': int(values.size),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'percentiles': {f'p{p}': float(v) for p, v in zip(PERCENTILES, percentiles)},
+        'histogram': {
+            'counts': counts.tolist(),
+            'edges': edges.tolist(),
+        },
+    }
+
+
+def _option_stats(options):
+    if options.size == 0:
+        return []
+
+    values, counts = np.unique(options, return_counts=True)
+    order = np.argsort(-counts, kind='stable')[:TOP_OPTIONS]
+    return [
+        {'option': values[i], 'count': int(counts[i])}
+        for i in order
+    ]
+
+
+def _department_breakdown(arrays, yes_mask):
+    """Group counts, yes counts and numeric sums by department with bincount"""
+    departments = arrays['departments']
+    if departments.size == 0:
+        return []
+
+    keys, inverse = np.unique(departments, return_inverse=True)
+    numbers = arrays['numbers']
+    finite = np.isfinite(numbers)
+
+    totals = np.bincount(inverse, minlength=keys.size)
+    yes_counts = np.bincount(inverse, weights=yes_mask, minlength=keys.size)
+    numeric_counts = np.bincount(inverse, weights=finite.astype(np.float64), minlength=keys.size)
+    numeric_sums = np.bincount(inverse, weights=np.where(finite, numbers, 0.0), minlength=keys.size)
+
+    breakdown = []
+    for i, department_id in enumerate(keys):
+        breakdown.append({
+            'department_id': None if department_id == NO_DEPARTMENT else int(department_id),
+            'count': int(totals[i]),
+            'yes': int(yes_counts[i]),
+            'numeric_mean': float(numeric_sums[i] / numeric_counts[i]) if numeric_counts[i] else None,
+        })
+
+    return breakdown
+
+
+def compute_question_stats(question, arrays):
+    """
+    Compute the statistics for one question from its answer arrays
+
+    Returns:
+        Dict with counts, yes/no, numeric, option and department sections
+    """
+    labels = arrays['labels']
+    answered = labels != ''
+    yes_no, yes_mask = _yes_no_stats(labels)
+
+    stats = {
+        'question_id': question.id,
+        'question': question.question_text,
+        'question_type': question.question_type,
+        'responses': int(labels.size),
+        'answered': int(answered.sum()),
+        'yes_no': yes_no,
+        'numeric': _numeric_stats(arrays['numbers']),
+        'options': _option_stats(arrays['options']),
+        'by_department': _department_breakdown(arrays, yes_mask.astype(np.float64)),
+    }
+
+    # Only surface the sections that make sense for the question type
+    if question.question_type not in NUMERIC_TYPES and stats['numeric'] and stats['numeric']['count'] < stats['answered']:
+        stats['numeric'] = None
+    if question.question_type != 'yes_no' and (yes_no['yes'] + yes_no['no']) < stats['answered']:
+        stats['yes_no'] = None
+
+    return stats
+
+
+# ============================================================================
+# CACHED ENTRY POINT
+# ============================================================================
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _current_watermark():
+    """Highest checklist submission and survey response ids"""
+    checklist_max, survey_max = db.session.execute(_WATERMARK_SQL).one()
+    return (checklist_max or 0, survey_max or 0)
+
+
+def get_question_stats(question_ids, department_ids=None):
+    """
+    Statistics for a set of questions, cached until new submissions arrive
+
+    Args:
+        question_ids: Iterable of question IDs (at most MAX_QUESTIONS)
+        department_ids: Only count answers submitted in these departments (default: all)
+
+    Returns:
+        Dict with the watermark the stats were computed at and a list of
+        per-question statistics
+
+    Raises:
+        ValueError: more than MAX_QUESTIONS questions
+    """
+    question_key = tuple(sorted({int(q) for q in question_ids}))
+    if len(question_key) > MAX_QUESTIONS:
+        raise ValueError(f"At most {MAX_QUESTIONS} questions per request")
+    department_key = None if department_ids is None else tuple(sorted(set(department_ids)))
+    key = (question_key, department_key)
+    watermark = _current_watermark()
+
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and cached['watermark'] == watermark:
+            _cache.move_to_end(key)
+            return cached
+
+    questions = Question.query.filter(
+        Question.id.in_(question_key),
+        Question.is_deleted == False
+    ).order_by(Question.id).all()
+
+    arrays = load_answer_arrays(questions, department_key)
+    result = {
+        'watermark': watermark,
+        'questions': [compute_question_stats(q, arrays[q.id]) for q in questions],
+    }
+
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return result
@@ -1,9 +1,9 @@
-from flask import render_template, Flask, request, session, flash, redirect, url_for, jsonify
+from flask import render_template, Flask, request, session, flash, redirect, url_for, jsonify, make_response, Response
 from datetime import datetime
 import json
 import os
 from dotenv import load_dotenv
-from sqlalchemy import and_, or_
+from sqlalchemy import or_
 from geopy.distance import geodesic
 
 # Load environment variables
@@ -26,6 +26,10 @@ app.secret_key = os.getenv("SECRET_KEY", config_obj.SECRET_KEY)
 app.config["SQLALCHEMY_DATABASE_URI"] = config_obj.get_database_url()
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# JSON provider shared by jsonify responses and JSONB columns (before db.init_app)
+from json_provider import init_json_provider
+init_json_provider(app)
+
 # Import models and initialize db
 from models import (
     db, User, Role, Department, Team, QuestionPool, Question,
@@ -34,11 +38,67 @@ from models import (
     ChecklistItemResponse, UserLocation, LocationZone, Notification, Message,
     AuditLog, OrganizationHistory
 )
-from encryption import hash_password, verify_password
+from encryption import (
+    hash_password, configure_password_pool, verify_password_bounded,
+    PasswordVerifierBusy, get_password_pool_stats,
+    configure_bcrypt_rounds, needs_rehash, hash_password_bounded
+)
+from reporting import get_department_daily_stats, get_department_summary
+from answer_stats import get_question_stats
+import search as fulltext_search
+from custom_fields_query import CUSTOM_FIELD_MODELS, FILTERABLE_MODELS, filter_custom_fields
+from admin_helpers import mark_custom_field_searchable, unmark_custom_field_searchable
+from user_context import init_user_context, get_current_user
+from permissions import (
+    init_permissions, permission_required, visible_department_ids, ROLE_FORM_PERMISSIONS, merge_form_permissions
+)
+from activity_tracker import tracker as activity_tracker
+from hierarchy_cache import init_hierarchy_cache
+from sqlalchemy_helpers import submit_checklist_answers
+from org_closure import get_children_page
+from pagination import encode_cursor, decode_cursor, parse_page_size
+from user_directory import list_users, search_users
+from role_counts import roles_with_user_counts, role_user_count
+from stats_service import init_stats_service
+from notifications import fan_out_notification
+from realtime import hub as realtime_hub
+from unread_counts import init_unread_counts, get_unread_counts, mark_notifications_read, mark_messages_read
+from messaging import (
+    send_message, get_inbox, get_thread_messages,
+    send_broadcast, get_broadcast, mark_broadcast_read, mark_broadcasts_seen, count_unread_broadcasts
+)
+from session_store import (
+    init_session_store, rotate_session_id, record_password_rehash, invalidate_role_sessions
+)
 
 # Initialize db with app
 db.init_app(app)
 
+# bcrypt cost for this host, and verification in a bounded process pool per web worker
+configure_bcrypt_rounds(app.config['BCRYPT_ROUNDS'])
+configure_password_pool(
+    app.config['PASSWORD_POOL_WORKERS'],
+    queue_limit=app.config['PASSWORD_QUEUE_LIMIT'],
+    retry_after=app.config['PASSWORD_RETRY_AFTER'],
+    timeout=app.config['PASSWORD_VERIFY_TIMEOUT']
+)
+
+# Current user resolved once per request, cached briefly per worker
+init_user_context(app)
+init_permissions(app)
+init_hierarchy_cache(app)
+init_stats_service(app)
+init_unread_counts(app)
+
+# Server-side sessions (SESSION_TYPE selects the store)
+init_session_store(app)
+
+# last_activity/last_login are buffered and flushed in batches
+activity_tracker.init_app(app)
+
+# Server-sent events fed by one LISTEN connection per worker
+realtime_hub.init_app(app)
+
 # Initialize Flask-Migrate for database migrations
 from flask_migrate import Migrate
 migrate = Migrate(app, db)
@@ -50,6 +110,13 @@ if app.config['DEBUG']:
     print(f"Host: {config_obj.DB_HOST}:{config_obj.DB_PORT}")
 
 
+@app.before_request
+def track_activity():
+    user = session.get('user')
+    if user and request.endpoint != 'static':
+        activity_tracker.touch(user['id'])
+
+
 @app.route("/")
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -64,11 +131,21 @@ def login():
             User.is_active == True
         ).first()
         
-        if not user or not verify_password(password, user.password_hash):
+        try:
+            password_ok = user is not None and verify_password_bounded(password, user.password_hash)
+        except PasswordVerifierBusy as e:
+            # Shed load instead of queueing behind the login burst
+            flash("The server is busy. Please try again in a few seconds", "error")
+            response = make_response(render_template('index.html'), 503)
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        
+        if not password_ok:
             flash("An error has occurred. Make sure your login credentials are correct", "error")
             return redirect(url_for('login'))
         
-        # Store user info in session
+        # Store user info in session, under a new session id
+        rotate_session_id()
         session["user"] = {
             'id': user.id,
             'username': user.username,
@@ -81,10 +158,17 @@ def login():
             'team_id': user.team_id
         }
         
-        # Update last login
-        user.last_login = datetime.utcnow()
-        user.last_activity = datetime.utcnow()
-        db.session.commit()
+        # Upgrade/downgrade the stored hash to this host's bcrypt cost
+        if needs_rehash(user.password_hash):
+            try:
+                user.password_hash = hash_password_bounded(password)
+                record_password_rehash(user.id)
+                db.session.commit()
+            except PasswordVerifierBusy:
+                pass  # keep the old hash; the next login will retry
+        
+        # Record the login; written with the next activity flush
+        activity_tracker.touch(user.id, login=True)
         
         # Redirect based on role
         role_name = user.role.name
@@ -101,6 +185,17 @@ def login():
 
     return render_template('index.html')
 
+@app.route('/api/metrics/login', methods=['GET'])
+def login_metrics():
+    """Password verification queue depth, wait and latency for this worker"""
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    if session['user'].get('role') != 'super_admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify(get_password_pool_stats())
+
 @app.route('/logout', methods=['GET', 'POST'])
 def logout():
     session.clear()
@@ -113,13 +208,7 @@ def master_add():
         return redirect(url_for('login'))
     user=session['user']
     
-    # Get all administrators (admin role level 60 and above)
-    admin_roles = Role.query.all()
-    admin_role_ids = [r.id for r in admin_roles]
-    administrator = User.query.filter(
-        User.role_id.in_(admin_role_ids),
-        User.is_deleted == False
-    ).all()
+    # Administrators are picked with the /api/users/search typeahead
     
     # Get all plant sections (departments)
     plant_section = Department.query.filter_by(
@@ -164,7 +253,7 @@ def master_add():
                         flash("Administrator added successfully", "success")
         else:
             flash("please select section before you add Administrator")
-    return render_template('masterAdmin_addAdmin.html',administrator=administrator,plant_section=plant_section,user=user)
+    return render_template('masterAdmin_addAdmin.html',plant_section=plant_section,user=user)
 
 @app.route('/master_remove',methods=['GET','POST'])
 def master_remove():
@@ -293,7 +382,7 @@ def admin_create_question():
     plant_sections=[]
     
     # Get current user
-    current_user = User.query.get(user['id'])
+    current_user = get_current_user()
     if not current_user or not current_user.department:
         flash("you are currently not assigned to any plant section")
         return redirect(url_for('login'))
@@ -375,7 +464,7 @@ def admin_delete_question():
     questions=[]
     
     # Get current user
-    current_user = User.query.get(user['id'])
+    current_user = get_current_user()
     if not current_user or not current_user.department:
         flash("you are currently not assigned to any plant section")
         return redirect(url_for('login'))
@@ -462,7 +551,7 @@ def admin_edit_question():
     questions=[]
     
     # Get current user
-    current_user = User.query.get(user['id'])
+    current_user = get_current_user()
     if not current_user or not current_user.department:
         flash("you are currently not assigned to any plant section")
         return redirect(url_for('login'))
@@ -594,18 +683,10 @@ def admin_create_checklist():
     plant_sections=[]
     questions=[]
     
-    # Get all operators
-    operator_role = Role.query.filter_by(name='operator').first()
-    if operator_role:
-        operators = User.query.filter_by(
-            role_id=operator_role.id,
-            is_deleted=False
-        ).all()
-    else:
-        operators = []
+    # Operators are picked with the /api/users/search typeahead
     
     # Get current user
-    current_user = User.query.get(user["id"])
+    current_user = get_current_user()
     if not current_user or not current_user.department:
         flash("you are currently not assigned to any plant section")
         return redirect(url_for('login'))
@@ -798,7 +879,7 @@ def admin_create_checklist():
             return redirect(url_for("admin_create_checklist"))
    
     # Render the template for GET requests
-    return render_template('admin_create_checklist.html',user=user,count=count_list, operators=operators, questions=questions,plant_sections=plant_sections)
+    return render_template('admin_create_checklist.html',user=user,count=count_list, questions=questions,plant_sections=plant_sections)
 
 @app.route("/delete_checklist/<id>",methods=["GET","POST"])
 def delete_checklist(id):
@@ -961,6 +1042,469 @@ def all_answered_questions():
     print("answers --",results)
     return jsonify(results)
 
+@app.route('/api/reports/department_daily', methods=['GET'])
+def department_daily_report():
+    """Per-department daily submission and completion metrics from the rollup table"""
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+
+    try:
+        end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else datetime.utcnow().date()
+        start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else end_date
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
+
+    if start_date > end_date:
+        return jsonify({'error': 'start must not be after end'}), 400
+
+    department_id = request.args.get('department_id', type=int)
+
+    # Without view_all_data only the user's own department subtree is visible
+    department_ids = visible_department_ids()
+    if department_id and department_ids is not None and department_id not in department_ids:
+        return jsonify({'error': 'Access denied'}), 403
+
+    return jsonify({
+        'start': start_date,
+        'end': end_date,
+        'days': get_department_daily_stats(start_date, end_date, department_id, department_ids),
+        'summary': get_department_summary(start_date, end_date, department_id, department_ids)
+    })
+
+
+@app.route('/api/questions/stats', methods=['GET'])
+def question_stats():
+    """Answer statistics for one or more questions (?ids=1,2,3)"""
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+
+    try:
+        question_ids = [int(q) for q in request.args.get('ids', '').split(',') if q.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma separated list of question IDs'}), 400
+
+    if not question_ids:
+        return jsonify({'error': 'ids parameter is required'}), 400
+
+    # Without view_all_data only answers from the user's own department subtree count
+    try:
+        return jsonify(get_question_stats(question_ids, visible_department_ids()))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/search', methods=['GET'])
+def api_search():
+    """Ranked full-text search over questions, checklist items and answers"""
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q parameter is required'}), 400
+
+    types = [t for t in request.args.get('types', '').split(',') if t] or None
+    page = min(max(request.args.get('page', 1, type=int), 1), fulltext_search.MAX_PAGE)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+
+    # Answers from other departments need view_all_data
+    return jsonify(fulltext_search.search(query, types=types, page=page, per_page=per_page,
+                                          department_ids=visible_department_ids()))
+
+
+@app.route('/api/custom_fields/<model_name>/filter', methods=['POST'])
+@permission_required('view_all_data', api=True)
+def filter_by_custom_fields(model_name):
+    """
+    Filter a model by custom attributes, evaluated in the database
+    
+    Results span every department, so view_all_data is required, and only
+    the models in FILTERABLE_MODELS are exposed.
+    """
+    if model_name not in FILTERABLE_MODELS:
+        return jsonify({'error': f"Unknown model '{model_name}'"}), 404
+    model = CUSTOM_FIELD_MODELS[model_name]
+
+    data = request.get_json(silent=True) or {}
+    try:
+        after_id = int(data.get('after_id') or 0)
+        limit = min(max(int(data.get('limit') or 50), 1), 500)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'after_id and limit must be integers'}), 400
+
+    try:
+        query = filter_custom_fields(model.query, model, data.get('filters') or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    rows = query.with_entities(model.id, model.custom_fields).filter(
+        model.id > after_id
+    ).order_by(model.id).limit(limit).all()
+
+    return jsonify({
+        'results': [{'id': row.id, 'custom_fields': row.custom_fields or {}} for row in rows],
+        'next_after_id': rows[-1].id if len(rows) == limit else None
+    })
+
+
+@app.route('/superadmin/custom_fields/searchable', methods=['POST'])
+def set_custom_field_searchable():
+    """Mark or unmark a custom field as searchable (creates/drops its GIN index)"""
+    if is_logged_out():
+        return jsonify({'success': False, 'message': 'Not logged in'}), 401
+
+    user = session['user']
+    if user.get('role') != 'super_admin':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+
+    data = request.get_json() or {}
+    model_name = data.get('model')
+    field_name = data.get('field')
+    if not model_name or not field_name:
+        return jsonify({'success': False, 'message': 'model and field are required'}), 400
+
+    if data.get('searchable', True):
+        index_name = mark_custom_field_searchable(model_name, field_name, modified_by_id=user['id'])
+        if not index_name:
+            return jsonify({'success': False, 'message': 'Could not mark field searchable'}), 400
+        return jsonify({'success': True, 'index': index_name})
+
+    if not unmark_custom_field_searchable(model_name, field_name, modified_by_id=user['id']):
+        return jsonify({'success': False, 'message': 'Could not unmark field'}), 400
+    return jsonify({'success': True})
+
+
+@app.route('/api/users', methods=['GET'])
+@permission_required('manage_users', api=True)
+def user_directory():
+    """
+    Paged user directory
+    
+    Query params: fields (comma-separated), sort (e.g. name, -created_at), cursor, limit,
+    filters role_id, role, department_id, team_id, is_active, has_department
+    """
+    fields = [f for f in request.args.get('fields', '').split(',') if f] or None
+    filters = {
+        key: request.args.get(key)
+        for key in ('role_id', 'role', 'department_id', 'team_id', 'is_active', 'has_department')
+        if request.args.get(key) not in (None, '')
+    }
+    
+    try:
+        page = list_users(
+            fields=fields,
+            filters=filters,
+            sort=request.args.get('sort', 'name'),
+            cursor=request.args.get('cursor'),
+            limit=parse_page_size(request.args.get('limit'))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(page)
+
+
+@app.route('/api/users/search', methods=['GET'])
+@permission_required('manage_users', 'manage_departments', 'assign_checklists', 'manage_checklists',
+                     api=True, any_of=True)
+def user_search():
+    """
+    Typeahead search over name, username and company number
+    
+    Used by the administrator picker (master_add) and the operator picker
+    (admin_create_checklist), so any role that can assign people is allowed.
+    
+    Query params: q, limit (max 50), role (name or comma-separated names),
+    role_id, department_id
+    """
+    try:
+        users = search_users(
+            request.args.get('q'),
+            limit=parse_page_size(request.args.get('limit'), default=10, maximum=50),
+            role=request.args.get('role'),
+            role_id=request.args.get('role_id'),
+            department_id=request.args.get('department_id')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'users': users})
+
+
+@app.route('/api/org/<node>/children', methods=['GET'])
+def org_chart_children(node):
+    """
+    One level of the org chart, expanded on demand
+    
+    node: user/department id, or 'root' for the top level
+    Query params: type=user|department (default user), cursor, limit (max 200)
+    """
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    model = Department if request.args.get('type') == 'department' else User
+    try:
+        parent_id = None if node == 'root' else int(node)
+        cursor_values = decode_cursor(request.args.get('cursor'))
+        # keyset_filter rejects a cursor made for a different sort
+        children, next_values = get_children_page(
+            model, parent_id, cursor_values, parse_page_size(request.args.get('limit'))
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid node or cursor'}), 400
+    
+    if model is User:
+        items = [{
+            'id': child.id,
+            'name': child.full_name or child.username,
+            'username': child.username,
+            'role': child.role.display_name if child.role else None,
+            'department_id': child.department_id,
+            'team_id': child.team_id,
+            'child_count': child_count,
+        } for child, child_count in children]
+    else:
+        items = [{
+            'id': child.id,
+            'name': child.name,
+            'code': child.code,
+            'child_count': child_count,
+        } for child, child_count in children]
+    
+    return jsonify({
+        'node': node,
+        'type': 'department' if model is Department else 'user',
+        'children': items,
+        'next_cursor': encode_cursor(next_values) if next_values else None,
+    })
+
+
+@app.route('/api/notifications/fan_out', methods=['POST'])
+@permission_required('send_notifications', api=True)
+def notification_fan_out():
+    """
+    Notify every user in an audience
+    
+    JSON body: audience (e.g. {"department": "CRACKING UNIT", "role": "operator"}),
+    title, message, and optionally notification_type, priority, action_url,
+    action_label, related_entity_type, related_entity_id
+    """
+    data = request.get_json(silent=True) or {}
+    if not data.get('audience') or not data.get('title') or not data.get('message'):
+        return jsonify({'success': False, 'message': 'audience, title and message are required'}), 400
+    
+    try:
+        notified = fan_out_notification(
+            data['audience'],
+            title=data['title'],
+            message=data['message'],
+            notification_type=data.get('notification_type', 'info'),
+            priority=data.get('priority', 'normal'),
+            action_url=data.get('action_url'),
+            action_label=data.get('action_label'),
+            related_entity_type=data.get('related_entity_type'),
+            related_entity_id=data.get('related_entity_id'),
+            sender_id=session['user']['id']
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({'success': True, 'recipients': notified})
+
+
+@app.route('/api/unread_counts', methods=['GET'])
+def unread_badges():
+    """Unread notification, message and broadcast counts for the badges"""
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+    user_id = session['user']['id']
+    return jsonify({**get_unread_counts(user_id), 'broadcasts': count_unread_broadcasts(user_id)})
+
+
+def is_id_list(value):
+    """True for a JSON list of integer ids"""
+    return isinstance(value, list) and all(isinstance(v, int) and not isinstance(v, bool) for v in value)
+
+
+@app.route('/api/notifications/read', methods=['POST'])
+def notifications_read():
+    """Mark notifications as read; JSON body ids (list) or nothing for all"""
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    if data.get('ids') is not None and not is_id_list(data['ids']):
+        return jsonify({'error': 'ids must be a list of notification IDs'}), 400
+    user_id = session['user']['id']
+    changed = mark_notifications_read(user_id, data.get('ids'))
+    return jsonify({'success': True, 'marked_read': changed, **get_unread_counts(user_id)})
+
+
+@app.route('/api/messages/read', methods=['POST'])
+def messages_read():
+    """Mark received messages as read; JSON body ids (list) and/or thread_id, or nothing for all"""
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    if data.get('ids') is not None and not is_id_list(data['ids']):
+        return jsonify({'error': 'ids must be a list of message IDs'}), 400
+    if data.get('thread_id') is not None and not is_id_list([data['thread_id']]):
+        return jsonify({'error': 'thread_id must be a thread ID'}), 400
+    user_id = session['user']['id']
+    changed = mark_messages_read(user_id, data.get('ids'), data.get('thread_id'))
+    return jsonify({'success': True, 'marked_read': changed, **get_unread_counts(user_id)})
+
+
+@app.route('/api/messages', methods=['POST'])
+@permission_required('send_messages', api=True)
+def message_send():
+    """
+    Send a direct message
+    
+    JSON body: recipient_id, body, and optionally subject, parent_message_id (to reply), priority
+    """
+    data = request.get_json(silent=True) or {}
+    if not data.get('recipient_id') or not data.get('body'):
+        return jsonify({'success': False, 'message': 'recipient_id and body are required'}), 400
+    
+    recipient = User.query.filter_by(id=data['recipient_id'], is_deleted=False).first()
+    if not recipient:
+        return jsonify({'success': False, 'message': 'Recipient not found'}), 404
+    
+    message = send_message(
+        session['user']['id'],
+        recipient.id,
+        data['body'],
+        subject=data.get('subject'),
+        parent_message_id=data.get('parent_message_id'),
+        priority=data.get('priority', 'normal')
+    )
+    return jsonify({'success': True, 'id': message.id, 'thread_id': message.thread_id})
+
+
+@app.route('/api/inbox', methods=['GET'])
+def inbox():
+    """
+    The logged-in user's message threads, most recent first
+    
+    Query params: cursor, limit (max 100). Loading the first page clears the
+    broadcast badge.
+    """
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    try:
+        page = get_inbox(
+            session['user']['id'],
+            cursor=request.args.get('cursor'),
+            limit=parse_page_size(request.args.get('limit'), default=20, maximum=100)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not request.args.get('cursor'):
+        mark_broadcasts_seen(session['user']['id'])
+    return jsonify(page)
+
+
+@app.route('/api/threads/<int:thread_id>', methods=['GET'])
+def thread_messages(thread_id):
+    """All messages of a thread the logged-in user takes part in"""
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    messages = get_thread_messages(thread_id, session['user']['id'])
+    if messages is None:
+        return jsonify({'error': 'Thread not found'}), 404
+    
+    return jsonify({'thread_id': thread_id, 'messages': messages})
+
+
+@app.route('/api/broadcasts', methods=['POST'])
+@permission_required('broadcast_messages', api=True)
+def broadcast_send():
+    """
+    Send one message to an audience, stored once
+    
+    JSON body: audience (e.g. {"department": "CRACKING UNIT"}), body, and
+    optionally subject, priority, expires_at (ISO datetime)
+    """
+    data = request.get_json(silent=True) or {}
+    if not data.get('audience') or not data.get('body'):
+        return jsonify({'success': False, 'message': 'audience and body are required'}), 400
+    
+    try:
+        expires_at = datetime.fromisoformat(data['expires_at']) if data.get('expires_at') else None
+        broadcast = send_broadcast(
+            session['user']['id'],
+            data['audience'],
+            data['body'],
+            subject=data.get('subject'),
+            priority=data.get('priority', 'normal'),
+            expires_at=expires_at
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({'success': True, 'id': broadcast.id})
+
+
+@app.route('/api/broadcasts/<int:broadcast_id>', methods=['GET'])
+def broadcast_detail(broadcast_id):
+    """A broadcast addressed to the logged-in user"""
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    broadcast = get_broadcast(broadcast_id, session['user']['id'])
+    if broadcast is None:
+        return jsonify({'error': 'Broadcast not found'}), 404
+    
+    return jsonify(broadcast)
+
+
+@app.route('/api/broadcasts/<int:broadcast_id>/read', methods=['POST'])
+def broadcast_read(broadcast_id):
+    """Mark a broadcast as read for the logged-in user"""
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    user_id = session['user']['id']
+    if get_broadcast(broadcast_id, user_id) is None:
+        return jsonify({'error': 'Broadcast not found'}), 404
+    
+    mark_broadcast_read(broadcast_id, user_id)
+    return jsonify({'success': True})
+
+
+@app.route('/api/events', methods=['GET'])
+def event_stream():
+    """
+    Server-sent events for the logged-in user
+    
+    Sends an event named batch whose data is a JSON list of new notifications,
+    messages and broadcasts addressed to the user (type plus ids; fetch the
+    rows or /api/unread_counts to show them), or [{"type": "resync"}] when the
+    client fell behind.
+    """
+    if is_logged_out():
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    user = get_current_user()
+    if user is None:
+        return jsonify({'error': 'Not logged in'}), 401
+    try:
+        client_id, client = realtime_hub.subscribe(user)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+    
+    # No stream_with_context: the request (and its DB session) ends before streaming
+    return Response(realtime_hub.stream(client_id, client), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
 @app.route('/operator', methods=["GET", "POST"])
 def operator():
     user = session.get('user')
@@ -1031,27 +1575,12 @@ def operator():
 
         if user_answers is not None:
             if is_within:
-                # Store answers
-                assignment = ChecklistAssignment.query.get(checklist_id)
-                if assignment:
-                    submission = ChecklistSubmission(
-                        assignment_id=assignment.id,
-                        user_id=current_user.id,
-                        department_id_at_submission=current_user.department_id,
-                        team_id_at_submission=current_user.team_id,
-                        status='completed',
-                        custom_fields={'answers': user_answers, 'location': {'latitude': user_lat, 'longitude': user_lon}}
-                    )
-                    db.session.add(submission)
-                    
-                    # Update assignment
-                    assignment.status = 'completed'
-                    assignment.completed_date = datetime.utcnow()
-                    db.session.commit()
-                    
-                    output = True
-                else:
-                    output = False
+                # Store answers (the helper also refreshes the daily rollups)
+                output = submit_checklist_answers(
+                    checklist_id, user_answers,
+                    {'latitude': user_lat, 'longitude': user_lon},
+                    user_id=current_user.id
+                )
                 
                 response_data['message'] = 'Checklist submitted successfully' if output else 'Error submitting checklist'
                 response_data['status'] = 'success' if output else 'error'
@@ -1146,28 +1675,11 @@ def register():
     
     user = session['user']
     
-    # Get all users with admin or higher roles
-    admin_roles = Role.query.all()
-    admin_role_ids = [r.id for r in admin_roles]
-    
-    admins = User.query.filter(
-        User.role_id.in_(admin_role_ids),
-        User.is_deleted == False
-    ).all()
-    
-    # Get all users
-    users = User.query.filter(User.is_deleted == False).all()
+    # Registered users and department assignments are paged in from /api/users
     
     # Get all active roles with user counts for hierarchy display
-    roles_with_counts = db.session.query(
-        Role,
-        db.func.count(User.id).label('user_count')
-    ).outerjoin(User, and_(User.role_id == Role.id, User.is_deleted == False)).filter(
-        Role.is_active == True
-    ).group_by(Role.id).all()
-    
     available_roles = []
-    for role, user_count in roles_with_counts:
+    for role, user_count in roles_with_user_counts(active_only=True):
         role_dict = {
             'id': role.id,
             'name': role.name,
@@ -1181,14 +1693,6 @@ def register():
         }
         available_roles.append(role_dict)
     
-    # Get department assignments (users with departments)
-    administrators = db.session.query(
-        User, Department
-    ).join(Department, User.department_id == Department.id).filter(
-        User.is_deleted == False,
-        Department.is_deleted == False
-    ).all()
-    
     # Get checklist assignments count
     count = ChecklistAssignment.query.filter(
         ChecklistAssignment.is_deleted == False
@@ -1244,7 +1748,7 @@ def register():
             flash("User registered successfully")
             return redirect(url_for("register"))
     
-    return render_template('superAdmin.html', count=count, users=users, user=user, admins=admins, administrator=administrators, available_roles=available_roles)
+    return render_template('superAdmin.html', count=count, user=user, available_roles=available_roles)
 
 
 
@@ -1278,6 +1782,7 @@ def delete_user(id):
         user.deleted_at = datetime.utcnow()
         user.deleted_by = session['user']['id']
         
+        # The commit ends the deleted user's active sessions (session_store events)
         db.session.commit()
         
         # Create audit log
@@ -1324,23 +1829,15 @@ def is_logged_out():
 # ============================================================================
 
 @app.route('/superadmin/manage_users', methods=['GET'])
+@permission_required('manage_users')
 def manage_users():
     """View and manage all users in the system"""
     if is_logged_out():
         return redirect(url_for('login'))
     
     user = session['user']
-    current_user = User.query.get(user['id'])
     
-    
-    # Get all users with their roles and departments
-    users = db.session.query(User).join(
-        Role, User.role_id == Role.id
-    ).outerjoin(
-        Department, User.department_id == Department.id
-    ).filter(
-        User.is_deleted == False
-    ).order_by(User.created_at.desc()).all()
+    # The user table is paged in from /api/users
     
     # Get all roles for dropdowns
     roles = Role.query.filter_by(is_deleted=False).all()
@@ -1348,31 +1845,25 @@ def manage_users():
     # Get all departments for dropdowns
     departments = Department.query.filter_by(is_deleted=False).order_by(Department.name).all()
     
-    users_serialized = [u.to_dict() for u in users]
     return render_template('superAdmin_manage_users.html', 
-                         users=users_serialized, 
                          roles=roles, 
                          departments=departments,
                          user=user)
 
 @app.route('/superadmin/manage_roles', methods=['GET'])
+@permission_required('manage_roles')
 def manage_roles():
     """View and manage all roles in the system"""
     if is_logged_out():
         return redirect(url_for('login'))
     
     user = session['user']
-    current_user = User.query.get(user['id'])
+    current_user = get_current_user()
     
     
     # Get all roles with user counts
-    roles = db.session.query(
-        Role,
-        db.func.count(User.id).label('user_count')
-    ).outerjoin(User, User.role_id == Role.id).group_by(Role.id).all()
-    
     roles_list = []
-    for role, user_count in roles:
+    for role, user_count in roles_with_user_counts():
         roles_list.append({
             'id': role.id,
             'name': role.name,
@@ -1387,17 +1878,19 @@ def manage_roles():
             'permissions': role.permissions or {}
         })
     
-    return render_template('superAdmin_manage_roles.html', roles=roles_list, all_roles=roles_list, user=user)
+    return render_template('superAdmin_manage_roles.html', roles=roles_list, all_roles=roles_list, user=user,
+                           role_form_permissions=ROLE_FORM_PERMISSIONS)
 
 
 @app.route('/create_role', methods=['POST'])
+@permission_required('manage_roles')
 def create_role():
     """Create a new role"""
     if is_logged_out():
         return redirect(url_for('login'))
     
     user = session['user']
-    current_user = User.query.get(user['id'])
+    current_user = get_current_user()
 
     
     try:
@@ -1414,24 +1907,13 @@ def create_role():
             return redirect(url_for('manage_roles'))
         
         # Build permissions dict
-        permissions_list = request.form.getlist('permissions[]')
-        permissions = {
-            'view_users': 'view_users' in permissions_list,
-            'manage_users': 'manage_users' in permissions_list,
-            'view_departments': 'view_departments' in permissions_list,
-            'manage_departments': 'manage_departments' in permissions_list,
-            'view_questions': 'view_questions' in permissions_list,
-            'manage_questions': 'manage_questions' in permissions_list,
-            'view_checklists': 'view_checklists' in permissions_list,
-            'manage_checklists': 'manage_checklists' in permissions_list
-        }
+        permissions = merge_form_permissions({}, request.form.getlist('permissions[]'))
         
         # Create role
         new_role = Role(
             name=name,
             display_name=display_name,
             description=description,
-            level=level,
             parent_role_id=int(parent_role_id) if parent_role_id else None,
             permissions=permissions,
             is_active=True,
@@ -1448,7 +1930,7 @@ def create_role():
             target_type='Role',
             target_id=new_role.id,
             description=f"Created role: {display_name}",
-            new_value={'name': name, 'display_name': display_name, 'level': level}
+            new_value={'name': name, 'display_name': display_name, 'permissions': permissions}
         )
         db.session.add(audit)
         db.session.commit()
@@ -1462,13 +1944,14 @@ def create_role():
 
 
 @app.route('/update_role/<int:role_id>', methods=['POST'])
+@permission_required('manage_roles')
 def update_role(role_id):
     """Update an existing role"""
     if is_logged_out():
         return redirect(url_for('login'))
     
     user = session['user']
-    current_user = User.query.get(user['id'])
+    current_user = get_current_user()
     
     # Only Super Admin can update roles
     if not current_user or not current_user.role:
@@ -1504,20 +1987,14 @@ def update_role(role_id):
         role.is_active = bool(int(request.form.get('is_active', 1)))
         
         # Update permissions
-        permissions_list = request.form.getlist('permissions[]')
-        role.permissions = {
-            'view_users': 'view_users' in permissions_list,
-            'manage_users': 'manage_users' in permissions_list,
-            'view_departments': 'view_departments' in permissions_list,
-            'manage_departments': 'manage_departments' in permissions_list,
-            'view_questions': 'view_questions' in permissions_list,
-            'manage_questions': 'manage_questions' in permissions_list,
-            'view_checklists': 'view_checklists' in permissions_list,
-            'manage_checklists': 'manage_checklists' in permissions_list
-        }
+        role.permissions = merge_form_permissions(role.permissions, request.form.getlist('permissions[]'))
         
         db.session.commit()
         
+        # Deactivating a role logs out everyone who holds it
+        if not role.is_active and old_values['is_active']:
+            invalidate_role_sessions(role.id)
+        
         # Create audit log
         audit = AuditLog(
             user_id=user['id'],
@@ -1545,13 +2022,14 @@ def update_role(role_id):
 
 
 @app.route('/delete_role/<int:role_id>', methods=['POST'])
+@permission_required('manage_roles', api=True)
 def delete_role(role_id):
     """Delete a role (only if no users assigned)"""
     if is_logged_out():
         return jsonify({'success': False, 'message': 'Not logged in'}), 401
     
     user = session['user']
-    current_user = User.query.get(user['id'])
+    current_user = get_current_user()
     
     # Only Super Admin can delete roles
     if not current_user or not current_user.role:
@@ -1567,7 +2045,7 @@ def delete_role(role_id):
             return jsonify({'success': False, 'message': 'Cannot delete system roles'}), 400
         
         # Check if any users have this role
-        user_count = User.query.filter_by(role_id=role_id, is_deleted=False).count()
+        user_count = role_user_count(role_id)
         if user_count > 0:
             return jsonify({
                 'success': False, 
@@ -1604,13 +2082,14 @@ def delete_role(role_id):
 
 
 @app.route('/api/role/<int:role_id>', methods=['GET'])
+@permission_required('manage_roles', api=True)
 def get_role_details(role_id):
     """Get detailed information about a role"""
     if is_logged_out():
         return jsonify({'error': 'Not logged in'}), 401
     
     user = session['user']
-    current_user = User.query.get(user['id'])
+    current_user = get_current_user()
     
     # Only Super Admin can view role details
     if not current_user or not current_user.role:
@@ -1621,7 +2100,7 @@ def get_role_details(role_id):
         return jsonify({'error': 'Role not found'}), 404
     
     # Get user count
-    user_count = User.query.filter_by(role_id=role_id, is_deleted=False).count()
+    user_count = role_user_count(role_id)
     
     # Get child roles count
     child_roles_count = Role.query.filter_by(parent_role_id=role_id).count()
@@ -1631,7 +2110,6 @@ def get_role_details(role_id):
         'name': role.name,
         'display_name': role.display_name,
         'description': role.description,
-        'level': role.level,
         'parent_role_id': role.parent_role_id,
         'parent_role': role.parent_role.display_name if role.parent_role else None,
         'is_active': role.is_active,
@@ -1639,8 +2117,8 @@ def get_role_details(role_id):
         'permissions': role.permissions or {},
         'user_count': user_count,
         'child_roles_count': child_roles_count,
-        'created_at': role.created_at.isoformat() if role.created_at else None,
-        'updated_at': role.updated_at.isoformat() if role.updated_at else None
+        'created_at': role.created_at,
+        'updated_at': role.updated_at
     })
 
 
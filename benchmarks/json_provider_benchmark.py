@@ -0,0 +1,73 @@
+"""
+Benchmark: JSON encoding of large answer payloads
+
+Compares the standard library encoder (what Flask's default provider uses)
+with the shared codec in json_provider.py on a payload shaped like
+/api/all_answered_questions.
+
+Usage:
+    python benchmarks/json_provider_benchmark.py [SUBMISSIONS] [ANSWERS_PER_SUBMISSION]
+"""
+
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_provider import JSONCodec
+
+
+def build_payload(submissions, answers_per_submission):
+    """Synthetic submissions with nested answers, datetimes, UUIDs and Decimals"""
+    started = datetime(2026, 1, 1, 6, 0, 0)
+    payload = []
+    for i in range(submissions):
+        payload.append({
+            'id': i,
+            'uuid': uuid.uuid4(),
+            'company_number': f'RR{i:06d}',
+            'name': f'OPERATOR {i}',
+            'plant_section': 'CRACKING UNIT',
+            'location': {'latitude': Decimal('-26.20410000'), 'longitude': Decimal('28.04730000')},
+            'checklist_answers': [
+                {
+                    'question': f'Is valve {j} free of leaks and correctly tagged?',
+                    'answer': 'yes' if j % 3 else 'no',
+                    'reason': None if j % 3 else 'Minor seepage observed at flange',
+                }
+                for j in range(answers_per_submission)
+            ],
+            'submission_date': started + timedelta(minutes=i),
+        })
+    return payload
+
+
+def run(submissions=5000, answers_per_submission=25, repeat=5):
+    payload = build_payload(submissions, answers_per_submission)
+    codecs = {'json (stdlib)': JSONCodec('json'), 'orjson': JSONCodec('orjson')}
+
+    print(f"Payload: {submissions} submissions x {answers_per_submission} answers")
+    results = {}
+    for name, codec in codecs.items():
+        if name == 'orjson' and codec.backend != 'orjson':
+            print("  orjson not installed - skipped")
+            continue
+
+        encoded = codec.dumps_bytes(payload)
+        encode = min(timeit.repeat(lambda: codec.dumps_bytes(payload), number=1, repeat=repeat))
+        decode = min(timeit.repeat(lambda: codec.loads(encoded), number=1, repeat=repeat))
+        results[name] = encode
+        print(f"  {name:<14} encode {encode * 1000:8.1f} ms   decode {decode * 1000:8.1f} ms   "
+              f"size {len(encoded) / 1024 / 1024:.1f} MiB")
+
+    if len(results) == 2:
+        print(f"  speed-up (encode): {results['json (stdlib)'] / results['orjson']:.1f}x")
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
@@ -0,0 +1,104 @@
+"""
+Benchmark: notifying every user in a department
+
+Compares one ORM Notification object per recipient with the set-based
+fan_out_notification() in notifications.py (INSERT ... SELECT plus the unread
+counter upsert in the same statement).
+
+Runs against the configured database inside a transaction that is rolled
+back at the end: a scratch department and RECIPIENTS users are created,
+each strategy runs in its own savepoint, and nothing is left behind.
+
+Usage:
+    python benchmarks/notification_fanout_benchmark.py [RECIPIENTS] [REPEAT]
+"""
+
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db, Role, Department, Notification, User
+from notifications import fan_out_notification
+from sqlalchemy import text
+
+
+def create_recipients(count):
+    """A scratch department with `count` active users in it"""
+    tag = uuid.uuid4().hex[:8].upper()
+    role = Role.query.filter_by(name='operator').first() or Role.query.first()
+    department = Department(name=f'BENCH FANOUT {tag}', code=f'BENCH_{tag}', is_active=True)
+    db.session.add(department)
+    db.session.flush()
+
+    db.session.execute(text("""
+        INSERT INTO users (uuid, username, company_number, full_name, password_hash, role_id,
+                           department_id, is_active, is_verified, is_deleted, created_at, updated_at)
+        SELECT gen_random_uuid(), 'bench_' || :tag || '_' || n, 'B' || :tag || n, 'Bench User ' || n,
+               'x', :role_id, :department_id, true, true, false, now(), now()
+        FROM generate_series(1, :count) AS n
+    """), {'tag': tag, 'role_id': role.id, 'department_id': department.id, 'count': count})
+    return department
+
+
+def orm_per_recipient(department):
+    """Baseline: load the recipients and add one Notification object each"""
+    user_ids = [row.id for row in User.query.with_entities(User.id).filter_by(
+        department_id=department.id, is_deleted=False, is_active=True
+    )]
+    db.session.add_all([
+        Notification(user_id=user_id, title='Shutdown drill', message='Muster at gate 3 at 14:00',
+                     notification_type='alert', priority='high')
+        for user_id in user_ids
+    ])
+    db.session.flush()
+    return len(user_ids)
+
+
+def set_based(department):
+    return fan_out_notification(
+        {'department_id': department.id},
+        title='Shutdown drill', message='Muster at gate 3 at 14:00',
+        notification_type='alert', priority='high', commit=False
+    )
+
+
+def timed(strategy, department, repeat):
+    best, sent = None, 0
+    for _ in range(repeat):
+        savepoint = db.session.begin_nested()
+        started = time.perf_counter()
+        sent = strategy(department)
+        elapsed = time.perf_counter() - started
+        savepoint.rollback()
+        db.session.expunge_all()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, sent
+
+
+def run(recipients=10000, repeat=3):
+    with app.app_context():
+        try:
+            department = create_recipients(recipients)
+            department_id = department.id
+            print(f"Recipients: {recipients} users in one department")
+
+            results = {}
+            for name, strategy in (('ORM per recipient', orm_per_recipient), ('INSERT ... SELECT', set_based)):
+                department = db.session.get(Department, department_id)
+                elapsed, sent = timed(strategy, department, repeat)
+                results[name] = elapsed
+                print(f"  {name:<18} {elapsed * 1000:9.1f} ms   ({sent} notifications, "
+                      f"{elapsed / max(sent, 1) * 1e6:.1f} µs each)")
+
+            print(f"  speed-up: {results['ORM per recipient'] / results['INSERT ... SELECT']:.1f}x")
+        finally:
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
@@ -17,7 +17,12 @@ class Config:
     FLASK_APP = os.getenv('FLASK_APP', 'app.py')
     
     # Session Configuration
-    SESSION_TYPE = 'filesystem'
+    # SESSION_TYPE: 'postgres' (UNLOGGED server_sessions table), 'redis' or 'cookie'
+    SESSION_TYPE = os.getenv('SESSION_TYPE', 'postgres')
+    SESSION_REDIS_URL = os.getenv('SESSION_REDIS_URL', 'redis://localhost:6379/0')
+    SESSION_LOCAL_CACHE_TTL = int(os.getenv('SESSION_LOCAL_CACHE_TTL', '5'))  # per-worker LRU, seconds
+    SESSION_LOCAL_CACHE_SIZE = 10000
+    SESSION_PURGE_INTERVAL = 600  # seconds between expired-session cleanups per worker
     PERMANENT_SESSION_LIFETIME = 3600  # 1 hour
     
     # Database Configuration
@@ -31,6 +36,62 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
     
+    # bcrypt cost for new hashes; run `python encryption.py calibrate` on each host
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+    
+    # Current user cache (per worker, seconds; 0 disables)
+    CURRENT_USER_CACHE_TTL = int(os.getenv('CURRENT_USER_CACHE_TTL', '30'))
+    CURRENT_USER_CACHE_SIZE = 5000
+    
+    # Org-chain snapshots used to stamp submissions (per worker)
+    HIERARCHY_CACHE_TTL = int(os.getenv('HIERARCHY_CACHE_TTL', '300'))
+    HIERARCHY_CACHE_SIZE = 20000
+    
+    # Compiled role permissions (seconds before other workers' role edits apply)
+    PERMISSION_CACHE_TTL = int(os.getenv('PERMISSION_CACHE_TTL', '60'))
+    
+    # Admin dashboard statistics (per worker): fresh for TTL seconds, then served
+    # stale for up to MAX_STALE seconds while a background refresh runs
+    STATS_CACHE_TTL = int(os.getenv('STATS_CACHE_TTL', '60'))
+    STATS_MAX_STALE = int(os.getenv('STATS_MAX_STALE', '3600'))
+    STATS_ACTIVITY_WINDOW_DAYS = int(os.getenv('STATS_ACTIVITY_WINDOW_DAYS', '90'))
+    
+    # Server-sent events (/api/events): one LISTEN connection per worker feeds all
+    # of its streams. In production nginx routes them to events_server.py, whose
+    # gevent workers hold a stream in a greenlet and accept EVENT_SERVER_MAX_CLIENTS
+    # each. Served by the gthread app server instead (development), each stream
+    # holds a request thread, so MAX_CLIENTS stays at a quarter of --threads (16).
+    # Browsers turned away fall back to polling /api/unread_counts.
+    REALTIME_CHANNEL = os.getenv('REALTIME_CHANNEL', 'mobility_events')
+    REALTIME_HEARTBEAT = int(os.getenv('REALTIME_HEARTBEAT', '25'))
+    REALTIME_BATCH_WINDOW = float(os.getenv('REALTIME_BATCH_WINDOW', '0.1'))
+    REALTIME_MAX_CLIENTS = int(os.getenv('REALTIME_MAX_CLIENTS', '4'))
+    REALTIME_EVENT_SERVER_MAX_CLIENTS = int(os.getenv('REALTIME_EVENT_SERVER_MAX_CLIENTS', '2000'))
+    REALTIME_QUEUE_SIZE = 100
+    
+    # Seconds between batched writes of users.last_activity/last_login per worker
+    ACTIVITY_FLUSH_INTERVAL = int(os.getenv('ACTIVITY_FLUSH_INTERVAL', '5'))
+    
+    # Password Verification Pool (bcrypt off the request thread)
+    PASSWORD_POOL_WORKERS = int(os.getenv('PASSWORD_POOL_WORKERS', '2'))
+    PASSWORD_QUEUE_LIMIT = int(os.getenv('PASSWORD_QUEUE_LIMIT', '8'))
+    PASSWORD_RETRY_AFTER = int(os.getenv('PASSWORD_RETRY_AFTER', '2'))
+    PASSWORD_VERIFY_TIMEOUT = int(os.getenv('PASSWORD_VERIFY_TIMEOUT', '10'))
+    
+    # JSON Provider ('orjson' or 'json') for responses and JSONB columns
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'orjson')
+    JSON_SORT_KEYS = False
+    
+    # Reporting Rollups
+    REPORTING_BACKFILL_WORKERS = int(os.getenv('REPORTING_BACKFILL_WORKERS', '4'))
+    REPORTING_BACKFILL_CHUNK_DAYS = int(os.getenv('REPORTING_BACKFILL_CHUNK_DAYS', '7'))
+    
+    # Analytics Export (partitioned Parquet dataset)
+    ANALYTICS_EXPORT_DIR = os.getenv('ANALYTICS_EXPORT_DIR', 'exports/answers')
+    ANALYTICS_EXPORT_FLUSH_ROWS = int(os.getenv('ANALYTICS_EXPORT_FLUSH_ROWS', '100000'))
+    # Submissions younger than this are left for the next run (commit-order lag)
+    ANALYTICS_EXPORT_SETTLE_SECONDS = int(os.getenv('ANALYTICS_EXPORT_SETTLE_SECONDS', '300'))
+    
     @staticmethod
     def get_database_url():
         """
@@ -0,0 +1,291 @@
+"""
+Custom Fields Query Layer
+Translates filter expressions on DynamicFieldsMixin.custom_fields into JSONB
+operators so filtering by custom attributes runs in the database
+
+Filter syntax (keys are custom field names, dotted for nested objects):
+    {'reasoning': 'valve'}                 custom_fields -> 'reasoning' @> '"valve"'
+    {'location.zone': 'A'}                 custom_fields -> 'location' @> '{"zone": "A"}'
+    {'priority__in': ['high', 'urgent']}   OR of containment checks
+    {'tags__contains': 'leak'}             custom_fields -> 'tags' @> '"leak"'
+    {'reasoning__exists': True}            custom_fields ? 'reasoning'
+    {'score__gte': 3}                      jsonb_path_exists(custom_fields, '$."score" ? (@ >= $v)', ...)
+    {'status__ne': 'closed'}               custom_fields -> 'status' IS NULL OR NOT (... @> '"closed"')
+
+`ne` also matches rows that lack the field, like IS DISTINCT FROM; `in` with an
+empty list matches nothing. Invalid filters raise ValueError.
+
+Equality, membership and containment are written as `(custom_fields -> 'field') @> value`,
+which is exactly the shape served by the per-field jsonb_path_ops GIN indexes that
+ensure_custom_field_index() creates for fields marked searchable. Marking a field
+searchable builds its index in a background thread; an index left INVALID by a
+failed build is dropped and rebuilt by the next ensure, or by
+
+    python custom_fields_query.py sync_indexes
+"""
+
+from models import (
+    db, User, Role, Department, Team, UserLocation, LocationZone,
+    Notification, Message, QuestionPool, Question, Survey, SurveyResponse,
+    ChecklistTemplate, ChecklistItem, ChecklistAssignment, ChecklistSubmission
+)
+from flask import current_app
+from sqlalchemy import and_, or_, not_, false, func, literal, text
+from sqlalchemy.dialects.postgresql import JSONB
+import re
+import threading
+
+
+# Models that carry DynamicFieldsMixin.custom_fields, by public name
+CUSTOM_FIELD_MODELS = {
+    'user': User,
+    'role': Role,
+    'department': Department,
+    'team': Team,
+    'user_location': UserLocation,
+    'location_zone': LocationZone,
+    'notification': Notification,
+    'message': Message,
+    'question_pool': QuestionPool,
+    'question': Question,
+    'survey': Survey,
+    'survey_response': SurveyResponse,
+    'checklist_template': ChecklistTemplate,
+    'checklist_item': ChecklistItem,
+    'checklist_assignment': ChecklistAssignment,
+    'checklist_submission': ChecklistSubmission,
+}
+
+# Models whose rows the custom field filter API may return (users, roles,
+# notifications, messages and locations are deliberately left out)
+FILTERABLE_MODELS = (
+    'department', 'team', 'location_zone',
+    'question_pool', 'question', 'survey', 'survey_response',
+    'checklist_template', 'checklist_item', 'checklist_assignment', 'checklist_submission',
+)
+
+SEARCHABLE_FIELDS_CONFIG_KEY = 'searchable_custom_fields'
+
+_FIELD_NAME_RE = re.compile(r'^[A-Za-z0-9_]+$')
+_RANGE_OPERATORS = {'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+
+# ============================================================================
+# FILTER TRANSLATION
+# ============================================================================
+
+def validate_field_name(field_name):
+    """Raise ValueError unless field_name is safe to use as a JSONB key and in an index name"""
+    if not isinstance(field_name, str) or not _FIELD_NAME_RE.match(field_name):
+        raise ValueError(f"Invalid custom field name: '{field_name}'")
+
+
+def _split_key(key):
+    """Split 'location.zone__in' into (['location', 'zone'], 'in')"""
+    path, _, op = key.partition('__')
+    parts = path.split('.')
+
+    for part in parts:
+        validate_field_name(part)
+
+    return parts, op or 'eq'
+
+
+def _nest(parts, value):
+    """Wrap a value in the nested objects named by parts"""
+    for part in reversed(parts):
+        value = {part: value}
+    return value
+
+
+def _containment(model, parts, value):
+    """(custom_fields -> 'top') @> {nested: value}"""
+    return model.custom_fields[parts[0]].contains(_nest(parts[1:], value))
+
+
+def _jsonpath(parts):
+    return '$' + ''.join(f'."{part}"' for part in parts)
+
+
+def custom_field_condition(model, key, value):
+    """
+    Build a SQL condition for one custom field filter
+
+    Args:
+        model: Model class with a custom_fields column
+        key: Field name with optional dotted path and __operator suffix
+        value: Value to compare against
+
+    Returns:
+        SQLAlchemy boolean clause
+
+    Raises:
+        ValueError: invalid field name, operator or value
+    """
+    if not isinstance(key, str):
+        raise ValueError("Custom field filter keys must be strings")
+    parts, op = _split_key(key)
+
+    if op == 'eq':
+        return _containment(model, parts, value)
+
+    if op == 'ne':
+        return or_(model.custom_fields[parts[0]].is_(None), not_(_containment(model, parts, value)))
+
+    if op == 'in':
+        if not isinstance(value, list):
+            raise ValueError(f"'{key}' needs a list of values")
+        if not value:
+            return false()
+        return or_(*[_containment(model, parts, v) for v in value])
+
+    if op == 'contains':
+        return _containment(model, parts, value if isinstance(value, (list, dict)) else [value])
+
+    if op == 'exists':
+        if len(parts) == 1:
+            condition = model.custom_fields.has_key(parts[0])
+        else:
+            condition = func.jsonb_path_exists(model.custom_fields, _jsonpath(parts))
+        return condition if value else not_(condition)
+
+    if op in _RANGE_OPERATORS:
+        path = f'{_jsonpath(parts)} ? (@ {_RANGE_OPERATORS[op]} $v)'
+        return func.jsonb_path_exists(
+            model.custom_fields, path, literal({'v': value}, JSONB)
+        )
+
+    raise ValueError(f"Unsupported custom field operator: '{op}'")
+
+
+def filter_custom_fields(query, model, filters):
+    """
+    Apply a dict of custom field filters to a query (combined with AND)
+
+    Example:
+        filter_custom_fields(ChecklistSubmission.query, ChecklistSubmission,
+                             {'location.latitude__gte': -26.3, 'answers__exists': True})
+    """
+    if not filters:
+        return query
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object of field names to values")
+
+    return query.filter(and_(*[
+        custom_field_condition(model, key, value)
+        for key, value in filters.items()
+    ]))
+
+
+# ============================================================================
+# SEARCHABLE FIELD INDEXES
+# ============================================================================
+
+def custom_field_index_name(model, field_name):
+    """Index name for a searchable field, within Postgres' 63 character limit"""
+    return f'idx_{model.__tablename__}_cf_{field_name}'[:63]
+
+
+def ensure_custom_field_index(model, field_name):
+    """
+    Create the jsonb_path_ops GIN index for one custom field if missing
+
+    Built CONCURRENTLY on an autocommit connection so it never blocks writes
+    to the table. A build that failed or was interrupted leaves an INVALID
+    index behind, which IF NOT EXISTS would keep forever, so an invalid
+    index is dropped and built again.
+    """
+    validate_field_name(field_name)
+
+    index_name = custom_field_index_name(model, field_name)
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        valid = conn.execute(
+            text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+            {'name': index_name}
+        ).scalar()
+        if valid:
+            return index_name
+        if valid is False:
+            print(f"⚠ Rebuilding invalid index {index_name}")
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+
+        conn.execute(text(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+            f"ON {model.__tablename__} USING gin ((custom_fields -> '{field_name}') jsonb_path_ops)"
+        ))
+
+    return index_name
+
+
+def build_custom_field_index_in_background(model, field_name):
+    """
+    Start ensure_custom_field_index() in a thread, so the request that marks
+    a field searchable does not wait for (or time out on) the index build
+
+    Returns:
+        Name of the index being built
+    """
+    validate_field_name(field_name)
+
+    app = current_app._get_current_object()
+    index_name = custom_field_index_name(model, field_name)
+
+    def build():
+        try:
+            with app.app_context():
+                ensure_custom_field_index(model, field_name)
+            print(f"✓ Built index {index_name}")
+        except Exception as e:
+            print(f"✗ Error building index {index_name}: {e}")
+
+    threading.Thread(target=build, name=f'custom-field-index-{field_name}', daemon=True).start()
+    return index_name
+
+
+def drop_custom_field_index(model, field_name):
+    """Drop the index of a field that is no longer searchable"""
+    validate_field_name(field_name)
+
+    index_name = custom_field_index_name(model, field_name)
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+
+    return index_name
+
+
+def sync_custom_field_indexes(searchable_fields):
+    """
+    Make sure every field marked searchable has its index
+
+    Args:
+        searchable_fields: Dict of model name -> list of field names
+            (the value stored under SEARCHABLE_FIELDS_CONFIG_KEY)
+
+    Returns:
+        List of index names that were ensured
+    """
+    ensured = []
+    for model_name, field_names in (searchable_fields or {}).items():
+        model = CUSTOM_FIELD_MODELS.get(model_name)
+        if not model:
+            continue
+        for field_name in field_names:
+            ensured.append(ensure_custom_field_index(model, field_name))
+
+    return ensured
+
+
+if __name__ == '__main__':
+    from app import app
+    from admin_helpers import get_config
+    import sys
+
+    with app.app_context():
+        command = sys.argv[1] if len(sys.argv) > 1 else None
+
+        if command == 'sync_indexes':
+            ensured = sync_custom_field_indexes(get_config(SEARCHABLE_FIELDS_CONFIG_KEY, {}))
+            print(f"✓ {len(ensured)} searchable custom field index(es) in place")
+        else:
+            print("Available commands:")
+            print("  python custom_fields_query.py sync_indexes - Build missing or invalid indexes of searchable custom fields")
@@ -27,7 +27,7 @@ echo "🌟 Starting application server..."
 exec gunicorn \
     --bind 0.0.0.0:8000 \
     --workers 4 \
-    --threads 2 \
+    --threads 16 \
     --timeout 120 \
     --access-logfile - \
     --error-logfile - \
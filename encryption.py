@@ -1,8 +1,16 @@
 import bcrypt
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
 
-def hash_password(password: str) -> str:
-    """Hashes a password using bcrypt."""
-    salt = bcrypt.gensalt()
+# Work factor for new hashes; set per host with configure_bcrypt_rounds()
+_bcrypt_rounds = 12
+
+def hash_password(password: str, rounds: int = None) -> str:
+    """Hashes a password using bcrypt at the configured cost."""
+    salt = bcrypt.gensalt(rounds=rounds or _bcrypt_rounds)
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed_password.decode('utf-8')
 
@@ -11,3 +19,237 @@ def verify_password(password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 
+# ============================================================================
+# COST CALIBRATION & REHASHING
+# ============================================================================
+
+def configure_bcrypt_rounds(rounds: int) -> None:
+    """Set the bcrypt cost used for new hashes and the rehash-on-login target"""
+    global _bcrypt_rounds
+    if not 4 <= rounds <= 31:
+        raise ValueError(f"bcrypt rounds must be between 4 and 31, got {rounds}")
+    _bcrypt_rounds = rounds
+
+
+def get_hash_rounds(hashed_password: str) -> int:
+    """Cost factor stored in a bcrypt hash ($2b$<rounds>$...); None if unparsable"""
+    try:
+        return int(hashed_password.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True when a stored hash was made with a different cost than the target"""
+    return get_hash_rounds(hashed_password) != _bcrypt_rounds
+
+
+def measure_bcrypt_ms(rounds: int, samples: int = 3) -> float:
+    """Median wall time of one bcrypt verification at the given cost, in ms"""
+    password = b'calibration-password'
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.checkpw(password, hashed)
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def calibrate_bcrypt_rounds(target_ms: float = 250, min_rounds: int = 10, max_rounds: int = 16, samples: int = 3):
+    """
+    Pick the highest cost whose verification time on this host stays within target_ms
+
+    Each extra round doubles the work, so measuring stops at the first cost
+    that exceeds the target. min_rounds is returned even if it is too slow,
+    so the cost never drops below a safe floor.
+
+    Returns:
+        Tuple of (chosen rounds, {rounds: measured ms})
+    """
+    measurements = {}
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        measurements[rounds] = measure_bcrypt_ms(rounds, samples)
+        if measurements[rounds] > target_ms:
+            break
+        chosen = rounds
+    return chosen, measurements
+
+
+# ============================================================================
+# PROCESS-POOL VERIFICATION WITH ADMISSION CONTROL
+# ============================================================================
+
+class PasswordVerifierBusy(Exception):
+    """Raised when the verification queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Password verification queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+_pool_settings = {
+    'workers': 0,           # 0 = verify inline in the request thread
+    'queue_limit': 0,       # max verifications queued or running per web worker
+    'retry_after': 2,       # seconds suggested to rejected clients
+    'timeout': 10,          # max seconds a request waits for its result
+}
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = None
+
+_stats_lock = threading.Lock()
+_stats = {
+    'submitted': 0,
+    'rejected': 0,
+    'timed_out': 0,
+    'completed': 0,
+    'in_flight': 0,
+    'total_wait_ms': 0.0,
+    'max_wait_ms': 0.0,
+    'total_latency_ms': 0.0,
+    'max_latency_ms': 0.0,
+}
+
+
+def configure_password_pool(workers: int, queue_limit: int = None, retry_after: int = 2, timeout: int = 10) -> None:
+    """
+    Configure the bcrypt verification pool for this web worker
+
+    Args:
+        workers: Hashing processes (0 keeps verification inline)
+        queue_limit: Verifications allowed in flight before new ones are rejected
+                     (defaults to 4 per hashing process)
+        retry_after: Seconds reported to rejected clients
+        timeout: Seconds a request waits for its verification result
+    """
+    global _slots
+    queue_limit = queue_limit or workers * 4
+    _pool_settings.update(workers=workers, queue_limit=queue_limit,
+                          retry_after=retry_after, timeout=timeout)
+    _slots = threading.BoundedSemaphore(queue_limit) if workers else None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Pool owned by the current process, (re)created after a fork"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                # spawn: forking a threaded web worker is not safe
+                _pool = ProcessPoolExecutor(
+                    max_workers=_pool_settings['workers'],
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def _timed_checkpw(password: bytes, hashed_password: bytes):
+    """Runs in a pool process; returns the result and when the work started"""
+    started = time.time()
+    return bcrypt.checkpw(password, hashed_password), started
+
+
+def _timed_hashpw(password: bytes, rounds: int):
+    """Runs in a pool process; returns the new hash and when the work started"""
+    started = time.time()
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)).decode('utf-8'), started
+
+
+def _record(**changes) -> None:
+    with _stats_lock:
+        for key, value in changes.items():
+            if key.startswith('max_'):
+                _stats[key] = max(_stats[key], value)
+            else:
+                _stats[key] += value
+
+
+def _release_slot(future=None):
+    _record(in_flight=-1)
+    _slots.release()
+
+
+def _run_bounded(func, *args):
+    """
+    Run a bcrypt job in the hashing pool, failing fast when it is saturated
+
+    Raises:
+        PasswordVerifierBusy: the queue is full or the result did not arrive in time
+    """
+    if not _slots.acquire(blocking=False):
+        _record(rejected=1)
+        raise PasswordVerifierBusy(_pool_settings['retry_after'])
+
+    enqueued = time.time()
+    _record(submitted=1, in_flight=1)
+    try:
+        future = _get_pool().submit(func, *args)
+    except Exception:
+        _release_slot()
+        raise
+
+    # The slot is held until the job actually finishes (or is cancelled
+    # before starting): a timed-out job that is already running keeps
+    # occupying a pool process, so it must keep counting against the bound
+    future.add_done_callback(_release_slot)
+
+    try:
+        result, started = future.result(timeout=_pool_settings['timeout'])
+    except FutureTimeoutError:
+        future.cancel()
+        _record(timed_out=1)
+        raise PasswordVerifierBusy(_pool_settings['retry_after'])
+
+    finished = time.time()
+    wait_ms = max(started - enqueued, 0) * 1000
+    latency_ms = (finished - enqueued) * 1000
+    _record(completed=1, total_wait_ms=wait_ms, max_wait_ms=wait_ms,
+            total_latency_ms=latency_ms, max_latency_ms=latency_ms)
+    return result
+
+
+def verify_password_bounded(password: str, hashed_password: str) -> bool:
+    """Verify a password in the hashing pool (inline when the pool is disabled)"""
+    if not _pool_settings['workers']:
+        return verify_password(password, hashed_password)
+    return _run_bounded(_timed_checkpw, password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
+def hash_password_bounded(password: str) -> str:
+    """Hash a password at the configured cost in the hashing pool"""
+    if not _pool_settings['workers']:
+        return hash_password(password)
+    return _run_bounded(_timed_hashpw, password.encode('utf-8'), _bcrypt_rounds)
+
+
+def get_password_pool_stats() -> dict:
+    """Queue wait and latency counters for this web worker"""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    completed = stats['completed'] or 1
+    stats['avg_wait_ms'] = stats['total_wait_ms'] / completed
+    stats['avg_latency_ms'] = stats['total_latency_ms'] / completed
+    stats['pid'] = os.getpid()
+    stats.update({f'setting_{k}': v for k, v in _pool_settings.items()})
+    stats['bcrypt_rounds'] = _bcrypt_rounds
+    return stats
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'calibrate':
+        target = float(sys.argv[2]) if len(sys.argv) > 2 else 250
+        rounds, measurements = calibrate_bcrypt_rounds(target_ms=target)
+        for cost, ms in measurements.items():
+            print(f"  cost {cost:2d}: {ms:8.1f} ms")
+        print(f"\n✓ Recommended for a {target:.0f} ms target on this host:")
+        print(f"BCRYPT_ROUNDS={rounds}")
+    else:
+        print("Available commands:")
+        print("  python encryption.py calibrate [TARGET_MS] - Benchmark bcrypt and recommend BCRYPT_ROUNDS")
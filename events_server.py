@@ -0,0 +1,29 @@
+"""
+Event Stream Server
+Serves /api/events (realtime.py) from gevent workers, where an open stream is
+a greenlet instead of one of the app server's request threads
+
+    gunicorn --worker-class gevent --worker-connections 2000 --workers 2 \
+        --bind 0.0.0.0:8001 events_server:app
+
+nginx sends /api/events here and everything else to the regular gthread
+server, so thousands of open tabs no longer compete with page requests for
+threads. Gunicorn's gevent worker monkey-patches the standard library before
+loading this module; psycopg2 is made cooperative here so the queries of a
+subscribing request and the LISTEN connection yield instead of blocking the
+worker.
+
+Each worker accepts REALTIME_EVENT_SERVER_MAX_CLIENTS streams. Run behind the
+gthread server alone (no nginx, e.g. in development), /api/events falls back
+to request threads and REALTIME_MAX_CLIENTS.
+"""
+
+from psycogreen.gevent import patch_psycopg
+
+patch_psycopg()
+
+from app import app
+from realtime import hub
+
+hub.max_clients = app.config['REALTIME_EVENT_SERVER_MAX_CLIENTS']
+print(f"✓ Event stream server ready for {hub.max_clients} streams per worker")
@@ -0,0 +1,180 @@
+"""
+Hierarchy Snapshot Cache
+Per-worker cache of each user's organization chain, used to stamp
+SurveyResponse.hierarchy_path without walking the tree per submission
+
+    snapshot = get_snapshot(user_id)            # 0 queries on a hit
+    snapshots = get_snapshots(user_ids)         # 1 query for all misses
+    apply_snapshot(response, user, snapshot)
+
+Department, team and role at submission time are always taken from the
+user's own columns, never from a snapshot, so they cannot be stale or missing.
+
+Snapshots are tagged with a version number that is bumped by any change to
+the org structure made through the ORM in this worker (a user's parent,
+department, team, role or name, or a user removal). A version bump drops
+every snapshot at once. HIERARCHY_CACHE_TTL bounds how long a change made by
+another worker can go unseen.
+"""
+
+from models import db, User, UserClosure
+from sqlalchemy import event, inspect, select
+import threading
+import time
+
+
+_settings = {
+    'ttl': 300,
+    'max_entries': 20000,
+}
+_version = 0
+_cache = {}                 # user_id -> (version, expires_at, snapshot)
+_lock = threading.Lock()
+
+# User columns that change what a snapshot contains
+SNAPSHOT_USER_FIELDS = (
+    'parent_id', 'department_id', 'team_id', 'role_id',
+    'username', 'full_name', 'first_name', 'last_name', 'is_deleted',
+)
+
+
+def init_hierarchy_cache(app):
+    """Read the cache settings from the app config"""
+    _settings['ttl'] = app.config.get('HIERARCHY_CACHE_TTL', _settings['ttl'])
+    _settings['max_entries'] = app.config.get('HIERARCHY_CACHE_SIZE', _settings['max_entries'])
+
+
+# ============================================================================
+# LOADING
+# ============================================================================
+
+def _load_snapshots(user_ids):
+    """
+    Build snapshots for many users with one query over user_closure
+
+    Every (descendant, ancestor) pair comes back with the ancestor's columns;
+    depth 0 is the user itself.
+    """
+    rows = db.session.execute(
+        select(
+            UserClosure.descendant_id, UserClosure.depth,
+            User.id, User.username, User.full_name, User.role_id,
+            User.department_id, User.team_id
+        )
+        .join(User, User.id == UserClosure.ancestor_id)
+        .where(UserClosure.descendant_id.in_(user_ids))
+        .order_by(UserClosure.descendant_id, UserClosure.depth.desc())
+    ).all()
+
+    snapshots = {}
+    for row in rows:
+        snapshot = snapshots.setdefault(row.descendant_id, {'user_id': row.descendant_id, 'hierarchy_path': []})
+        snapshot['hierarchy_path'].append({
+            'id': row.id,
+            'username': row.username,
+            'name': row.full_name or row.username,
+            'role_id': row.role_id,
+            'department_id': row.department_id,
+            'team_id': row.team_id,
+        })
+        if row.depth == 0:
+            snapshot['department_id'] = row.department_id
+            snapshot['team_id'] = row.team_id
+            snapshot['role_id'] = row.role_id
+
+    return snapshots
+
+
+def get_snapshots(user_ids):
+    """
+    Snapshots for many users, loading all cache misses in one query
+
+    Args:
+        user_ids: Iterable of user IDs
+
+    Returns:
+        Dict of user_id -> snapshot (users that do not exist are left out)
+    """
+    user_ids = set(user_ids)
+    now = time.monotonic()
+    found = {}
+
+    with _lock:
+        version = _version
+        for user_id in user_ids:
+            entry = _cache.get(user_id)
+            if entry and entry[0] == version and entry[1] > now:
+                found[user_id] = entry[2]
+
+    missing = user_ids - found.keys()
+    if missing:
+        loaded = _load_snapshots(list(missing))
+        found.update(loaded)
+        with _lock:
+            # Skip storing if the org changed while we were loading
+            if version == _version:
+                if len(_cache) + len(loaded) > _settings['max_entries']:
+                    _cache.clear()
+                expires_at = now + _settings['ttl']
+                for user_id, snapshot in loaded.items():
+                    _cache[user_id] = (version, expires_at, snapshot)
+
+    return found
+
+
+def get_snapshot(user_id):
+    """Snapshot for one user, or None if the user does not exist"""
+    return get_snapshots([user_id]).get(user_id)
+
+
+def apply_snapshot(submission, user, snapshot):
+    """
+    Stamp a submission with the submitting user's organization context
+
+    Args:
+        submission: SurveyResponse or ChecklistSubmission
+        user: The submitting user (anything with department_id, team_id, role_id)
+        snapshot: The user's cached snapshot, or None
+
+    Department/team (and role where the model has it) come from `user`;
+    only hierarchy_path, where the model has one, comes from the snapshot.
+    """
+    submission.department_id_at_submission = user.department_id
+    submission.team_id_at_submission = user.team_id
+    if hasattr(submission, 'role_id_at_submission'):
+        submission.role_id_at_submission = user.role_id
+    if snapshot is not None and hasattr(submission, 'hierarchy_path'):
+        # Each submission gets its own list; the cached one must not be mutated
+        submission.hierarchy_path = [dict(node) for node in snapshot['hierarchy_path']]
+    return submission
+
+
+# ============================================================================
+# INVALIDATION
+# ============================================================================
+
+def bump_version():
+    """Invalidate every cached snapshot in this worker"""
+    global _version
+    with _lock:
+        _version += 1
+        _cache.clear()
+
+
+def get_hierarchy_cache_stats():
+    with _lock:
+        return {'version': _version, 'entries': len(_cache), **_settings}
+
+
+def _user_changed(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in SNAPSHOT_USER_FIELDS):
+        bump_version()
+
+
+def _user_deleted(mapper, connection, target):
+    bump_version()
+
+
+event.listen(User, 'after_update', _user_changed)
+event.listen(User, 'after_delete', _user_deleted)
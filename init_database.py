@@ -9,6 +9,8 @@ from models import (
     SystemConfiguration, CustomEntityType, OrganizationHistory
 )
 from encryption import hash_password
+from admin_helpers import get_config
+from custom_fields_query import SEARCHABLE_FIELDS_CONFIG_KEY, sync_custom_field_indexes
 import json
 
 
@@ -37,6 +39,7 @@ def init_system_roles():
                 'manage_checklists': True,
                 'view_all_locations': True,
                 'send_notifications': True,
+                'send_messages': True,
                 'broadcast_messages': True,
             }
         },
@@ -57,6 +60,7 @@ def init_system_roles():
                 'manage_checklists': True,
                 'view_department_locations': True,
                 'send_notifications': True,
+                'send_messages': True,
             }
         },
         {
@@ -73,6 +77,7 @@ def init_system_roles():
                 'assign_checklists': True,
                 'view_team_locations': True,
                 'send_team_notifications': True,
+                'send_messages': True,
             }
         },
         {
@@ -87,6 +92,7 @@ def init_system_roles():
                 'view_team_surveys': True,
                 'view_team_locations': True,
                 'send_team_notifications': True,
+                'send_messages': True,
             }
         },
         {
@@ -348,6 +354,10 @@ def initialize_database(create_samples=True):
     print("="*60 + "\n")
     
     try:
+        # Extensions used by indexes (trigram user search)
+        db.session.execute(db.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        db.session.commit()
+        
         # Create all tables
         print("Creating database tables...")
         db.create_all()
@@ -366,6 +376,10 @@ def initialize_database(create_samples=True):
         init_system_configuration()
         print()
         
+        # Indexes of custom fields marked searchable (e.g. after a restore)
+        ensured = sync_custom_field_indexes(get_config(SEARCHABLE_FIELDS_CONFIG_KEY, {}))
+        print(f"✓ {len(ensured)} searchable custom field index(es) in place\n")
+        
         if create_samples:
             print("Creating sample departments...")
             init_sample_departments()
@@ -0,0 +1,147 @@
+"""
+Pluggable JSON Provider
+One JSON codec shared by Flask responses (jsonify, |tojson) and the JSONB
+columns (SQLAlchemy json_serializer / json_deserializer)
+
+Backends:
+    'orjson' - C serializer, used when the orjson package is installed
+    'json'   - standard library fallback
+
+Both backends encode the types the models hand out natively, so to_dict()
+can return datetime/date/UUID values without calling .isoformat()/str():
+    datetime, date, time -> ISO 8601 strings
+    UUID                 -> canonical string
+    Decimal              -> string (same as Flask's default provider)
+    set, frozenset       -> list
+"""
+
+from flask.json.provider import JSONProvider
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the deployment
+    orjson = None
+
+
+# ============================================================================
+# CODEC
+# ============================================================================
+
+def _default(obj):
+    """Encode types neither backend handles on its own"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONCodec:
+    """Serializer/deserializer pair for one backend"""
+
+    def __init__(self, backend='orjson', sort_keys=False):
+        if backend == 'orjson' and orjson is None:
+            print("✗ orjson is not installed, falling back to the standard json module")
+            backend = 'json'
+
+        self.backend = backend
+        self.sort_keys = sort_keys
+        self._orjson_options = 0
+        if backend == 'orjson':
+            self._orjson_options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            if sort_keys:
+                self._orjson_options |= orjson.OPT_SORT_KEYS
+
+    def dumps_bytes(self, obj):
+        """Serialize to UTF-8 bytes (no intermediate str for orjson)"""
+        if self.backend == 'orjson':
+            return orjson.dumps(obj, default=_default, option=self._orjson_options)
+        return self.dumps(obj).encode('utf-8')
+
+    def dumps(self, obj):
+        """Serialize to str"""
+        if self.backend == 'orjson':
+            return self.dumps_bytes(obj).decode('utf-8')
+        return json.dumps(obj, default=_default, ensure_ascii=False,
+                          separators=(',', ':'), sort_keys=self.sort_keys)
+
+    def loads(self, s):
+        """Deserialize from str or bytes"""
+        if self.backend == 'orjson':
+            return orjson.loads(s)
+        return json.loads(s)
+
+
+codec = JSONCodec(os.getenv('JSON_PROVIDER', 'orjson'))
+
+
+def configure_codec(backend, sort_keys=False):
+    """Switch the shared codec (called once at app start-up)"""
+    global codec
+    codec = JSONCodec(backend, sort_keys=sort_keys)
+    return codec
+
+
+# Module-level entry points so the engine options keep pointing at the
+# current codec even if configure_codec() runs after they were captured
+def dumps(obj):
+    return codec.dumps(obj)
+
+
+def loads(s):
+    return codec.loads(s)
+
+
+# ============================================================================
+# FLASK PROVIDER
+# ============================================================================
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by the shared codec"""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        # Callers passing json.dumps options (indent, cls, ...) get the stdlib path
+        if kwargs:
+            kwargs.setdefault('default', _default)
+            return json.dumps(obj, **kwargs)
+        return codec.dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(codec.dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    """
+    Install the configured JSON backend for responses and JSONB columns
+
+    Must run before db.init_app(app) so the engine picks up the serializer.
+    """
+    configure_codec(app.config.get('JSON_PROVIDER', 'orjson'),
+                    sort_keys=app.config.get('JSON_SORT_KEYS', False))
+
+    engine_options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    engine_options.setdefault('json_serializer', dumps)
+    engine_options.setdefault('json_deserializer', loads)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+    app.json = FastJSONProvider(app)
+    return codec
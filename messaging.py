@@ -0,0 +1,320 @@
+"""
+Messaging
+Sending messages, the per-user inbox of threads, and whole-thread fetches
+
+    send_message(sender_id, recipient_id, 'Valve 12 is leaking', subject='Unit 3')
+    page = get_inbox(user_id, cursor=request.args.get('cursor'))
+    messages = get_thread_messages(thread_id, user_id)
+
+Inbox rows come from message_thread_participants joined to message_threads,
+which the Message events in models.py keep current (latest message, counts,
+per-participant unread counts), so an inbox page is two small indexed queries
+however long the threads are, and a thread is fetched in one query instead
+of walking Message.replies.
+
+Broadcasts are stored once (one broadcasts row, whatever the audience size)
+and unioned into each addressed user's inbox; reading one adds a single
+broadcast_reads row for that user. Sending is one insert whatever the audience.
+
+The broadcast badge counts live, unread broadcasts newer than the user's
+broadcasts_seen_up_to watermark (user_unread_counts), which opening the inbox
+moves to the newest broadcast, so a poll only scans the broadcasts that
+arrived since, through the primary key.
+"""
+
+from models import db, User, Message, MessageThread, MessageThreadParticipant, Broadcast, BroadcastRead, \
+    UserUnreadCount
+from notifications import resolve_audience_ids
+from pagination import encode_cursor, decode_cursor, keyset_filter
+from sqlalchemy import and_, any_, case, exists, func, literal, not_, or_, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import aliased
+from datetime import datetime
+
+
+def send_message(sender_id, recipient_id, body, subject=None, parent_message_id=None,
+                 priority='normal', attachments=None, commit=True):
+    """
+    Send a direct message (a reply when parent_message_id is given)
+
+    The thread is assigned and its summary updated by the Message events.
+
+    Returns:
+        The new Message
+    """
+    message = Message(
+        sender_id=sender_id,
+        recipient_id=recipient_id,
+        subject=subject,
+        body=body,
+        message_type='direct',
+        parent_message_id=parent_message_id,
+        priority=priority,
+        attachments=attachments,
+    )
+    db.session.add(message)
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+    return message
+
+
+def get_inbox(user_id, cursor=None, limit=20):
+    """
+    One page of a user's threads and broadcasts, most recent activity first
+
+    Args:
+        user_id: Inbox owner
+        cursor: next_cursor of the previous page
+        limit: Page size
+
+    Returns:
+        Dict with threads (kind 'thread' or 'broadcast', id, subject, last
+        message, unread_count, message_count, participants) and next_cursor
+
+    Raises:
+        ValueError: malformed cursor
+    """
+    participant = MessageThreadParticipant
+    sender = aliased(User)
+    broadcast_sender = aliased(User)
+    reader = aliased(User)
+
+    # Threads the user takes part in
+    threads = select(
+        literal('thread').label('kind'), literal(0).label('kind_order'),
+        participant.thread_id.label('id'), participant.last_message_at.label('at'),
+        participant.unread_count.label('unread_count'),
+        MessageThread.subject.label('subject'), MessageThread.message_count.label('message_count'),
+        MessageThread.last_message_id.label('last_message_id'),
+        MessageThread.last_message_preview.label('preview'),
+        MessageThread.last_sender_id.label('sender_id'),
+        func.coalesce(sender.full_name, sender.username).label('sender_name')
+    ).select_from(participant) \
+        .join(MessageThread, MessageThread.id == participant.thread_id) \
+        .outerjoin(sender, sender.id == MessageThread.last_sender_id) \
+        .where(participant.user_id == user_id)
+
+    # Broadcasts addressed to the user (unread until a broadcast_reads row exists)
+    is_read = exists().where(BroadcastRead.broadcast_id == Broadcast.id, BroadcastRead.user_id == user_id)
+    broadcasts = select(
+        literal('broadcast').label('kind'), literal(1).label('kind_order'),
+        Broadcast.id.label('id'), Broadcast.created_at.label('at'),
+        case((is_read, 0), else_=1).label('unread_count'),
+        Broadcast.subject.label('subject'), literal(1).label('message_count'),
+        Broadcast.id.label('last_message_id'),
+        func.left(Broadcast.body, 200).label('preview'),
+        Broadcast.sender_id.label('sender_id'),
+        func.coalesce(broadcast_sender.full_name, broadcast_sender.username).label('sender_name')
+    ).select_from(Broadcast) \
+        .join(reader, reader.id == user_id) \
+        .join(broadcast_sender, broadcast_sender.id == Broadcast.sender_id) \
+        .where(broadcast_addressed_to(reader))
+
+    # Each side is keyset-filtered and limited before the union, so a page
+    # never reads more than limit + 1 rows from either
+    cursor_values = decode_cursor(cursor)
+    branches = []
+    for branch, columns in (
+        (threads, [participant.last_message_at, literal(0), participant.thread_id]),
+        (broadcasts, [Broadcast.created_at, literal(1), Broadcast.id]),
+    ):
+        branch = keyset_filter(branch, columns, cursor_values, descending=True)
+        branch = branch.order_by(columns[0].desc(), columns[2].desc()).limit(limit + 1)
+        branches.append(select(branch.subquery()))
+
+    inbox = union_all(*branches).subquery('inbox')
+    sort = [inbox.c.at, inbox.c.kind_order, inbox.c.id]
+    rows = db.session.execute(
+        select(inbox).order_by(*[column.desc() for column in sort]).limit(limit + 1)
+    ).all()
+
+    page = rows[:limit]
+    next_cursor = encode_cursor([page[-1].at, page[-1].kind_order, page[-1].id]) if len(rows) > limit else None
+
+    participants = {}
+    thread_ids = [row.id for row in page if row.kind == 'thread']
+    if thread_ids:
+        for thread_id, member_id, name in db.session.execute(
+            select(participant.thread_id, User.id, func.coalesce(User.full_name, User.username))
+            .join(User, User.id == participant.user_id)
+            .where(participant.thread_id.in_(thread_ids))
+        ):
+            participants.setdefault(thread_id, []).append({'id': member_id, 'name': name})
+
+    return {
+        'threads': [{
+            'kind': row.kind,
+            'id': row.id,
+            'subject': row.subject,
+            'unread_count': row.unread_count,
+            'message_count': row.message_count,
+            'last_message': {
+                'id': row.last_message_id,
+                'preview': row.preview,
+                'sender_id': row.sender_id,
+                'sender_name': row.sender_name,
+                'at': row.at,
+            },
+            'participants': participants.get(row.id, []) if row.kind == 'thread' else [],
+        } for row in page],
+        'next_cursor': next_cursor,
+    }
+
+
+def get_thread_messages(thread_id, user_id):
+    """
+    All messages in a thread, oldest first, in a single query
+
+    Returns:
+        List of message dicts, or None when the thread does not exist or
+        user_id is not one of its participants
+    """
+    is_participant = exists().where(
+        MessageThreadParticipant.thread_id == thread_id,
+        MessageThreadParticipant.user_id == user_id
+    )
+    rows = db.session.execute(
+        select(
+            Message.id, Message.sender_id, Message.recipient_id, Message.parent_message_id,
+            Message.subject, Message.body, Message.priority, Message.attachments,
+            Message.is_read, Message.created_at,
+            func.coalesce(User.full_name, User.username).label('sender_name')
+        )
+        .join(User, User.id == Message.sender_id)
+        .where(Message.thread_id == thread_id, Message.is_deleted == False, is_participant)
+        .order_by(Message.created_at, Message.id)
+    ).all()
+
+    if not rows:
+        return None
+    return [dict(row._mapping) for row in rows]
+
+
+# ============================================================================
+# BROADCASTS
+# ============================================================================
+
+def broadcast_addressed_to(user):
+    """
+    Condition: a broadcast is live and addressed to `user` (a User entity or
+    alias in the query), or was sent by them
+    """
+    def matches(ids, column):
+        return or_(ids.is_(None), column == any_(ids))
+
+    return and_(
+        Broadcast.is_deleted == False,
+        or_(Broadcast.expires_at.is_(None), Broadcast.expires_at > datetime.utcnow()),
+        or_(
+            Broadcast.sender_id == user.id,
+            and_(
+                matches(Broadcast.department_ids, user.department_id),
+                matches(Broadcast.team_ids, user.team_id),
+                matches(Broadcast.role_ids, user.role_id),
+                matches(Broadcast.user_ids, user.id),
+                or_(Broadcast.exclude_user_ids.is_(None), not_(user.id == any_(Broadcast.exclude_user_ids))),
+            )
+        )
+    )
+
+
+def send_broadcast(sender_id, audience, body, subject=None, priority='normal', expires_at=None, commit=True):
+    """
+    Send one message to an audience as a single row
+
+    Args:
+        sender_id: Sender
+        audience: Audience dict (see notifications.recipient_ids_query)
+        body, subject, priority: Message content
+        expires_at: Drop out of inboxes after this time (optional)
+
+    Returns:
+        The new Broadcast
+
+    Raises:
+        ValueError: invalid audience
+    """
+    broadcast = Broadcast(
+        sender_id=sender_id,
+        subject=subject,
+        body=body,
+        priority=priority,
+        audience=audience,
+        expires_at=expires_at,
+        **resolve_audience_ids(audience)
+    )
+    db.session.add(broadcast)
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+    return broadcast
+
+
+def get_broadcast(broadcast_id, user_id):
+    """
+    A broadcast addressed to the user, as a dict, or None
+
+    The result includes is_read for that user.
+    """
+    reader = aliased(User)
+    is_read = exists().where(BroadcastRead.broadcast_id == Broadcast.id, BroadcastRead.user_id == user_id)
+    row = db.session.execute(
+        select(
+            Broadcast.id, Broadcast.sender_id, Broadcast.subject, Broadcast.body, Broadcast.priority,
+            Broadcast.created_at, Broadcast.expires_at,
+            func.coalesce(User.full_name, User.username).label('sender_name'),
+            is_read.label('is_read')
+        )
+        .select_from(Broadcast)
+        .join(User, User.id == Broadcast.sender_id)
+        .join(reader, reader.id == user_id)
+        .where(Broadcast.id == broadcast_id, broadcast_addressed_to(reader))
+    ).first()
+    return dict(row._mapping) if row else None
+
+
+def mark_broadcast_read(broadcast_id, user_id, commit=True):
+    """Record that a user read a broadcast (idempotent)"""
+    table = BroadcastRead.__table__
+    db.session.execute(
+        pg_insert(table).values(broadcast_id=broadcast_id, user_id=user_id, read_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=[table.c.broadcast_id, table.c.user_id])
+    )
+    if commit:
+        db.session.commit()
+
+
+def mark_broadcasts_seen(user_id, commit=True):
+    """
+    Move the user's broadcast watermark to the newest broadcast, e.g. when
+    they open their inbox; the broadcasts stay unread in the inbox itself
+    """
+    table = UserUnreadCount.__table__
+    newest = select(func.coalesce(func.max(Broadcast.id), 0)).scalar_subquery()
+    db.session.execute(
+        pg_insert(table).values(user_id=user_id, broadcasts_seen_up_to=newest, updated_at=datetime.utcnow())
+        .on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={'broadcasts_seen_up_to': func.greatest(table.c.broadcasts_seen_up_to, newest)},
+        )
+    )
+    if commit:
+        db.session.commit()
+
+
+def count_unread_broadcasts(user_id):
+    """Live broadcasts addressed to the user, newer than their watermark, that they have not read"""
+    reader = aliased(User)
+    is_read = exists().where(BroadcastRead.broadcast_id == Broadcast.id, BroadcastRead.user_id == user_id)
+    seen_up_to = select(UserUnreadCount.broadcasts_seen_up_to) \
+        .where(UserUnreadCount.user_id == user_id).scalar_subquery()
+    return db.session.execute(
+        select(func.count(Broadcast.id))
+        .select_from(Broadcast)
+        .join(reader, reader.id == user_id)
+        .where(Broadcast.id > func.coalesce(seen_up_to, 0),
+               broadcast_addressed_to(reader), Broadcast.sender_id != user_id, not_(is_read))
+    ).scalar()
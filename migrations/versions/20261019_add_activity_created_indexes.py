@@ -0,0 +1,28 @@
+"""
+Add created_at indexes for the windowed activity statistics (stats_service.py)
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_activity_created_indexes'
+down_revision = '20261019_add_role_user_counts'
+branch_labels = None
+depends_on = None
+
+CREATED_INDEXES = [
+    ('idx_survey_response_created', 'survey_responses'),
+    ('idx_checklist_submission_created', 'checklist_submissions'),
+    ('idx_message_created', 'messages'),
+]
+
+def upgrade():
+    # Built concurrently so submissions and messages stay writable during the migration
+    with op.get_context().autocommit_block():
+        for name, table in CREATED_INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} (created_at)")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table in CREATED_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
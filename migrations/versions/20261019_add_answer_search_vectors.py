@@ -0,0 +1,42 @@
+"""
+Store the full-text vectors of survey and checklist answers in generated columns
+
+Adding a stored generated column rewrites the table, so run this in a
+maintenance window on large databases. The GIN indexes are then built
+concurrently, and the expression indexes they replace are dropped.
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_answer_search_vectors'
+down_revision = '20261019_add_submission_answer_questions_index'
+branch_labels = None
+depends_on = None
+
+# (table, new index, replaced expression index, vector expression)
+SEARCH_VECTORS = [
+    ('survey_answers', 'idx_survey_answer_search_vector', 'idx_survey_answer_fts',
+     "to_tsvector('english', COALESCE(answer_text, ''))"),
+    ('checklist_submissions', 'idx_checklist_submission_search_vector', 'idx_checklist_submission_answers_fts',
+     "jsonb_to_tsvector('english', jsonb_path_query_array(custom_fields, '$.answers[*].answer'), '[\"string\"]')"),
+]
+
+
+def upgrade():
+    for table, index, old_index, expression in SEARCH_VECTORS:
+        op.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({expression}) STORED")
+
+    with op.get_context().autocommit_block():
+        for table, index, old_index, expression in SEARCH_VECTORS:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} USING gin (search_vector)")
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {old_index}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table, index, old_index, expression in SEARCH_VECTORS:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {old_index} ON {table} USING gin (({expression}))")
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+
+    for table, index, old_index, expression in SEARCH_VECTORS:
+        op.drop_column(table, 'search_vector')
@@ -0,0 +1,49 @@
+"""
+Add broadcasts (one row per broadcast message) and broadcast_reads (read receipts)
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_broadcasts'
+down_revision = '20261019_add_message_threads'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'broadcasts',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('sender_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('subject', sa.String(200), nullable=True),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('priority', sa.String(20), nullable=False, server_default='normal'),
+        sa.Column('audience', postgresql.JSONB(), nullable=False, server_default='{}'),
+        sa.Column('department_ids', postgresql.ARRAY(sa.Integer()), nullable=True),
+        sa.Column('team_ids', postgresql.ARRAY(sa.Integer()), nullable=True),
+        sa.Column('role_ids', postgresql.ARRAY(sa.Integer()), nullable=True),
+        sa.Column('user_ids', postgresql.ARRAY(sa.Integer()), nullable=True),
+        sa.Column('exclude_user_ids', postgresql.ARRAY(sa.Integer()), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('is_deleted', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.Column('deleted_by', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+    )
+    op.create_index('ix_broadcasts_sender_id', 'broadcasts', ['sender_id'])
+    op.create_index('idx_broadcast_created', 'broadcasts', ['created_at', 'id'])
+
+    op.create_table(
+        'broadcast_reads',
+        sa.Column('broadcast_id', sa.Integer(), sa.ForeignKey('broadcasts.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('read_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('broadcast_reads')
+    op.drop_table('broadcasts')
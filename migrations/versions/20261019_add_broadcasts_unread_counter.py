@@ -0,0 +1,38 @@
+"""
+Add broadcasts_unread to user_unread_counts and a partial index on expiring broadcasts
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_broadcasts_unread_counter'
+down_revision = '20261019_add_broadcasts'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user_unread_counts', sa.Column('broadcasts_unread', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the unread broadcasts that never expire (messaging.BROADCAST_COUNTED_SQL)
+    op.execute("""
+        INSERT INTO user_unread_counts (user_id, broadcasts_unread)
+        SELECT u.id, COUNT(*) FROM broadcasts b JOIN users u ON u.is_deleted = false
+        WHERE b.is_deleted = false AND b.expires_at IS NULL AND b.sender_id <> u.id
+          AND (b.department_ids IS NULL OR u.department_id = ANY(b.department_ids))
+          AND (b.team_ids IS NULL OR u.team_id = ANY(b.team_ids))
+          AND (b.role_ids IS NULL OR u.role_id = ANY(b.role_ids))
+          AND (b.user_ids IS NULL OR u.id = ANY(b.user_ids))
+          AND (b.exclude_user_ids IS NULL OR NOT u.id = ANY(b.exclude_user_ids))
+          AND NOT EXISTS (SELECT 1 FROM broadcast_reads r WHERE r.broadcast_id = b.id AND r.user_id = u.id)
+        GROUP BY u.id
+        ON CONFLICT (user_id) DO UPDATE SET broadcasts_unread = EXCLUDED.broadcasts_unread
+    """)
+
+    op.create_index('idx_broadcast_expiring', 'broadcasts', ['expires_at'],
+                    postgresql_where=sa.text('is_deleted = false AND expires_at IS NOT NULL'))
+
+
+def downgrade():
+    op.drop_index('idx_broadcast_expiring', table_name='broadcasts')
+    op.drop_column('user_unread_counts', 'broadcasts_unread')
@@ -0,0 +1,37 @@
+"""
+Add department_daily_stats rollup table and the source indexes used to rebuild it
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_department_daily_stats'
+down_revision = '20260128_remove_roles_level'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'department_daily_stats',
+        sa.Column('department_id', sa.Integer(), sa.ForeignKey('departments.id'), primary_key=True),
+        sa.Column('stat_date', sa.Date(), primary_key=True),
+        sa.Column('submissions_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('late_submissions_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completion_time_total_seconds', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('completion_time_samples', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('assignments_due_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('assignments_completed_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('idx_department_daily_stats_date', 'department_daily_stats', ['stat_date'])
+    op.create_index('idx_checklist_submission_dept_date', 'checklist_submissions',
+                    ['department_id_at_submission', 'submission_date'])
+    op.create_index('idx_checklist_assignment_due', 'checklist_assignments',
+                    [sa.text('COALESCE(due_date, created_at)')])
+
+
+def downgrade():
+    op.drop_index('idx_checklist_assignment_due', table_name='checklist_assignments')
+    op.drop_index('idx_checklist_submission_dept_date', table_name='checklist_submissions')
+    op.drop_index('idx_department_daily_stats_date', table_name='department_daily_stats')
+    op.drop_table('department_daily_stats')
@@ -0,0 +1,33 @@
+"""
+Add GIN full-text indexes over question text, checklist item titles and answer text
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_fulltext_search_indexes'
+down_revision = '20261019_add_department_daily_stats'
+branch_labels = None
+depends_on = None
+
+FTS_INDEXES = [
+    ('idx_question_fts', 'questions',
+     "to_tsvector('english', question_text)"),
+    ('idx_checklist_item_fts', 'checklist_items',
+     "to_tsvector('english', title)"),
+    ('idx_survey_answer_fts', 'survey_answers',
+     "to_tsvector('english', COALESCE(answer_text, ''))"),
+    ('idx_checklist_submission_answers_fts', 'checklist_submissions',
+     "jsonb_to_tsvector('english', jsonb_path_query_array(custom_fields, '$.answers[*].answer'), '[\"string\"]')"),
+]
+
+def upgrade():
+    # Built concurrently so large answer tables stay writable during the migration
+    with op.get_context().autocommit_block():
+        for name, table, expression in FTS_INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} USING gin (({expression}))")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, expression in FTS_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,94 @@
+"""
+Add message_threads and message_thread_participants, and link every existing
+message to a thread (the thread of its root message)
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_message_threads'
+down_revision = '20261019_add_messages_unread_counter'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'message_threads',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('subject', sa.String(200), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(), nullable=True),
+        sa.Column('last_sender_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('last_message_preview', sa.String(200), nullable=True),
+        sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'message_thread_participants',
+        sa.Column('thread_id', sa.Integer(), sa.ForeignKey('message_threads.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('unread_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_message_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('idx_thread_participant_inbox', 'message_thread_participants',
+                    ['user_id', 'last_message_at', 'thread_id'])
+
+    # One thread per root message, reusing the root's id as the thread id
+    op.execute("""
+        WITH RECURSIVE roots(id, root_id) AS (
+            SELECT id, id FROM messages WHERE parent_message_id IS NULL
+            UNION ALL
+            SELECT m.id, roots.root_id FROM messages m JOIN roots ON m.parent_message_id = roots.id
+        )
+        UPDATE messages SET thread_id = roots.root_id
+        FROM roots WHERE messages.id = roots.id
+    """)
+    op.execute("""
+        INSERT INTO message_threads (id, subject, created_at, message_count)
+        SELECT thread_id, (ARRAY_AGG(subject ORDER BY created_at, id))[1], MIN(created_at), 0
+        FROM messages WHERE thread_id IS NOT NULL
+        GROUP BY thread_id
+    """)
+    op.execute("SELECT setval(pg_get_serial_sequence('message_threads', 'id'), COALESCE(MAX(id), 1)) FROM message_threads")
+    op.execute("""
+        UPDATE message_threads t SET
+            message_count = counts.message_count,
+            last_message_id = latest.id,
+            last_message_at = latest.created_at,
+            last_sender_id = latest.sender_id,
+            last_message_preview = LEFT(latest.body, 200)
+        FROM (
+            SELECT thread_id, COUNT(*) AS message_count
+            FROM messages WHERE is_deleted = false AND thread_id IS NOT NULL
+            GROUP BY thread_id
+        ) counts
+        JOIN (
+            SELECT DISTINCT ON (thread_id) thread_id, id, created_at, sender_id, body
+            FROM messages WHERE is_deleted = false AND thread_id IS NOT NULL
+            ORDER BY thread_id, created_at DESC, id DESC
+        ) latest ON latest.thread_id = counts.thread_id
+        WHERE t.id = counts.thread_id
+    """)
+    op.execute("""
+        INSERT INTO message_thread_participants (thread_id, user_id, unread_count, last_message_at)
+        SELECT thread_id, user_id, SUM(unread), MAX(created_at)
+        FROM (
+            SELECT thread_id, sender_id AS user_id, 0 AS unread, created_at
+            FROM messages WHERE is_deleted = false AND thread_id IS NOT NULL
+            UNION ALL
+            SELECT thread_id, recipient_id, CASE WHEN is_read THEN 0 ELSE 1 END, created_at
+            FROM messages WHERE is_deleted = false AND thread_id IS NOT NULL
+        ) m
+        GROUP BY thread_id, user_id
+    """)
+
+    op.create_foreign_key('fk_messages_thread_id', 'messages', 'message_threads', ['thread_id'], ['id'])
+    op.create_index('idx_message_thread_created', 'messages', ['thread_id', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('idx_message_thread_created', table_name='messages')
+    op.drop_constraint('fk_messages_thread_id', 'messages', type_='foreignkey')
+    op.drop_table('message_thread_participants')
+    op.drop_table('message_threads')
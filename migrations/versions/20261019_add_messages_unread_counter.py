@@ -0,0 +1,28 @@
+"""
+Add messages_unread to user_unread_counts
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_messages_unread_counter'
+down_revision = '20261019_add_user_unread_counts'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user_unread_counts', sa.Column('messages_unread', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the current unread messages
+    op.execute("""
+        INSERT INTO user_unread_counts (user_id, messages_unread)
+        SELECT recipient_id, COUNT(*) FROM messages
+        WHERE is_read = false AND is_deleted = false
+        GROUP BY recipient_id
+        ON CONFLICT (user_id) DO UPDATE SET messages_unread = EXCLUDED.messages_unread
+    """)
+
+
+def downgrade():
+    op.drop_column('user_unread_counts', 'messages_unread')
@@ -0,0 +1,50 @@
+"""
+Add user_closure and department_closure tables and populate them from parent_id
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_org_closure_tables'
+down_revision = '20261019_add_server_sessions'
+branch_labels = None
+depends_on = None
+
+CLOSURES = [
+    ('user_closure', 'users'),
+    ('department_closure', 'departments'),
+]
+
+def upgrade():
+    for closure, table in CLOSURES:
+        op.create_table(
+            closure,
+            sa.Column('ancestor_id', sa.Integer(), sa.ForeignKey(f'{table}.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('descendant_id', sa.Integer(), sa.ForeignKey(f'{table}.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('depth', sa.Integer(), nullable=False),
+        )
+        prefix = closure.replace('_closure', '')
+        op.create_index(f'idx_{prefix}_closure_descendant', closure, ['descendant_id', 'depth'])
+        op.create_index(f'idx_{prefix}_closure_ancestor_depth', closure, ['ancestor_id', 'depth'])
+
+        # Backfill: every node paired with itself and with each of its ancestors
+        op.execute(f"""
+            INSERT INTO {closure} (ancestor_id, descendant_id, depth)
+            WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+                SELECT id, id, 0 FROM {table}
+                UNION ALL
+                SELECT tree.ancestor_id, child.id, tree.depth + 1
+                FROM tree JOIN {table} child ON child.parent_id = tree.descendant_id
+                WHERE tree.depth < 64
+            )
+            SELECT ancestor_id, descendant_id, MIN(depth) FROM tree
+            GROUP BY ancestor_id, descendant_id
+        """)
+
+
+def downgrade():
+    for closure, table in reversed(CLOSURES):
+        prefix = closure.replace('_closure', '')
+        op.drop_index(f'idx_{prefix}_closure_ancestor_depth', table_name=closure)
+        op.drop_index(f'idx_{prefix}_closure_descendant', table_name=closure)
+        op.drop_table(closure)
@@ -0,0 +1,34 @@
+"""
+Add role_user_counts, the maintained per-role user counters
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_role_user_counts'
+down_revision = '20261019_add_user_trigram_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'role_user_counts',
+        sa.Column('role_id', sa.Integer(), sa.ForeignKey('roles.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('active_user_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text("(now() at time zone 'utc')")),
+    )
+
+    # Backfill from the current users
+    op.execute("""
+        INSERT INTO role_user_counts (role_id, user_count, active_user_count)
+        SELECT r.id, COUNT(u.id), COUNT(u.id) FILTER (WHERE u.is_active)
+        FROM roles r
+        LEFT JOIN users u ON u.role_id = r.id AND u.is_deleted = false
+        GROUP BY r.id
+    """)
+
+
+def downgrade():
+    op.drop_table('role_user_counts')
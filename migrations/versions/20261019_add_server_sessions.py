@@ -0,0 +1,34 @@
+"""
+Add UNLOGGED server_sessions table for the server-side session store
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_server_sessions'
+down_revision = '20261019_add_fulltext_search_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'server_sessions',
+        sa.Column('sid', sa.String(length=64), primary_key=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('role_id', sa.Integer(), nullable=True),
+        sa.Column('data', postgresql.JSONB(astext_type=sa.Text()), nullable=False, server_default='{}'),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        prefixes=['UNLOGGED'],
+    )
+    op.create_index('idx_server_sessions_user', 'server_sessions', ['user_id'])
+    op.create_index('idx_server_sessions_role', 'server_sessions', ['role_id'])
+    op.create_index('idx_server_sessions_expires', 'server_sessions', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('idx_server_sessions_expires', table_name='server_sessions')
+    op.drop_index('idx_server_sessions_role', table_name='server_sessions')
+    op.drop_index('idx_server_sessions_user', table_name='server_sessions')
+    op.drop_table('server_sessions')
@@ -0,0 +1,24 @@
+"""
+Add a GIN index over the question texts answered in each checklist submission
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_submission_answer_questions_index'
+down_revision = '20261019_add_broadcasts_unread_counter'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Built concurrently so checklist submissions stay writable during the migration
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_checklist_submission_answer_questions "
+            "ON checklist_submissions USING gin ((jsonb_path_query_array(custom_fields, '$.answers[*].question')))"
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_checklist_submission_answer_questions")
@@ -0,0 +1,27 @@
+"""
+Add keyset indexes for the paginated user directory (/api/users)
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_user_directory_indexes'
+down_revision = '20261019_add_org_closure_tables'
+branch_labels = None
+depends_on = None
+
+DIRECTORY_INDEXES = [
+    ('idx_users_directory_name', "lower(COALESCE(full_name, username)), id"),
+    ('idx_users_directory_created', "created_at, id"),
+]
+
+def upgrade():
+    # Built concurrently so logins and profile edits are not blocked during the migration
+    with op.get_context().autocommit_block():
+        for name, columns in DIRECTORY_INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON users ({columns})")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, columns in DIRECTORY_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,31 @@
+"""
+Add pg_trgm GIN indexes for the user typeahead search (/api/users/search)
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_user_trigram_indexes'
+down_revision = '20261019_add_user_directory_indexes'
+branch_labels = None
+depends_on = None
+
+TRIGRAM_INDEXES = [
+    ('idx_users_trgm_username', 'username'),
+    ('idx_users_trgm_full_name', 'full_name'),
+    ('idx_users_trgm_company_number', 'company_number'),
+]
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Built concurrently so logins and profile edits are not blocked during the migration
+    with op.get_context().autocommit_block():
+        for name, column in TRIGRAM_INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON users USING gin ({column} gin_trgm_ops)")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, column in TRIGRAM_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    # pg_trgm is left installed; other objects may depend on it
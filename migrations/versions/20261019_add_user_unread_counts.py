@@ -0,0 +1,32 @@
+"""
+Add user_unread_counts, the maintained unread notification counter per user
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_user_unread_counts'
+down_revision = '20261019_add_activity_created_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_unread_counts',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('notifications_unread', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text("(now() at time zone 'utc')")),
+    )
+
+    # Backfill from the current unread notifications
+    op.execute("""
+        INSERT INTO user_unread_counts (user_id, notifications_unread)
+        SELECT user_id, COUNT(*) FROM notifications
+        WHERE is_read = false
+        GROUP BY user_id
+    """)
+
+
+def downgrade():
+    op.drop_table('user_unread_counts')
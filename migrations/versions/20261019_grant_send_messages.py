@@ -0,0 +1,27 @@
+"""
+Grant send_messages to the super_admin, admin, department_head and team_leader system roles
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261019_grant_send_messages'
+down_revision = '20261019_add_answer_search_vectors'
+branch_labels = None
+depends_on = None
+
+ROLES = "('super_admin', 'admin', 'department_head', 'team_leader')"
+
+
+def upgrade():
+    op.execute(f"""
+        UPDATE roles SET permissions = permissions || '{{"send_messages": true}}'::jsonb
+        WHERE is_system_role = true AND name IN {ROLES}
+          AND NOT permissions @> '{{"send_messages": true}}'::jsonb
+    """)
+
+
+def downgrade():
+    op.execute(f"""
+        UPDATE roles SET permissions = permissions - 'send_messages'
+        WHERE is_system_role = true AND name IN {ROLES}
+    """)
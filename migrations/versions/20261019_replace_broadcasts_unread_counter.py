@@ -0,0 +1,25 @@
+"""
+Replace the broadcasts_unread counter with a per-user broadcasts_seen_up_to watermark
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_replace_broadcasts_unread_counter'
+down_revision = '20261019_grant_send_messages'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('idx_broadcast_expiring', table_name='broadcasts')
+    op.drop_column('user_unread_counts', 'broadcasts_unread')
+    op.add_column('user_unread_counts', sa.Column('broadcasts_seen_up_to', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('user_unread_counts', 'broadcasts_seen_up_to')
+    # Recount with `python unread_counts.py reconcile` after downgrading
+    op.add_column('user_unread_counts', sa.Column('broadcasts_unread', sa.Integer(), nullable=False, server_default='0'))
+    op.create_index('idx_broadcast_expiring', 'broadcasts', ['expires_at'],
+                    postgresql_where=sa.text('is_deleted = false AND expires_at IS NOT NULL'))
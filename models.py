@@ -5,8 +5,9 @@ Supports hierarchical organizations, dynamic fields, surveys, checklists, messag
 
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import JSONB, UUID
-from sqlalchemy import event, Index
+from sqlalchemy.dialects.postgresql import JSONB, UUID, ARRAY, TSVECTOR
+from sqlalchemy import event, Index, Computed, text, select, literal, inspect
+from sqlalchemy.orm import aliased
 import uuid
 
 db = SQLAlchemy()
@@ -34,11 +35,101 @@ class DynamicFieldsMixin:
     custom_fields = db.Column(JSONB, nullable=True, default={})
 
 
+class HierarchyMixin:
+    """
+    Adds single-query tree traversal over a self-referencing parent_id column
+    Each method runs one WITH RECURSIVE query instead of one query per node
+    """
+    # Guards against cycles in parent_id, which would otherwise recurse forever
+    MAX_HIERARCHY_DEPTH = 64
+
+    def _subtree_cte(self, max_depth=None):
+        cls = type(self)
+        tree = select(cls.id, literal(0).label('depth')).where(cls.id == self.id) \
+            .cte(f'{cls.__tablename__}_subtree', recursive=True)
+        child = aliased(cls)
+        return tree.union_all(
+            select(child.id, tree.c.depth + 1).where(
+                child.parent_id == tree.c.id,
+                tree.c.depth < (max_depth if max_depth is not None else self.MAX_HIERARCHY_DEPTH)
+            )
+        )
+
+    def _ancestor_cte(self):
+        cls = type(self)
+        path = select(cls.id, cls.parent_id, literal(0).label('distance')).where(cls.id == self.id) \
+            .cte(f'{cls.__tablename__}_ancestors', recursive=True)
+        parent = aliased(cls)
+        return path.union_all(
+            select(parent.id, parent.parent_id, path.c.distance + 1).where(
+                parent.id == path.c.parent_id,
+                path.c.distance < self.MAX_HIERARCHY_DEPTH
+            )
+        )
+
+    def get_full_hierarchy(self, ids_only=False, max_depth=None, include_deleted=True):
+        """
+        Returns self and all descendants, ordered by depth (self is depth 0)
+
+        Args:
+            ids_only: Return [(id, depth), ...] without loading the rows
+            max_depth: Stop this many levels below self
+            include_deleted: Include soft-deleted descendants
+
+        Returns:
+            List of instances with a hierarchy_depth attribute, or (id, depth) tuples
+        """
+        cls = type(self)
+        tree = self._subtree_cte(max_depth)
+
+        if ids_only:
+            query = select(tree.c.id, tree.c.depth)
+            if not include_deleted:
+                query = query.join(cls, cls.id == tree.c.id).where(cls.is_deleted == False)
+            return [tuple(row) for row in db.session.execute(query.order_by(tree.c.depth, tree.c.id))]
+
+        query = select(cls, tree.c.depth).join(tree, cls.id == tree.c.id)
+        if not include_deleted:
+            query = query.where(cls.is_deleted == False)
+
+        result = []
+        for node, depth in db.session.execute(query.order_by(tree.c.depth, cls.id)):
+            node.hierarchy_depth = depth
+            result.append(node)
+        return result
+
+    def get_hierarchy_path(self, ids_only=False):
+        """
+        Returns path from root to self (root is depth 0)
+
+        Args:
+            ids_only: Return [(id, depth), ...] without loading the rows
+
+        Returns:
+            List of instances with a hierarchy_depth attribute, or (id, depth) tuples
+        """
+        cls = type(self)
+        path = self._ancestor_cte()
+
+        if ids_only:
+            rows = db.session.execute(
+                select(path.c.id).order_by(path.c.distance.desc())
+            ).scalars().all()
+            return [(node_id, depth) for depth, node_id in enumerate(rows)]
+
+        nodes = db.session.execute(
+            select(cls).join(path, cls.id == path.c.id).order_by(path.c.distance.desc())
+        ).scalars().all()
+        for depth, node in enumerate(nodes):
+            node.hierarchy_depth = depth
+        return nodes
+
+
 # ============================================================================
 # CORE USER & AUTHENTICATION MODELS
 # ============================================================================
 
-class User(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin):
+class User(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin, HierarchyMixin):
     """
     Core user model supporting hierarchical relationships
     Supports multiple roles and flexible authentication
@@ -92,17 +183,10 @@ class User(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin):
     def __repr__(self):
         return f'<User {self.username} - {self.role.name if self.role else "No Role"}>'
 
-    def get_full_hierarchy(self):
-        """Returns list of all users in hierarchy (self and all subordinates)"""
-        result = [self]
-        for subordinate in self.subordinates:
-            result.extend(subordinate.get_full_hierarchy())
-        return result
-
     def to_dict(self):
         return {
             'id': self.id,
-            'uuid': str(self.uuid),
+            'uuid': self.uuid,
             'username': self.username,
             'email': self.email,
             'company_number': self.company_number,
@@ -116,8 +200,9 @@ class User(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin):
             'is_verified': self.is_verified,
             'department': self.department.name if self.department else None,
             'team': self.team_id,
-            'last_login': self.last_login.isoformat() if self.last_login else None,
-            'last_activity': self.last_activity.isoformat() if self.last_activity else None,
+            'last_login': self.last_login,
+            'last_activity': self.last_activity,
+            'created_at': self.created_at,
         }
     """
     Core user model supporting hierarchical relationships
@@ -169,24 +254,18 @@ class User(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin):
     survey_responses = db.relationship('SurveyResponse', backref='user', lazy='dynamic')
     checklist_submissions = db.relationship('ChecklistSubmission', backref='user', lazy='dynamic')
     
+    __table_args__ = (
+        # Keyset pagination of the user directory (user_directory.py)
+        Index('idx_users_directory_name', text('lower(COALESCE(full_name, username))'), 'id'),
+        Index('idx_users_directory_created', 'created_at', 'id'),
+        # Typeahead search (user_directory.search_users); needs the pg_trgm extension
+        Index('idx_users_trgm_username', 'username', postgresql_using='gin', postgresql_ops={'username': 'gin_trgm_ops'}),
+        Index('idx_users_trgm_full_name', 'full_name', postgresql_using='gin', postgresql_ops={'full_name': 'gin_trgm_ops'}),
+        Index('idx_users_trgm_company_number', 'company_number', postgresql_using='gin', postgresql_ops={'company_number': 'gin_trgm_ops'}),
+    )
+    
     def __repr__(self):
         return f'<User {self.username} - {self.role.name if self.role else "No Role"}>'
-    
-    def get_full_hierarchy(self):
-        """Returns list of all users in hierarchy (self and all subordinates)"""
-        result = [self]
-        for subordinate in self.subordinates:
-            result.extend(subordinate.get_full_hierarchy())
-        return result
-    
-    def get_hierarchy_path(self):
-        """Returns path from root to current user"""
-        path = [self]
-        current = self.parent
-        while current:
-            path.insert(0, current)
-            current = current.parent
-        return path
 
 
 
@@ -219,8 +298,9 @@ class Role(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin):
         return f'<Role {self.name}>'
 
     def has_permission(self, permission_key):
-        """Check if role has specific permission"""
-        return self.permissions.get(permission_key, False)
+        """Check if role has specific permission, including inherited ones"""
+        from permissions import role_has_permission
+        return role_has_permission(self.id, permission_key)
 
     def to_dict(self):
         return {
@@ -239,7 +319,7 @@ class Role(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin):
 # ORGANIZATIONAL STRUCTURE MODELS
 # ============================================================================
 
-class Department(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin):
+class Department(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin, HierarchyMixin):
     """
     Department/Division structure with hierarchical support
     """
@@ -297,6 +377,50 @@ class Team(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin):
         return f'<Team {self.name}>'
 
 
+# ============================================================================
+# HIERARCHY CLOSURE MODELS
+# ============================================================================
+
+class UserClosure(db.Model):
+    """
+    Closure table over users.parent_id: one row per (ancestor, descendant) pair,
+    including each user paired with itself at depth 0
+    Maintained by the events at the bottom of this module; see org_closure.py
+    """
+    __tablename__ = 'user_closure'
+
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        Index('idx_user_closure_descendant', 'descendant_id', 'depth'),
+        Index('idx_user_closure_ancestor_depth', 'ancestor_id', 'depth'),
+    )
+
+    def __repr__(self):
+        return f'<UserClosure {self.ancestor_id}->{self.descendant_id} ({self.depth})>'
+
+
+class DepartmentClosure(db.Model):
+    """
+    Closure table over departments.parent_id (same layout as UserClosure)
+    """
+    __tablename__ = 'department_closure'
+
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('departments.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('departments.id', ondelete='CASCADE'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        Index('idx_department_closure_descendant', 'descendant_id', 'depth'),
+        Index('idx_department_closure_ancestor_depth', 'ancestor_id', 'depth'),
+    )
+
+    def __repr__(self):
+        return f'<DepartmentClosure {self.ancestor_id}->{self.descendant_id} ({self.depth})>'
+
+
 # ============================================================================
 # HISTORICAL TRACKING MODELS
 # ============================================================================
@@ -457,6 +581,25 @@ class Notification(db.Model, TimestampMixin, DynamicFieldsMixin):
         return f'<Notification {self.id} - {self.title}>'
 
 
+class UserUnreadCount(db.Model):
+    """
+    Maintained unread counters per user, so badges never count notifications
+    or messages (kept current by the events below and unread_counts.py)
+    """
+    __tablename__ = 'user_unread_counts'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    notifications_unread = db.Column(db.Integer, nullable=False, default=0)
+    messages_unread = db.Column(db.Integer, nullable=False, default=0)         # received, not deleted
+    # Newest broadcast id the user has seen in their inbox; only newer ones
+    # are counted by messaging.count_unread_broadcasts()
+    broadcasts_seen_up_to = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<UserUnreadCount {self.user_id}: {self.notifications_unread}/{self.messages_unread}>'
+
+
 class Message(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin):
     """
     Private messaging between users
@@ -481,7 +624,7 @@ class Message(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin):
     
     # Threading
     parent_message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=True)
-    thread_id = db.Column(db.Integer, nullable=True, index=True)
+    thread_id = db.Column(db.Integer, db.ForeignKey('message_threads.id'), nullable=True, index=True)
     
     # Attachments (stored as JSONB array)
     attachments = db.Column(JSONB, nullable=True)
@@ -495,12 +638,109 @@ class Message(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin):
     __table_args__ = (
         Index('idx_message_participants', 'sender_id', 'recipient_id'),
         Index('idx_message_recipient_unread', 'recipient_id', 'is_read'),
+        Index('idx_message_created', 'created_at'),
+        Index('idx_message_thread_created', 'thread_id', 'created_at'),
     )
     
     def __repr__(self):
         return f'<Message {self.id} from {self.sender_id} to {self.recipient_id}>'
 
 
+class MessageThread(db.Model):
+    """
+    Conversation summary, maintained by the Message events below so the inbox
+    never has to walk replies
+    """
+    __tablename__ = 'message_threads'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Latest (not deleted) message
+    last_message_id = db.Column(db.Integer, nullable=True)
+    last_message_at = db.Column(db.DateTime, nullable=True)
+    last_sender_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    last_message_preview = db.Column(db.String(200), nullable=True)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<MessageThread {self.id} - {self.subject}>'
+
+
+class MessageThreadParticipant(db.Model):
+    """
+    A user's view of a thread: one inbox row with its own unread count
+    """
+    __tablename__ = 'message_thread_participants'
+    
+    thread_id = db.Column(db.Integer, db.ForeignKey('message_threads.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    last_message_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Inbox pages: newest threads first, keyset on (last_message_at, thread_id)
+        Index('idx_thread_participant_inbox', 'user_id', 'last_message_at', 'thread_id'),
+    )
+    
+    def __repr__(self):
+        return f'<MessageThreadParticipant {self.thread_id}:{self.user_id}>'
+
+
+class Broadcast(db.Model, TimestampMixin, SoftDeleteMixin):
+    """
+    A message to an audience, stored once whatever the number of recipients
+    
+    The audience is kept as id lists that all must match (NULL = no condition
+    on that attribute) and is checked against each reader's current
+    department, team and role. Read state lives in broadcast_reads.
+    """
+    __tablename__ = 'broadcasts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    
+    # Content
+    subject = db.Column(db.String(200), nullable=True)
+    body = db.Column(db.Text, nullable=False)
+    priority = db.Column(db.String(20), nullable=False, default='normal')
+    
+    # Audience as requested (e.g. {"department": "CRACKING UNIT", "role": "operator"})
+    audience = db.Column(JSONB, nullable=False, default={})
+    # ...and resolved to ids when sent (sub-departments already expanded)
+    department_ids = db.Column(ARRAY(db.Integer), nullable=True)
+    team_ids = db.Column(ARRAY(db.Integer), nullable=True)
+    role_ids = db.Column(ARRAY(db.Integer), nullable=True)
+    user_ids = db.Column(ARRAY(db.Integer), nullable=True)
+    exclude_user_ids = db.Column(ARRAY(db.Integer), nullable=True)
+    
+    expires_at = db.Column(db.DateTime, nullable=True)
+    
+    sender = db.relationship('User', foreign_keys=[sender_id])
+    
+    __table_args__ = (
+        Index('idx_broadcast_created', 'created_at', 'id'),
+    )
+    
+    def __repr__(self):
+        return f'<Broadcast {self.id} - {self.subject}>'
+
+
+class BroadcastRead(db.Model):
+    """
+    Read receipt for a broadcast (no row = unread)
+    """
+    __tablename__ = 'broadcast_reads'
+    
+    broadcast_id = db.Column(db.Integer, db.ForeignKey('broadcasts.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    read_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<BroadcastRead {self.broadcast_id}:{self.user_id}>'
+
+
 # ============================================================================
 # SURVEY & QUESTION POOL MODELS
 # ============================================================================
@@ -579,6 +819,7 @@ class Question(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFieldsMixin):
     
     __table_args__ = (
         Index('idx_question_pool', 'pool_id', 'is_active'),
+        Index('idx_question_fts', text("to_tsvector('english', question_text)"), postgresql_using='gin'),
     )
     
     def __repr__(self):
@@ -690,6 +931,7 @@ class SurveyResponse(db.Model, TimestampMixin, DynamicFieldsMixin):
     __table_args__ = (
         Index('idx_survey_response_user', 'survey_id', 'user_id'),
         Index('idx_survey_response_date', 'submission_date'),
+        Index('idx_survey_response_created', 'created_at'),
     )
     
     def __repr__(self):
@@ -714,9 +956,16 @@ class SurveyAnswer(db.Model, TimestampMixin):
     answer_datetime = db.Column(db.DateTime, nullable=True)
     answer_json = db.Column(JSONB, nullable=True)  # For complex answers (multi-select, file refs, etc.)
     
+    # Full-text search (search.py): stored so ranking reads it instead of re-parsing the text
+    search_vector = db.Column(TSVECTOR, Computed("to_tsvector('english', COALESCE(answer_text, ''))", persisted=True))
+    
     # Relationships
     question = db.relationship('Question', backref='answers')
     
+    __table_args__ = (
+        Index('idx_survey_answer_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+    
     def __repr__(self):
         return f'<SurveyAnswer {self.id}>'
 
@@ -779,6 +1028,10 @@ class ChecklistItem(db.Model, TimestampMixin, DynamicFieldsMixin):
     # Status
     is_active = db.Column(db.Boolean, nullable=False, default=True)
     
+    __table_args__ = (
+        Index('idx_checklist_item_fts', text("to_tsvector('english', title)"), postgresql_using='gin'),
+    )
+    
     def __repr__(self):
         return f'<ChecklistItem {self.title}>'
 
@@ -811,6 +1064,10 @@ class ChecklistAssignment(db.Model, TimestampMixin, SoftDeleteMixin, DynamicFiel
     assigned_by = db.relationship('User', foreign_keys=[assigned_by_id])
     submissions = db.relationship('ChecklistSubmission', backref='assignment', lazy='dynamic')
     
+    __table_args__ = (
+        Index('idx_checklist_assignment_due', text('COALESCE(due_date, created_at)')),
+    )
+    
     def __repr__(self):
         return f'<ChecklistAssignment {self.id}>'
 
@@ -841,10 +1098,26 @@ class ChecklistSubmission(db.Model, TimestampMixin, DynamicFieldsMixin):
     # Status
     status = db.Column(db.String(20), nullable=False, default='completed')
     
+    # Full-text search over the answers (search.py), stored so ranking reads it
+    search_vector = db.Column(TSVECTOR, Computed(
+        "jsonb_to_tsvector('english', jsonb_path_query_array(custom_fields, '$.answers[*].answer'), '[\"string\"]')",
+        persisted=True
+    ))
+    
     # Relationships
     location = db.relationship('UserLocation', foreign_keys=[location_id])
     item_responses = db.relationship('ChecklistItemResponse', backref='submission', lazy='dynamic', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        Index('idx_checklist_submission_dept_date', 'department_id_at_submission', 'submission_date'),
+        Index('idx_checklist_submission_created', 'created_at'),
+        Index('idx_checklist_submission_search_vector', 'search_vector', postgresql_using='gin'),
+        # Which questions a submission answers, for answer_stats
+        Index('idx_checklist_submission_answer_questions', text(
+            "jsonb_path_query_array(custom_fields, '$.answers[*].question')"
+        ), postgresql_using='gin'),
+    )
+    
     def __repr__(self):
         return f'<ChecklistSubmission {self.id}>'
 
@@ -866,11 +1139,118 @@ class ChecklistItemResponse(db.Model, TimestampMixin):
     
     # Relationships
     item = db.relationship('ChecklistItem', backref='responses')
-    
+
     def __repr__(self):
         return f'<ChecklistItemResponse {self.id}>'
 
 
+# ============================================================================
+# REPORTING ROLLUP MODELS
+# ============================================================================
+
+class DepartmentDailyStats(db.Model):
+    """
+    Per-department, per-day rollup of checklist submission and completion metrics
+    Rows are rebuilt idempotently by reporting.refresh_department_days()
+    """
+    __tablename__ = 'department_daily_stats'
+
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), primary_key=True)
+    stat_date = db.Column(db.Date, primary_key=True)
+
+    # Submissions made on this day
+    submissions_count = db.Column(db.Integer, nullable=False, default=0)
+    late_submissions_count = db.Column(db.Integer, nullable=False, default=0)
+    completion_time_total_seconds = db.Column(db.BigInteger, nullable=False, default=0)
+    completion_time_samples = db.Column(db.Integer, nullable=False, default=0)
+
+    # Assignments due on this day
+    assignments_due_count = db.Column(db.Integer, nullable=False, default=0)
+    assignments_completed_count = db.Column(db.Integer, nullable=False, default=0)
+
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Relationships
+    department = db.relationship('Department')
+
+    __table_args__ = (
+        Index('idx_department_daily_stats_date', 'stat_date'),
+    )
+
+    @property
+    def completion_rate(self):
+        if not self.assignments_due_count:
+            return None
+        return self.assignments_completed_count / self.assignments_due_count
+
+    @property
+    def avg_completion_time_seconds(self):
+        if not self.completion_time_samples:
+            return None
+        return self.completion_time_total_seconds / self.completion_time_samples
+
+    def to_dict(self):
+        return {
+            'department_id': self.department_id,
+            'stat_date': self.stat_date,
+            'submissions_count': self.submissions_count,
+            'late_submissions_count': self.late_submissions_count,
+            'avg_completion_time_seconds': self.avg_completion_time_seconds,
+            'assignments_due_count': self.assignments_due_count,
+            'assignments_completed_count': self.assignments_completed_count,
+            'completion_rate': self.completion_rate,
+        }
+
+    def __repr__(self):
+        return f'<DepartmentDailyStats {self.department_id} {self.stat_date}>'
+
+
+class RoleUserCount(db.Model):
+    """
+    Number of users per role, kept current by the user events below and
+    checked by role_counts.reconcile_role_counts()
+    """
+    __tablename__ = 'role_user_counts'
+
+    role_id = db.Column(db.Integer, db.ForeignKey('roles.id', ondelete='CASCADE'), primary_key=True)
+    user_count = db.Column(db.Integer, nullable=False, default=0)           # not soft-deleted
+    active_user_count = db.Column(db.Integer, nullable=False, default=0)    # not soft-deleted and active
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<RoleUserCount {self.role_id}: {self.user_count}>'
+
+
+# ============================================================================
+# SESSION STORAGE MODELS
+# ============================================================================
+
+class ServerSession(db.Model):
+    """
+    Server-side session data, addressed by the session id in the cookie
+    UNLOGGED: sessions are disposable, so writes skip the WAL (the table is
+    emptied after a crash, which only logs everyone out)
+    """
+    __tablename__ = 'server_sessions'
+
+    sid = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=True)   # for bulk invalidation by user
+    role_id = db.Column(db.Integer, nullable=True)   # for bulk invalidation by role
+    data = db.Column(JSONB, nullable=False, default={})
+    expires_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_server_sessions_user', 'user_id'),
+        Index('idx_server_sessions_role', 'role_id'),
+        Index('idx_server_sessions_expires', 'expires_at'),
+        {'prefixes': ['UNLOGGED']},
+    )
+
+    def __repr__(self):
+        return f'<ServerSession {self.sid[:8]} user={self.user_id}>'
+
+
 # ============================================================================
 # DYNAMIC CONFIGURATION MODELS (Super Admin Configurable)
 # ============================================================================
@@ -1026,8 +1406,305 @@ def update_location_current_flag(mapper, connection, target):
         )
 
 
+# Closure table per self-referencing hierarchy
+CLOSURE_MODELS = {
+    User: UserClosure,
+    Department: DepartmentClosure,
+}
+
+
+def insert_closure_rows(mapper, connection, target):
+    """Link a new node to itself and to every ancestor of its parent"""
+    closure = CLOSURE_MODELS[type(target)].__table__
+    connection.execute(closure.insert().values(
+        ancestor_id=target.id, descendant_id=target.id, depth=0
+    ))
+    if target.parent_id is not None:
+        connection.execute(closure.insert().from_select(
+            ['ancestor_id', 'descendant_id', 'depth'],
+            select(closure.c.ancestor_id, literal(target.id), closure.c.depth + 1)
+            .where(closure.c.descendant_id == target.parent_id)
+        ))
+
+
+def move_closure_rows(mapper, connection, target):
+    """Re-link a node's whole subtree when its parent_id changes"""
+    if not inspect(target).attrs.parent_id.history.has_changes():
+        return
+
+    closure = CLOSURE_MODELS[type(target)].__table__
+
+    if target.parent_id is not None:
+        creates_cycle = connection.execute(
+            select(closure.c.depth).where(
+                closure.c.ancestor_id == target.id,
+                closure.c.descendant_id == target.parent_id
+            )
+        ).first()
+        if creates_cycle:
+            raise ValueError(f"Cannot move {target!r} under its own descendant {target.parent_id}")
+
+    # Detach the subtree from its old ancestors (links inside the subtree stay)
+    sub = closure.alias('subtree')
+    subtree_ids = select(sub.c.descendant_id).where(sub.c.ancestor_id == target.id)
+    connection.execute(closure.delete().where(
+        closure.c.descendant_id.in_(subtree_ids),
+        closure.c.ancestor_id.not_in(subtree_ids)
+    ))
+
+    # Attach it under every ancestor of the new parent
+    if target.parent_id is not None:
+        above = closure.alias('above')
+        below = closure.alias('below')
+        connection.execute(closure.insert().from_select(
+            ['ancestor_id', 'descendant_id', 'depth'],
+            select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+            .where(above.c.descendant_id == target.parent_id, below.c.ancestor_id == target.id)
+        ))
+
+
+ADJUST_ROLE_COUNT_SQL = text("""
+    INSERT INTO role_user_counts (role_id, user_count, active_user_count, updated_at)
+    VALUES (:role_id, :users, :active, now() at time zone 'utc')
+    ON CONFLICT (role_id) DO UPDATE SET
+        user_count = role_user_counts.user_count + EXCLUDED.user_count,
+        active_user_count = role_user_counts.active_user_count + EXCLUDED.active_user_count,
+        updated_at = EXCLUDED.updated_at
+""")
+
+
+def _previous_value(state, key):
+    """Value of an attribute as stored in the database before this flush"""
+    history = state.attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(state.object, key)
+
+
+def _adjust_role_counts(connection, deltas):
+    for role_id, (users, active) in deltas.items():
+        if role_id is not None and (users or active):
+            connection.execute(ADJUST_ROLE_COUNT_SQL, {'role_id': role_id, 'users': users, 'active': active})
+
+
+def count_inserted_user(mapper, connection, target):
+    """Add a new user to its role's counters"""
+    if not target.is_deleted:
+        _adjust_role_counts(connection, {target.role_id: (1, 1 if target.is_active else 0)})
+
+
+def recount_updated_user(mapper, connection, target):
+    """Move a user between role counters on role change, soft delete/restore or (de)activation"""
+    state = inspect(target)
+    if not any(state.attrs[key].history.has_changes() for key in ('role_id', 'is_deleted', 'is_active')):
+        return
+
+    deltas = {}
+    old_role, new_role = _previous_value(state, 'role_id'), target.role_id
+    if not _previous_value(state, 'is_deleted'):
+        users, active = deltas.get(old_role, (0, 0))
+        deltas[old_role] = (users - 1, active - (1 if _previous_value(state, 'is_active') else 0))
+    if not target.is_deleted:
+        users, active = deltas.get(new_role, (0, 0))
+        deltas[new_role] = (users + 1, active + (1 if target.is_active else 0))
+    _adjust_role_counts(connection, deltas)
+
+
+def uncount_deleted_user(mapper, connection, target):
+    """Remove a hard-deleted user from its role's counters"""
+    state = inspect(target)
+    if not _previous_value(state, 'is_deleted'):
+        _adjust_role_counts(connection, {
+            _previous_value(state, 'role_id'): (-1, -1 if _previous_value(state, 'is_active') else 0)
+        })
+
+
+# Model -> (counter, recipient column, flags that all must be false to count as unread)
+UNREAD_COUNTERS = {
+    Notification: ('notifications', 'user_id', ('is_read',)),
+    Message: ('messages', 'recipient_id', ('is_read', 'is_deleted')),
+}
+
+ADJUST_UNREAD_SQL = text("""
+    INSERT INTO user_unread_counts (user_id, notifications_unread, messages_unread, updated_at)
+    VALUES (:user_id, GREATEST(:notifications, 0), GREATEST(:messages, 0), now() at time zone 'utc')
+    ON CONFLICT (user_id) DO UPDATE SET
+        notifications_unread = GREATEST(user_unread_counts.notifications_unread + :notifications, 0),
+        messages_unread = GREATEST(user_unread_counts.messages_unread + :messages, 0),
+        updated_at = EXCLUDED.updated_at
+""")
+
+
+def adjust_unread_counts(connection, user_id, notifications=0, messages=0):
+    """Add to (or subtract from) a user's unread counters, never going below zero"""
+    if user_id is not None and (notifications or messages):
+        connection.execute(ADJUST_UNREAD_SQL, {
+            'user_id': user_id, 'notifications': notifications, 'messages': messages
+        })
+
+
+def _adjust_unread(connection, model, user_id, delta):
+    adjust_unread_counts(connection, user_id, **{UNREAD_COUNTERS[model][0]: delta})
+
+
+def count_unread_insert(mapper, connection, target):
+    """Count a new unread notification or message for its recipient"""
+    model = type(target)
+    _, user_key, flags = UNREAD_COUNTERS[model]
+    if not any(getattr(target, flag) for flag in flags):
+        _adjust_unread(connection, model, getattr(target, user_key), 1)
+
+
+def recount_unread_update(mapper, connection, target):
+    """Follow read/unread, delete/restore and recipient changes"""
+    model = type(target)
+    _, user_key, flags = UNREAD_COUNTERS[model]
+    state = inspect(target)
+    if not any(state.attrs[key].history.has_changes() for key in (user_key, *flags)):
+        return
+
+    was_unread = not any(_previous_value(state, flag) for flag in flags)
+    is_unread = not any(getattr(target, flag) for flag in flags)
+    old_user, new_user = _previous_value(state, user_key), getattr(target, user_key)
+    if was_unread == is_unread and old_user == new_user:
+        return
+    if was_unread:
+        _adjust_unread(connection, model, old_user, -1)
+    if is_unread:
+        _adjust_unread(connection, model, new_user, 1)
+
+
+def uncount_unread_delete(mapper, connection, target):
+    """Drop a deleted unread notification or message from its recipient's counter"""
+    model = type(target)
+    _, user_key, flags = UNREAD_COUNTERS[model]
+    state = inspect(target)
+    if not any(_previous_value(state, flag) for flag in flags):
+        _adjust_unread(connection, model, _previous_value(state, user_key), -1)
+
+
+THREAD_PARTICIPANT_SQL = text("""
+    INSERT INTO message_thread_participants (thread_id, user_id, unread_count, last_message_at)
+    VALUES (:thread_id, :user_id, GREATEST(:unread, 0), :at)
+    ON CONFLICT (thread_id, user_id) DO UPDATE SET
+        unread_count = GREATEST(message_thread_participants.unread_count + :unread, 0),
+        last_message_at = GREATEST(message_thread_participants.last_message_at, EXCLUDED.last_message_at)
+""")
+
+THREAD_UNREAD_SQL = text("""
+    UPDATE message_thread_participants
+    SET unread_count = GREATEST(unread_count + :delta, 0)
+    WHERE thread_id = :thread_id AND user_id = :user_id
+""")
+
+# Recompute a thread's summary from its remaining messages (after deletes)
+REFRESH_THREAD_SQL = text("""
+    UPDATE message_threads t SET
+        message_count = (SELECT COUNT(*) FROM messages m WHERE m.thread_id = t.id AND m.is_deleted = false),
+        last_message_id = latest.id,
+        last_message_at = latest.created_at,
+        last_sender_id = latest.sender_id,
+        last_message_preview = LEFT(latest.body, 200)
+    FROM (SELECT CAST(:thread_id AS integer) AS thread_id) k
+    LEFT JOIN LATERAL (
+        SELECT id, created_at, sender_id, body FROM messages
+        WHERE thread_id = k.thread_id AND is_deleted = false
+        ORDER BY created_at DESC, id DESC LIMIT 1
+    ) latest ON true
+    WHERE t.id = k.thread_id
+""")
+
+
+def adjust_thread_unread(connection, user_id, deltas):
+    """Add to a participant's unread count per thread ({thread_id: delta})"""
+    params = [
+        {'thread_id': thread_id, 'user_id': user_id, 'delta': delta}
+        for thread_id, delta in deltas.items() if thread_id is not None and delta
+    ]
+    if params:
+        connection.execute(THREAD_UNREAD_SQL, params)
+
+
+def assign_message_thread(mapper, connection, target):
+    """Put a new message in its parent's thread, or start a thread"""
+    if target.thread_id is None and target.parent_message_id is not None:
+        messages = Message.__table__
+        target.thread_id = connection.execute(
+            select(messages.c.thread_id).where(messages.c.id == target.parent_message_id)
+        ).scalar()
+    if target.thread_id is None:
+        threads = MessageThread.__table__
+        target.thread_id = connection.execute(
+            threads.insert().values(subject=target.subject, created_at=datetime.utcnow(), message_count=0)
+            .returning(threads.c.id)
+        ).scalar()
+
+
+def record_thread_message(mapper, connection, target):
+    """Make a new message the latest in its thread and bump the participants"""
+    if target.is_deleted:
+        return
+    threads = MessageThread.__table__
+    connection.execute(threads.update().where(threads.c.id == target.thread_id).values(
+        message_count=threads.c.message_count + 1,
+        last_message_id=target.id,
+        last_message_at=target.created_at,
+        last_sender_id=target.sender_id,
+        last_message_preview=(target.body or '')[:200],
+    ))
+
+    unread = 0 if target.is_read else 1
+    if target.sender_id == target.recipient_id:
+        participants = [(target.sender_id, unread)]
+    else:
+        participants = [(target.sender_id, 0), (target.recipient_id, unread)]
+    connection.execute(THREAD_PARTICIPANT_SQL, [
+        {'thread_id': target.thread_id, 'user_id': user_id, 'unread': count, 'at': target.created_at}
+        for user_id, count in participants
+    ])
+
+
+def update_thread_message(mapper, connection, target):
+    """Follow read/unread and delete/restore changes in the thread summary"""
+    state = inspect(target)
+    read_changed = state.attrs.is_read.history.has_changes()
+    deleted_changed = state.attrs.is_deleted.history.has_changes()
+    if not (read_changed or deleted_changed):
+        return
+
+    was_unread = not _previous_value(state, 'is_read') and not _previous_value(state, 'is_deleted')
+    is_unread = not target.is_read and not target.is_deleted
+    if was_unread != is_unread:
+        adjust_thread_unread(connection, target.recipient_id, {target.thread_id: 1 if is_unread else -1})
+    if deleted_changed:
+        connection.execute(REFRESH_THREAD_SQL, {'thread_id': target.thread_id})
+
+
+def remove_thread_message(mapper, connection, target):
+    """Drop a hard-deleted message from its thread summary"""
+    state = inspect(target)
+    if not _previous_value(state, 'is_read') and not _previous_value(state, 'is_deleted'):
+        adjust_thread_unread(connection, target.recipient_id, {target.thread_id: -1})
+    connection.execute(REFRESH_THREAD_SQL, {'thread_id': target.thread_id})
+
+
 # Register event listeners
 event.listen(User, 'after_update', create_organization_history)
 event.listen(Department, 'after_update', create_organization_history)
 event.listen(Team, 'after_update', create_organization_history)
 event.listen(UserLocation, 'before_insert', update_location_current_flag)
+event.listen(User, 'after_insert', insert_closure_rows)
+event.listen(User, 'after_update', move_closure_rows)
+event.listen(Department, 'after_insert', insert_closure_rows)
+event.listen(Department, 'after_update', move_closure_rows)
+event.listen(User, 'after_insert', count_inserted_user)
+event.listen(User, 'after_update', recount_updated_user)
+event.listen(User, 'after_delete', uncount_deleted_user)
+event.listen(Notification, 'after_insert', count_unread_insert)
+event.listen(Notification, 'after_update', recount_unread_update)
+event.listen(Notification, 'after_delete', uncount_unread_delete)
+event.listen(Message, 'after_insert', count_unread_insert)
+event.listen(Message, 'after_update', recount_unread_update)
+event.listen(Message, 'after_delete', uncount_unread_delete)
+event.listen(Message, 'before_insert', assign_message_thread)
+event.listen(Message, 'after_insert', record_thread_message)
+event.listen(Message, 'after_update', update_thread_message)
+event.listen(Message, 'after_delete', remove_thread_message)
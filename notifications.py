@@ -0,0 +1,271 @@
+"""
+Notification Fan-out
+Sends one notification to every user in a department, team or role with a
+single set-based statement, whatever the number of recipients
+
+    fan_out_notification(
+        {'department': 'CRACKING UNIT', 'include_subdepartments': True},
+        title='Shutdown drill', message='Muster at gate 3 at 14:00',
+        notification_type='alert', priority='high', sender_id=user['id']
+    )
+
+The recipients are resolved by one SELECT, the notification rows are written
+with INSERT ... SELECT, and the same statement bumps each recipient's
+user_unread_counts row, so the notifications and the badge counts commit
+(or roll back) together. Connected clients are told with realtime events
+carrying the recipient ids that statement returned, in chunks of
+REALTIME_IDS_PER_EVENT, not one event per recipient.
+"""
+
+from models import db, User, Role, Department, DepartmentClosure, Notification, UserUnreadCount
+from realtime import publish_event
+from sqlalchemy import func, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime
+
+
+# ============================================================================
+# AUDIENCES
+# ============================================================================
+
+AUDIENCE_KEYS = (
+    'user_ids', 'department_id', 'department', 'include_subdepartments',
+    'team_id', 'role_id', 'role', 'exclude_user_ids', 'include_inactive', 'everyone',
+)
+
+
+AUDIENCE_ID_KEYS = ('user_ids', 'department_id', 'team_id', 'role_id', 'exclude_user_ids')
+AUDIENCE_NAME_KEYS = ('department', 'role')
+
+
+def _as_list(value):
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate_audience(audience):
+    """
+    Check an audience dict
+
+    Raises:
+        ValueError: not a dict, unknown keys, ids or names of the wrong type,
+            or no targeting condition without everyone=True
+    """
+    if not isinstance(audience, dict):
+        raise ValueError("Audience must be an object")
+
+    unknown = set(audience) - set(AUDIENCE_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown audience keys: {', '.join(sorted(unknown))}")
+
+    for key in AUDIENCE_ID_KEYS:
+        if audience.get(key) is not None and not all(_is_id(v) for v in _as_list(audience[key])):
+            raise ValueError(f"Audience {key} must be an id or a list of ids")
+    for key in AUDIENCE_NAME_KEYS:
+        if audience.get(key) is not None and not all(isinstance(v, str) for v in _as_list(audience[key])):
+            raise ValueError(f"Audience {key} must be a name or a list of names")
+
+    targeted = any(audience.get(key) for key in ('user_ids', 'department_id', 'department', 'team_id', 'role_id', 'role'))
+    if not targeted and not audience.get('everyone'):
+        raise ValueError("Audience has no department, team, role or user condition (set everyone=True to address all users)")
+
+
+def _department_ids_query(audience):
+    """SELECT of the department ids an audience targets, or None"""
+    department_ids = None
+    if audience.get('department_id'):
+        department_ids = _as_list(audience['department_id'])
+    elif audience.get('department'):
+        names = [name.lower() for name in _as_list(audience['department'])]
+        department_ids = select(Department.id).where(
+            func.lower(Department.name).in_(names), Department.is_deleted == False
+        )
+    if department_ids is not None and audience.get('include_subdepartments'):
+        department_ids = select(DepartmentClosure.descendant_id).where(
+            DepartmentClosure.ancestor_id.in_(department_ids)
+        )
+    return department_ids
+
+
+def resolve_audience_ids(audience):
+    """
+    Resolve an audience to id lists, e.g. to store it with a broadcast
+
+    Department and role names are looked up and sub-departments expanded
+    now, so later matching is a plain id comparison.
+
+    Returns:
+        Dict of department_ids, team_ids, role_ids, user_ids, exclude_user_ids
+        (None where the audience sets no condition)
+    """
+    validate_audience(audience)
+
+    department_ids = _department_ids_query(audience)
+    if department_ids is not None and not isinstance(department_ids, list):
+        department_ids = db.session.execute(department_ids).scalars().all()
+
+    role_ids = None
+    if audience.get('role_id') or audience.get('role'):
+        role_ids = [int(r) for r in _as_list(audience['role_id'])] if audience.get('role_id') else []
+        if audience.get('role'):
+            names = db.session.execute(
+                select(Role.id).where(Role.name.in_(_as_list(audience['role'])))
+            ).scalars().all()
+            # Both given: a user must match both, i.e. the intersection
+            role_ids = [r for r in role_ids if r in names] if audience.get('role_id') else list(names)
+
+    def ids(key):
+        return [int(v) for v in _as_list(audience[key])] if audience.get(key) else None
+
+    return {
+        'department_ids': [int(d) for d in department_ids] if department_ids is not None else None,
+        'team_ids': ids('team_id'),
+        'role_ids': role_ids,
+        'user_ids': ids('user_ids'),
+        'exclude_user_ids': ids('exclude_user_ids'),
+    }
+
+
+def recipient_ids_query(audience):
+    """
+    SELECT of the distinct user ids an audience resolves to
+
+    Audience keys (all given conditions must hold):
+        user_ids: Explicit user IDs
+        department_id / department: Department ID(s) or name(s) (case-insensitive)
+        include_subdepartments: Also include users of departments below them
+        team_id: Team ID(s)
+        role_id / role: Role ID(s) or name(s)
+        exclude_user_ids: Users to leave out (e.g. the sender)
+        include_inactive: Also include deactivated users
+        everyone: Must be set to address all users without any other condition
+
+    Raises:
+        ValueError: unknown keys, or no targeting condition without everyone=True
+    """
+    validate_audience(audience)
+
+    query = select(User.id).where(User.is_deleted == False)
+    if not audience.get('include_inactive'):
+        query = query.where(User.is_active == True)
+
+    if audience.get('user_ids'):
+        query = query.where(User.id.in_(_as_list(audience['user_ids'])))
+
+    department_ids = _department_ids_query(audience)
+    if department_ids is not None:
+        query = query.where(User.department_id.in_(department_ids))
+
+    if audience.get('team_id'):
+        query = query.where(User.team_id.in_(_as_list(audience['team_id'])))
+
+    if audience.get('role_id'):
+        query = query.where(User.role_id.in_(_as_list(audience['role_id'])))
+    if audience.get('role'):
+        query = query.where(User.role_id.in_(
+            select(Role.id).where(Role.name.in_(_as_list(audience['role'])))
+        ))
+
+    if audience.get('exclude_user_ids'):
+        query = query.where(User.id.not_in(_as_list(audience['exclude_user_ids'])))
+
+    # User ids are unique, so no DISTINCT is needed
+    return query
+
+
+def count_recipients(audience):
+    """Number of users an audience currently resolves to"""
+    return db.session.execute(
+        select(func.count()).select_from(recipient_ids_query(audience).subquery())
+    ).scalar()
+
+
+# ============================================================================
+# FAN-OUT
+# ============================================================================
+
+# Recipient ids per realtime event (keeps each pg_notify payload below 8000 bytes)
+REALTIME_IDS_PER_EVENT = 800
+
+
+def fan_out_notification(audience, title, message, notification_type='info', priority='normal',
+                         action_url=None, action_label=None, related_entity_type=None,
+                         related_entity_id=None, sender_id=None, custom_fields=None, commit=True):
+    """
+    Create one notification per user in an audience
+
+    Args:
+        audience: Audience dict (see recipient_ids_query)
+        title, message, notification_type, priority, action_url, action_label,
+        related_entity_type, related_entity_id, sender_id, custom_fields:
+            Notification columns, identical for every recipient
+        commit: Commit the transaction
+
+    Returns:
+        Number of recipients notified
+    """
+    table = Notification.__table__
+    counters = UserUnreadCount.__table__
+    now = datetime.utcnow()
+
+    values = {
+        'title': title,
+        'message': message,
+        'notification_type': notification_type,
+        'priority': priority,
+        'is_read': False,
+        'action_url': action_url,
+        'action_label': action_label,
+        'related_entity_type': related_entity_type,
+        'related_entity_id': related_entity_id,
+        'sender_id': sender_id,
+        'custom_fields': custom_fields or {},
+        'created_at': now,
+        'updated_at': now,
+    }
+
+    recipients = recipient_ids_query(audience).subquery('recipients')
+    inserted = table.insert().from_select(
+        ['user_id', *values],
+        select(recipients.c.id, *[literal(value, table.c[name].type) for name, value in values.items()])
+    ).returning(table.c.user_id).cte('inserted')
+
+    # One row per recipient, so each counter is bumped exactly once. Rows are
+    # locked in user_id order, so concurrent fan-outs to overlapping
+    # audiences wait on each other instead of deadlocking.
+    bump = pg_insert(counters).from_select(
+        ['user_id', 'notifications_unread', 'updated_at'],
+        select(inserted.c.user_id, literal(1), literal(now)).order_by(inserted.c.user_id)
+    )
+    bump = bump.on_conflict_do_update(
+        index_elements=[counters.c.user_id],
+        set_={
+            'notifications_unread': counters.c.notifications_unread + bump.excluded.notifications_unread,
+            'updated_at': bump.excluded.updated_at,
+        }
+    ).returning(counters.c.user_id)
+
+    try:
+        recipient_ids = db.session.execute(bump).scalars().all()
+        notified = len(recipient_ids)
+        connection = db.session.connection()
+        for start in range(0, notified, REALTIME_IDS_PER_EVENT):
+            publish_event(connection, {
+                'type': 'notification',
+                'to': recipient_ids[start:start + REALTIME_IDS_PER_EVENT],
+                'title': title[:200],
+                'priority': priority,
+            })
+        if commit:
+            db.session.commit()
+        print(f"✓ Notified {notified} users: {title}")
+        return notified
+    except Exception as e:
+        print(f"✗ Error fanning out notification: {e}")
+        db.session.rollback()
+        raise
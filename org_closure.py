@@ -0,0 +1,206 @@
+"""
+Organization Closure Tables
+Subtree queries over users.parent_id and departments.parent_id as a single
+indexed join on user_closure / department_closure
+
+    # All submissions made by a manager's reports (at any depth)
+    filter_subtree(ChecklistSubmission.query, ChecklistSubmission.user_id, User, manager_id)
+
+    # A plant and every sub-department below it
+    Department.query.filter(in_subtree(Department.id, Department, plant_id))
+
+The tables are kept current by the insert/update events in models.py,
+including moves of whole subtrees. rebuild_closure() recreates them from
+parent_id, e.g. after bulk loads that bypassed the ORM.
+"""
+
+from models import db, User, Department, ChecklistSubmission, CLOSURE_MODELS
+from pagination import keyset_filter
+from sqlalchemy import func, select, text
+
+
+# ============================================================================
+# SUBTREE QUERIES
+# ============================================================================
+
+def subtree_ids(model, root_id, include_self=True, max_depth=None):
+    """
+    SELECT of the ids below root_id (served by the ancestor_id, depth index)
+
+    Args:
+        model: User or Department
+        root_id: ID of the subtree root
+        include_self: Include root_id itself (depth 0)
+        max_depth: Only go this many levels down
+    """
+    closure = CLOSURE_MODELS[model]
+    query = select(closure.descendant_id).where(closure.ancestor_id == root_id)
+    if not include_self:
+        query = query.where(closure.depth > 0)
+    if max_depth is not None:
+        query = query.where(closure.depth <= max_depth)
+    return query
+
+
+def ancestor_ids(model, node_id, include_self=False):
+    """IDs above node_id, nearest first"""
+    closure = CLOSURE_MODELS[model]
+    query = select(closure.ancestor_id).where(closure.descendant_id == node_id)
+    if not include_self:
+        query = query.where(closure.depth > 0)
+    return db.session.execute(query.order_by(closure.depth)).scalars().all()
+
+
+def in_subtree(column, model, root_id, include_self=True, max_depth=None):
+    """Condition: column holds an id inside the subtree of root_id"""
+    return column.in_(subtree_ids(model, root_id, include_self, max_depth))
+
+
+def filter_subtree(query, column, model, root_id, include_self=True, max_depth=None):
+    """
+    Restrict a query to rows whose column points into the subtree of root_id
+
+    Args:
+        query: Query to filter
+        column: Column holding a user or department id (e.g. ChecklistSubmission.user_id)
+        model: User or Department
+        root_id: ID of the subtree root
+    """
+    closure = CLOSURE_MODELS[model]
+    query = query.join(closure, closure.descendant_id == column).filter(closure.ancestor_id == root_id)
+    if not include_self:
+        query = query.filter(closure.depth > 0)
+    if max_depth is not None:
+        query = query.filter(closure.depth <= max_depth)
+    return query
+
+
+def is_in_subtree(model, root_id, node_id):
+    """True when node_id is root_id or below it"""
+    closure = CLOSURE_MODELS[model]
+    return db.session.execute(
+        select(closure.depth).where(closure.ancestor_id == root_id, closure.descendant_id == node_id)
+    ).first() is not None
+
+
+def get_submissions_under_manager(manager_id, include_self=False):
+    """Checklist submissions by everyone reporting to a manager, newest first"""
+    query = filter_subtree(
+        ChecklistSubmission.query, ChecklistSubmission.user_id, User, manager_id, include_self
+    )
+    return query.order_by(ChecklistSubmission.submission_date.desc()).all()
+
+
+def get_department_subtree(department_id, include_self=True, active_only=True):
+    """A department and all departments below it, ordered by name"""
+    query = filter_subtree(Department.query, Department.id, Department, department_id, include_self)
+    if active_only:
+        query = query.filter(Department.is_deleted == False, Department.is_active == True)
+    return query.order_by(Department.name).all()
+
+
+# ============================================================================
+# ORG CHART PAGES
+# ============================================================================
+
+def _org_chart_sort_key(model):
+    if model is User:
+        return func.lower(func.coalesce(User.full_name, User.username))
+    return func.lower(model.name)
+
+
+def get_children_page(model, parent_id, cursor_values=None, limit=50):
+    """
+    One page of the direct children of a node, with their own child counts
+
+    Costs two queries whatever the size of the tree: the keyset-paginated
+    children, and one grouped count over the closure's depth-1 rows for
+    just those children.
+
+    Args:
+        model: User or Department
+        parent_id: ID of the node to expand (None for top-level nodes)
+        cursor_values: Decoded cursor of the previous page
+        limit: Page size
+
+    Returns:
+        Tuple of ([(node, child_count), ...], next cursor values or None)
+    """
+    sort_key = _org_chart_sort_key(model)
+    query = model.query.filter(
+        model.parent_id == parent_id if parent_id is not None else model.parent_id.is_(None),
+        model.is_deleted == False
+    )
+    query = keyset_filter(query, [sort_key, model.id], cursor_values)
+    rows = query.with_entities(model, sort_key.label('sort_key')) \
+        .order_by(sort_key, model.id).limit(limit + 1).all()
+
+    page, has_more = rows[:limit], len(rows) > limit
+    ids = [node.id for node, _ in page]
+
+    counts = {}
+    if ids:
+        closure = CLOSURE_MODELS[model]
+        counts = dict(
+            db.session.query(closure.ancestor_id, func.count())
+            .join(model, model.id == closure.descendant_id)
+            .filter(closure.ancestor_id.in_(ids), closure.depth == 1, model.is_deleted == False)
+            .group_by(closure.ancestor_id)
+            .all()
+        )
+
+    next_values = [page[-1][1], page[-1][0].id] if has_more else None
+    return [(node, counts.get(node.id, 0)) for node, _ in page], next_values
+
+
+# ============================================================================
+# MAINTENANCE
+# ============================================================================
+
+REBUILD_SQL = """
+    INSERT INTO {closure} (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+        SELECT id, id, 0 FROM {table}
+        UNION ALL
+        SELECT tree.ancestor_id, child.id, tree.depth + 1
+        FROM tree JOIN {table} child ON child.parent_id = tree.descendant_id
+        WHERE tree.depth < {max_depth}
+    )
+    SELECT ancestor_id, descendant_id, MIN(depth) FROM tree
+    GROUP BY ancestor_id, descendant_id
+"""
+
+
+def rebuild_closure(model, commit=True):
+    """
+    Recreate a closure table from parent_id in one statement
+
+    Returns:
+        Number of closure rows written
+    """
+    closure = CLOSURE_MODELS[model]
+    db.session.execute(text(f"DELETE FROM {closure.__tablename__}"))
+    result = db.session.execute(text(REBUILD_SQL.format(
+        closure=closure.__tablename__,
+        table=model.__tablename__,
+        max_depth=model.MAX_HIERARCHY_DEPTH,
+    )))
+    if commit:
+        db.session.commit()
+    return result.rowcount
+
+
+if __name__ == '__main__':
+    from app import app
+    import sys
+
+    with app.app_context():
+        command = sys.argv[1] if len(sys.argv) > 1 else None
+
+        if command == 'rebuild':
+            for model in CLOSURE_MODELS:
+                rows = rebuild_closure(model)
+                print(f"✓ Rebuilt {CLOSURE_MODELS[model].__tablename__} ({rows} rows)")
+        else:
+            print("Available commands:")
+            print("  python org_closure.py rebuild - Recreate user_closure and department_closure from parent_id")
@@ -0,0 +1,76 @@
+"""
+Keyset Pagination
+Opaque cursors and "rows after this key" filters for APIs that page through
+large tables without OFFSET (each page costs the same however deep it is)
+
+    query = keyset_filter(query, [sort_column, Model.id], decode_cursor(cursor))
+    rows = query.order_by(sort_column, Model.id).limit(per_page + 1).all()
+    next_cursor = encode_cursor([row_sort_value, row.id]) if len(rows) > per_page else None
+"""
+
+from sqlalchemy import tuple_
+from datetime import date, datetime
+import base64
+import json
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row on a page as an opaque string"""
+    payload = [
+        {'$dt': value.isoformat()} if isinstance(value, (datetime, date)) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor()
+
+    Returns:
+        List of key values, or None for an empty cursor
+
+    Raises:
+        ValueError: the cursor is malformed
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(payload, list):
+        raise ValueError("Invalid cursor")
+    return [
+        datetime.fromisoformat(value['$dt']) if isinstance(value, dict) and '$dt' in value else value
+        for value in payload
+    ]
+
+
+def keyset_filter(query, columns, values, descending=False):
+    """
+    Keep only rows that sort after the cursor key
+
+    Args:
+        query: Query to filter
+        columns: Sort columns, ending with a unique column (usually the id)
+        values: Decoded cursor values (None for the first page)
+        descending: True when the query is ordered DESC on every column
+    """
+    if values is None:
+        return query
+    if len(values) != len(columns):
+        raise ValueError("Cursor does not match the requested sort")
+    key, cursor = tuple_(*columns), tuple_(*values)
+    return query.filter(key < cursor if descending else key > cursor)
+
+
+def parse_page_size(value, default=50, maximum=200):
+    """Page size from a query-string value, clamped to 1..maximum"""
+    try:
+        size = int(value) if value else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
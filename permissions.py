@@ -0,0 +1,239 @@
+"""
+Permission Engine
+Flattens role permissions, including those inherited through parent_role_id,
+into one integer bitset per role so permission checks are a single AND
+
+    if role_has_permission(session['user']['role_id'], 'manage_users'): ...
+
+    @app.route('/superadmin/manage_roles')
+    @permission_required('manage_roles')
+    def manage_roles(): ...
+
+Child roles inherit every permission granted to their ancestors. Roles that
+are inactive or deleted resolve to an empty bitset (and grant nothing to
+their children). The compiled table is rebuilt lazily after any Role insert,
+update or delete in this worker, and at most PERMISSION_CACHE_TTL seconds
+after a change made by another worker.
+"""
+
+from flask import session, request, jsonify, flash, redirect, url_for
+from functools import wraps
+from models import db, Role, Department
+from org_closure import subtree_ids
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+import threading
+import time
+
+
+# Permissions granted through the role form, as (key, label)
+ROLE_FORM_PERMISSIONS = (
+    ('view_users', 'View Users'),
+    ('manage_users', 'Manage Users'),
+    ('view_departments', 'View Departments'),
+    ('manage_departments', 'Manage Departments'),
+    ('view_questions', 'View Questions'),
+    ('manage_questions', 'Manage Questions'),
+    ('view_checklists', 'View Checklists'),
+    ('manage_checklists', 'Manage Checklists'),
+    ('view_all_data', 'View All Data'),
+    ('manage_roles', 'Manage Roles'),
+    ('send_notifications', 'Send Notifications'),
+    ('send_messages', 'Send Messages'),
+    ('broadcast_messages', 'Broadcast Messages'),
+)
+
+_settings = {
+    'ttl': 60,              # seconds before another worker's role changes are picked up
+}
+_compiled = None            # {'bits': {key: bit}, 'masks': {role_id: int}, 'expires_at': float}
+_compile_lock = threading.Lock()
+
+
+def init_permissions(app):
+    """Read the cache settings from the app config"""
+    _settings['ttl'] = app.config.get('PERMISSION_CACHE_TTL', _settings['ttl'])
+
+
+# ============================================================================
+# COMPILATION
+# ============================================================================
+
+def compile_permissions():
+    """
+    Walk the role tree once and build the bitset table
+
+    Returns:
+        Dict with 'bits' (permission key -> bit value) and 'masks' (role id -> bitset)
+    """
+    rows = db.session.query(
+        Role.id, Role.parent_role_id, Role.permissions, Role.is_active, Role.is_deleted
+    ).all()
+
+    # Bits are assigned in key order; they are only meaningful within one compile
+    keys = sorted({
+        key for row in rows
+        for key, granted in (row.permissions or {}).items() if granted
+    })
+    bits = {key: 1 << position for position, key in enumerate(keys)}
+
+    roles = {row.id: row for row in rows}
+    masks = {}
+
+    def resolve(role_id, visiting):
+        if role_id in masks:
+            return masks[role_id]
+        row = roles.get(role_id)
+        if row is None or role_id in visiting or not row.is_active or row.is_deleted:
+            # Unknown, cyclic or disabled roles grant nothing
+            return 0
+
+        visiting.add(role_id)
+        mask = 0
+        for key, granted in (row.permissions or {}).items():
+            if granted:
+                mask |= bits[key]
+        if row.parent_role_id:
+            mask |= resolve(row.parent_role_id, visiting)
+        visiting.discard(role_id)
+
+        masks[role_id] = mask
+        return mask
+
+    for role_id in roles:
+        resolve(role_id, set())
+
+    return {'bits': bits, 'masks': masks}
+
+
+def _get_compiled():
+    global _compiled
+    compiled = _compiled
+    if compiled is None or compiled['expires_at'] <= time.monotonic():
+        with _compile_lock:
+            compiled = _compiled
+            if compiled is None or compiled['expires_at'] <= time.monotonic():
+                compiled = compile_permissions()
+                compiled['expires_at'] = time.monotonic() + _settings['ttl']
+                _compiled = compiled
+    return compiled
+
+
+def invalidate_permissions():
+    """Force a recompile on the next check in this worker"""
+    global _compiled
+    _compiled = None
+
+
+def merge_form_permissions(existing, submitted_keys):
+    """
+    Apply the role form's checkboxes to a role's permissions
+
+    Keys on the form are set from submitted_keys; every other key the role
+    already holds is kept as it is.
+    """
+    permissions = dict(existing or {})
+    for key, _ in ROLE_FORM_PERMISSIONS:
+        permissions[key] = key in submitted_keys
+    return permissions
+
+
+# ============================================================================
+# CHECKS
+# ============================================================================
+
+def role_permission_mask(role_id):
+    """Flattened bitset of a role (0 for unknown roles)"""
+    return _get_compiled()['masks'].get(role_id, 0)
+
+
+def role_has_permission(role_id, permission_key):
+    """True when the role, or any role it inherits from, grants the permission"""
+    compiled = _get_compiled()
+    bit = compiled['bits'].get(permission_key)
+    return bool(bit) and bool(compiled['masks'].get(role_id, 0) & bit)
+
+
+def role_permissions(role_id):
+    """Set of permission keys a role holds after inheritance"""
+    compiled = _get_compiled()
+    mask = compiled['masks'].get(role_id, 0)
+    return {key for key, bit in compiled['bits'].items() if mask & bit}
+
+
+def visible_department_ids():
+    """
+    Departments whose data the logged-in user may read: None (every
+    department) with view_all_data, otherwise their own department and the
+    departments below it
+    """
+    user = session.get('user') or {}
+    if role_has_permission(user.get('role_id'), 'view_all_data'):
+        return None
+    if not user.get('department_id'):
+        return []
+    return db.session.execute(subtree_ids(Department, user['department_id'])).scalars().all()
+
+
+def permission_required(*permission_keys, api=False, any_of=False):
+    """
+    Route decorator: the logged-in user's role must hold every listed permission
+
+    Uses session['user']['role_id'], so no user or role is loaded.
+
+    Args:
+        permission_keys: Permissions that are all required
+        api: Respond with JSON 401/403 instead of flash + redirect
+        any_of: One of the listed permissions is enough
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            user = session.get('user')
+            if not user:
+                if api:
+                    return jsonify({'success': False, 'message': 'Not logged in'}), 401
+                return redirect(url_for('login'))
+
+            role_id = user.get('role_id')
+            check = any if any_of else all
+            if not check(role_has_permission(role_id, key) for key in permission_keys):
+                print(f"✗ Permission denied for user {user.get('id')} on {request.path}: {', '.join(permission_keys)}")
+                if api:
+                    return jsonify({'success': False, 'message': 'Access denied'}), 403
+                flash("Access denied. You do not have permission to view that page.", "error")
+                return redirect(url_for('login'))
+
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+# ============================================================================
+# INVALIDATION
+# ============================================================================
+
+def _roles_changed(mapper, connection, target):
+    invalidate_permissions()
+    # Flag the session so the table is dropped again once the change is
+    # committed (a check made mid-transaction could have compiled it)
+    target_session = object_session(target)
+    if target_session is not None:
+        target_session.info['roles_changed'] = True
+
+
+def _after_commit(committed_session):
+    if committed_session.info.pop('roles_changed', False):
+        invalidate_permissions()
+
+
+def _after_rollback(rolled_back_session):
+    if rolled_back_session.info.pop('roles_changed', False):
+        invalidate_permissions()
+
+
+event.listen(Role, 'after_insert', _roles_changed)
+event.listen(Role, 'after_update', _roles_changed)
+event.listen(Role, 'after_delete', _roles_changed)
+event.listen(Session, 'after_commit', _after_commit)
+event.listen(Session, 'after_rollback', _after_rollback)
@@ -0,0 +1,368 @@
+"""
+Real-time Push
+Server-sent events for new notifications, messages and broadcasts, fed by
+Postgres LISTEN/NOTIFY
+
+    publish_event(connection, {'type': 'notification', 'to': [user_id], ...})
+    client_id, client = hub.subscribe(user)     # in the /api/events view
+    return Response(hub.stream(client_id, client), mimetype='text/event-stream')
+
+Writers call pg_notify on the connection of the transaction that creates the
+rows (the Notification/Message/Broadcast events below, and
+notifications.fan_out_notification()), so an event is delivered on commit
+and never for a rolled-back insert.
+
+Each web worker holds one LISTEN connection, opened by a listener thread when
+its first client subscribes and shared by every stream in the worker. The
+listener sleeps in select() on that connection; stream threads sleep on their
+own queue and only write a heartbeat comment when nothing arrives, so an idle
+stream costs no queries at all. When a notification arrives the listener
+keeps collecting for REALTIME_BATCH_WINDOW seconds and hands each client one
+batch with everything addressed to it, so a burst (a fan-out to a whole
+department, a busy thread) becomes one SSE event per client.
+
+Events are addressed either to user ids ('to') or to an audience of resolved
+department/team/role/user ids ('audience', see
+notifications.resolve_audience_ids()), matched against the department, team
+and role each client had when it subscribed. Payloads only say what changed;
+clients fetch the rows (or /api/unread_counts) themselves.
+"""
+
+from models import db, Notification, Message, Broadcast
+from sqlalchemy import event, text
+from datetime import datetime
+import itertools
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+
+# pg_notify payloads must stay below 8000 bytes
+MAX_PAYLOAD_BYTES = 7900
+
+_settings = {
+    'channel': 'mobility_events',
+}
+
+
+# ============================================================================
+# PUBLISHING
+# ============================================================================
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a realtime event")
+
+
+def publish_event(connection, payload):
+    """
+    Queue an event with pg_notify in the connection's transaction
+
+    It reaches listeners when the transaction commits. An event too large for
+    NOTIFY is reduced to its type with resync=True and sent to every client,
+    which then refetches.
+
+    Args:
+        connection: SQLAlchemy connection of the writing transaction
+        payload: Dict with 'type' and either 'to' (user ids) or 'audience'
+    """
+    data = json.dumps(payload, default=_encode, separators=(',', ':'))
+    if len(data.encode('utf-8')) > MAX_PAYLOAD_BYTES:
+        data = json.dumps({'type': payload['type'], 'resync': True})
+    connection.execute(text("SELECT pg_notify(:channel, :payload)"),
+                       {'channel': _settings['channel'], 'payload': data})
+
+
+def _publish_notification(mapper, connection, target):
+    publish_event(connection, {
+        'type': 'notification',
+        'to': [target.user_id],
+        'id': target.id,
+        'title': (target.title or '')[:200],
+        'priority': target.priority,
+    })
+
+
+def _publish_message(mapper, connection, target):
+    if target.is_deleted:
+        return
+    publish_event(connection, {
+        'type': 'message',
+        'to': sorted({target.recipient_id, target.sender_id}),
+        'id': target.id,
+        'thread_id': target.thread_id,
+        'sender_id': target.sender_id,
+        'subject': (target.subject or '')[:200],
+    })
+
+
+def _publish_broadcast(mapper, connection, target):
+    publish_event(connection, {
+        'type': 'broadcast',
+        'audience': {
+            'department_ids': target.department_ids,
+            'team_ids': target.team_ids,
+            'role_ids': target.role_ids,
+            'user_ids': target.user_ids,
+            'exclude_user_ids': sorted(set(target.exclude_user_ids or []) | {target.sender_id}),
+        },
+        'id': target.id,
+        'subject': (target.subject or '')[:200],
+    })
+
+
+event.listen(Notification, 'after_insert', _publish_notification)
+event.listen(Message, 'after_insert', _publish_message)
+event.listen(Broadcast, 'after_insert', _publish_broadcast)
+
+
+# ============================================================================
+# CLIENTS
+# ============================================================================
+
+class RealtimeClient:
+    """One open event stream"""
+
+    def __init__(self, user, queue_size):
+        self.user_id = user.id
+        self.department_id = user.department_id
+        self.team_id = user.team_id
+        self.role_id = user.role_id
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def matches(self, payload):
+        """Whether an event is addressed to this client's user"""
+        if payload.get('resync'):
+            return True
+        if 'to' in payload:
+            return self.user_id in payload['to']
+
+        audience = payload.get('audience') or {}
+        if self.user_id in (audience.get('exclude_user_ids') or ()):
+            return False
+        for key, value in (('department_ids', self.department_id), ('team_ids', self.team_id),
+                           ('role_ids', self.role_id), ('user_ids', self.user_id)):
+            if audience.get(key) is not None and value not in audience[key]:
+                return False
+        return True
+
+    def push(self, batch):
+        """Queue a batch; False when the reader has stalled and the queue is full"""
+        try:
+            self.queue.put_nowait(batch)
+            return True
+        except queue.Full:
+            # It is told to resync instead of getting a backlog
+            self.overflowed = True
+            return False
+
+
+# ============================================================================
+# HUB
+# ============================================================================
+
+class RealtimeHub:
+    """Per-worker LISTEN connection and the streams it feeds"""
+
+    def __init__(self, heartbeat=25, batch_window=0.1, max_clients=4, queue_size=100):
+        self.heartbeat = heartbeat
+        self.batch_window = batch_window
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.app = None
+        self._clients = {}          # client id -> RealtimeClient
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        self.stats = {'notifies': 0, 'batches': 0, 'deliveries': 0, 'overflows': 0, 'reconnects': 0}
+
+    def init_app(self, app):
+        self.app = app
+        _settings['channel'] = app.config.get('REALTIME_CHANNEL', _settings['channel'])
+        self.heartbeat = app.config.get('REALTIME_HEARTBEAT', self.heartbeat)
+        self.batch_window = app.config.get('REALTIME_BATCH_WINDOW', self.batch_window)
+        self.max_clients = app.config.get('REALTIME_MAX_CLIENTS', self.max_clients)
+        self.queue_size = app.config.get('REALTIME_QUEUE_SIZE', self.queue_size)
+
+    # ---- subscriptions -----------------------------------------------------
+
+    def subscribe(self, user):
+        """
+        Register a stream for a user
+
+        Returns:
+            (client id, RealtimeClient)
+
+        Raises:
+            RuntimeError: this worker already serves max_clients streams
+        """
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                raise RuntimeError("Too many event streams on this worker")
+            client_id = next(self._ids)
+            client = self._clients[client_id] = RealtimeClient(user, self.queue_size)
+        self._ensure_thread()
+        return client_id, client
+
+    def unsubscribe(self, client_id):
+        with self._lock:
+            self._clients.pop(client_id, None)
+
+    def stream(self, client_id, client):
+        """
+        SSE body for one client: batches as they arrive, a heartbeat comment
+        otherwise; unsubscribes when the client goes away
+        """
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    events = client.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+
+                # Anything queued meanwhile goes out in the same SSE event
+                while True:
+                    try:
+                        events = events + client.queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                if client.overflowed:
+                    client.overflowed = False
+                    events = [{'type': 'resync', 'resync': True}]
+                yield f"event: batch\ndata: {json.dumps(events, separators=(',', ':'))}\n\n"
+        finally:
+            self.unsubscribe(client_id)
+
+    # ---- listening ---------------------------------------------------------
+
+    def _ensure_thread(self):
+        """Start the listener in this process (gunicorn forks after import)"""
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._run, name='realtime-listener', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _connect(self):
+        """A connection of its own, outside the pool, listening on the channel"""
+        with self.app.app_context():
+            raw = db.engine.raw_connection()
+        raw.detach()
+        connection = raw.driver_connection
+        connection.rollback()
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{_settings["channel"]}"')
+        return connection
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = self._connect()
+                print(f"✓ Listening for realtime events on {_settings['channel']}")
+                backoff = 1
+                self._listen(connection)
+            except Exception as e:
+                print(f"✗ Realtime listener error: {e}")
+                self.stats['reconnects'] += 1
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _receive(self, connection, timeout):
+        """Wait up to timeout seconds and return the payloads that arrived"""
+        if not select.select([connection], [], [], timeout)[0]:
+            return []
+        connection.poll()
+        notifies = list(connection.notifies)
+        connection.notifies.clear()
+        self.stats['notifies'] += len(notifies)
+        return [notify.payload for notify in notifies]
+
+    def _listen(self, connection):
+        while not self._stop.is_set():
+            # Blocks in select() without touching the database while idle
+            payloads = self._receive(connection, self.heartbeat)
+            if not payloads:
+                continue
+
+            deadline = time.monotonic() + self.batch_window
+            while (remaining := deadline - time.monotonic()) > 0:
+                payloads.extend(self._receive(connection, remaining))
+
+            self._dispatch(payloads)
+
+    def _dispatch(self, payloads):
+        """Hand every client one batch of the events addressed to it"""
+        events = []
+        for payload in payloads:
+            try:
+                events.append(json.loads(payload))
+            except ValueError:
+                print(f"✗ Ignoring malformed realtime payload: {payload[:100]}")
+
+        with self._lock:
+            clients = list(self._clients.values())
+
+        self.stats['batches'] += 1
+        for client in clients:
+            batch = [e for e in events if client.matches(e)]
+            if batch:
+                if client.push(batch):
+                    self.stats['deliveries'] += 1
+                else:
+                    self.stats['overflows'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            clients = len(self._clients)
+        return {
+            'clients': clients,
+            'listening': self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive(),
+            'channel': _settings['channel'],
+            **self.stats
+        }
+
+
+hub = RealtimeHub()
+
+
+if __name__ == '__main__':
+    from app import app
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == 'listen':
+        # Print every event on the channel, e.g. to check that writers publish
+        connection = hub._connect()
+        print("Waiting for events (Ctrl+C to stop)...")
+        try:
+            while True:
+                for payload in hub._receive(connection, hub.heartbeat):
+                    print(payload)
+        except KeyboardInterrupt:
+            connection.close()
+    else:
+        print("Available commands:")
+        print("  python realtime.py listen - Print realtime events as they are published")
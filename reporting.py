@@ -0,0 +1,333 @@
+"""
+Reporting Rollups
+Maintains the per-department daily rollup table (department_daily_stats) from
+checklist_submissions and checklist_assignments, and serves reports from it
+"""
+
+from models import db, DepartmentDailyStats
+from sqlalchemy import text
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, date, timedelta
+
+
+# ============================================================================
+# ROLLUP SQL
+# ============================================================================
+
+# Submissions are bucketed by the department and day they were submitted in;
+# assignments by their template's department and due day (creation day when
+# no due date was set). Both sides are aggregated in one pass.
+_ROLLUP_SOURCE_SQL = """
+    SELECT s.department_id_at_submission AS department_id,
+           CAST(s.submission_date AS DATE) AS stat_date,
+           1 AS submissions,
+           CASE WHEN a.due_date IS NOT NULL AND s.submission_date > a.due_date THEN 1 ELSE 0 END AS late,
+           COALESCE(s.completion_time_seconds, 0) AS completion_seconds,
+           CASE WHEN s.completion_time_seconds IS NOT NULL THEN 1 ELSE 0 END AS completion_samples,
+           0 AS due,
+           0 AS completed
+    FROM checklist_submissions s
+    JOIN checklist_assignments a ON a.id = s.assignment_id
+    WHERE s.status = 'completed'
+      AND s.department_id_at_submission IS NOT NULL
+      AND s.submission_date >= :start AND s.submission_date < :end
+      {submission_department_filter}
+
+    UNION ALL
+
+    SELECT t.department_id,
+           CAST(COALESCE(a.due_date, a.created_at) AS DATE),
+           0, 0, 0, 0,
+           1,
+           CASE WHEN a.status = 'completed' THEN 1 ELSE 0 END
+    FROM checklist_assignments a
+    JOIN checklist_templates t ON t.id = a.template_id
+    WHERE a.is_deleted = false
+      AND t.department_id IS NOT NULL
+      AND COALESCE(a.due_date, a.created_at) >= :start
+      AND COALESCE(a.due_date, a.created_at) < :end
+      {assignment_department_filter}
+"""
+
+_UPSERT_SQL = """
+    INSERT INTO department_daily_stats (
+        department_id, stat_date,
+        submissions_count, late_submissions_count,
+        completion_time_total_seconds, completion_time_samples,
+        assignments_due_count, assignments_completed_count,
+        refreshed_at
+    )
+    SELECT department_id, stat_date,
+           SUM(submissions), SUM(late),
+           SUM(completion_seconds), SUM(completion_samples),
+           SUM(due), SUM(completed),
+           :refreshed_at
+    FROM ({source}) AS src
+    GROUP BY department_id, stat_date
+    ON CONFLICT (department_id, stat_date) DO UPDATE SET
+        submissions_count = EXCLUDED.submissions_count,
+        late_submissions_count = EXCLUDED.late_submissions_count,
+        completion_time_total_seconds = EXCLUDED.completion_time_total_seconds,
+        completion_time_samples = EXCLUDED.completion_time_samples,
+        assignments_due_count = EXCLUDED.assignments_due_count,
+        assignments_completed_count = EXCLUDED.assignments_completed_count,
+        refreshed_at = EXCLUDED.refreshed_at
+"""
+
+# Rows in the refreshed window that the upsert did not touch no longer have any
+# source data (e.g. the assignment was deleted) and are removed.
+_DELETE_STALE_SQL = """
+    DELETE FROM department_daily_stats
+    WHERE stat_date >= :start_date AND stat_date < :end_date
+      AND refreshed_at < :refreshed_at
+      {department_filter}
+"""
+
+
+# ============================================================================
+# INCREMENTAL REFRESH
+# ============================================================================
+
+def refresh_department_days(start_date, end_date=None, department_ids=None, commit=True):
+    """
+    Rebuild the rollup rows for a date range from the raw tables
+
+    The refresh is idempotent: running it twice for the same window leaves the
+    same rows behind, so it is safe to call after every submission and to
+    re-run over history.
+
+    Args:
+        start_date: First day to rebuild (date)
+        end_date: Last day to rebuild, inclusive (defaults to start_date)
+        department_ids: Optional list of department IDs to limit the refresh to
+        commit: Commit the transaction when done
+
+    Returns:
+        Number of rollup rows written
+    """
+    end_date = end_date or start_date
+    window_end = end_date + timedelta(days=1)
+    refreshed_at = datetime.utcnow()
+
+    params = {
+        'start': datetime.combine(start_date, datetime.min.time()),
+        'end': datetime.combine(window_end, datetime.min.time()),
+        'start_date': start_date,
+        'end_date': window_end,
+        'refreshed_at': refreshed_at,
+    }
+
+    if department_ids:
+        params['department_ids'] = list(department_ids)
+        source = _ROLLUP_SOURCE_SQL.format(
+            submission_department_filter="AND s.department_id_at_submission = ANY(:department_ids)",
+            assignment_department_filter="AND t.department_id = ANY(:department_ids)",
+        )
+        department_filter = "AND department_id = ANY(:department_ids)"
+    else:
+        source = _ROLLUP_SOURCE_SQL.format(
+            submission_department_filter="",
+            assignment_department_filter="",
+        )
+        department_filter = ""
+
+    result = db.session.execute(text(_UPSERT_SQL.format(source=source)), params)
+    db.session.execute(text(_DELETE_STALE_SQL.format(department_filter=department_filter)), params)
+
+    if commit:
+        db.session.commit()
+
+    return result.rowcount
+
+
+def refresh_department_day(department_id, day, commit=True):
+    """Rebuild a single department/day rollup row"""
+    return refresh_department_days(day, day, department_ids=[department_id], commit=commit)
+
+
+def refresh_for_submission(submission):
+    """
+    Refresh the rollup rows affected by a checklist submission
+
+    A submission counts towards the day it was made in, and completes an
+    assignment that counts towards its due day, so both are rebuilt.
+    """
+    assignment = submission.assignment
+    affected = {}
+
+    if submission.department_id_at_submission:
+        affected.setdefault(submission.submission_date.date(), set()).add(
+            submission.department_id_at_submission
+        )
+
+    if assignment and assignment.template and assignment.template.department_id:
+        due = assignment.due_date or assignment.created_at
+        affected.setdefault(due.date(), set()).add(assignment.template.department_id)
+
+    for day, department_ids in affected.items():
+        refresh_department_days(day, day, department_ids=department_ids, commit=False)
+
+    db.session.commit()
+
+
+# ============================================================================
+# BACKFILL
+# ============================================================================
+
+def _date_chunks(start_date, end_date, chunk_days):
+    """Split an inclusive date range into consecutive inclusive chunks"""
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+def backfill_daily_stats(app, start_date, end_date, chunk_days=None, workers=None):
+    """
+    Rebuild the rollup table over a historical range in parallel chunks
+
+    Each chunk runs in its own thread, app context and database session, so
+    chunks are independent transactions and a failed chunk can simply be re-run.
+
+    Args:
+        app: Flask application (used to push an app context per worker)
+        start_date: First day to rebuild (date)
+        end_date: Last day to rebuild, inclusive (date)
+        chunk_days: Days per chunk (defaults to REPORTING_BACKFILL_CHUNK_DAYS)
+        workers: Parallel workers (defaults to REPORTING_BACKFILL_WORKERS)
+
+    Returns:
+        Dict with chunk and row counts
+    """
+    chunk_days = chunk_days or app.config.get('REPORTING_BACKFILL_CHUNK_DAYS', 7)
+    workers = workers or app.config.get('REPORTING_BACKFILL_WORKERS', 4)
+
+    def run_chunk(chunk_start, chunk_end):
+        with app.app_context():
+            try:
+                return refresh_department_days(chunk_start, chunk_end)
+            except Exception:
+                db.session.rollback()
+                raise
+
+    chunks = list(_date_chunks(start_date, end_date, chunk_days))
+    results = {'chunks': len(chunks), 'failed_chunks': 0, 'rows': 0}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_chunk, chunk_start, chunk_end): (chunk_start, chunk_end)
+            for chunk_start, chunk_end in chunks
+        }
+        for future in as_completed(futures):
+            chunk_start, chunk_end = futures[future]
+            try:
+                rows = future.result()
+                results['rows'] += rows
+                print(f"✓ Rebuilt {chunk_start} .. {chunk_end} ({rows} rows)")
+            except Exception as e:
+                results['failed_chunks'] += 1
+                print(f"✗ Error rebuilding {chunk_start} .. {chunk_end}: {e}")
+
+    return results
+
+
+# ============================================================================
+# REPORT QUERIES
+# ============================================================================
+
+def get_department_daily_stats(start_date, end_date, department_id=None, department_ids=None):
+    """
+    Read rollup rows for a date range (inclusive), optionally limited to one
+    department or to a list of them
+
+    Returns:
+        List of per-department, per-day dicts ordered by date
+    """
+    query = DepartmentDailyStats.query.filter(
+        DepartmentDailyStats.stat_date >= start_date,
+        DepartmentDailyStats.stat_date <= end_date
+    )
+
+    if department_id:
+        query = query.filter(DepartmentDailyStats.department_id == department_id)
+    if department_ids is not None:
+        query = query.filter(DepartmentDailyStats.department_id.in_(department_ids))
+
+    rows = query.order_by(
+        DepartmentDailyStats.stat_date,
+        DepartmentDailyStats.department_id
+    ).all()
+
+    return [row.to_dict() for row in rows]
+
+
+def get_department_summary(start_date, end_date, department_id=None, department_ids=None):
+    """
+    Aggregate rollup rows over a date range into one row per department
+
+    Returns:
+        List of dicts with totals, completion rate and average completion time
+    """
+    query = db.session.query(
+        DepartmentDailyStats.department_id,
+        db.func.sum(DepartmentDailyStats.submissions_count),
+        db.func.sum(DepartmentDailyStats.late_submissions_count),
+        db.func.sum(DepartmentDailyStats.completion_time_total_seconds),
+        db.func.sum(DepartmentDailyStats.completion_time_samples),
+        db.func.sum(DepartmentDailyStats.assignments_due_count),
+        db.func.sum(DepartmentDailyStats.assignments_completed_count),
+    ).filter(
+        DepartmentDailyStats.stat_date >= start_date,
+        DepartmentDailyStats.stat_date <= end_date
+    )
+
+    if department_id:
+        query = query.filter(DepartmentDailyStats.department_id == department_id)
+    if department_ids is not None:
+        query = query.filter(DepartmentDailyStats.department_id.in_(department_ids))
+
+    summary = []
+    for dept_id, submissions, late, seconds, samples, due, completed in query.group_by(
+        DepartmentDailyStats.department_id
+    ).all():
+        summary.append({
+            'department_id': dept_id,
+            'submissions_count': int(submissions or 0),
+            'late_submissions_count': int(late or 0),
+            'avg_completion_time_seconds': float(seconds) / float(samples) if samples else None,
+            'assignments_due_count': int(due or 0),
+            'assignments_completed_count': int(completed or 0),
+            'completion_rate': float(completed) / float(due) if due else None,
+        })
+
+    return summary
+
+
+# ============================================================================
+# MAIN EXECUTION
+# ============================================================================
+
+if __name__ == '__main__':
+    from app import app
+    import sys
+
+    def parse_date(value):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+
+    with app.app_context():
+        command = sys.argv[1] if len(sys.argv) > 1 else None
+
+        if command == 'backfill' and len(sys.argv) >= 4:
+            workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+            results = backfill_daily_stats(app, parse_date(sys.argv[2]), parse_date(sys.argv[3]), workers=workers)
+            print(f"\nRebuilt {results['chunks']} chunks, {results['rows']} rows, "
+                  f"{results['failed_chunks']} failed")
+        elif command == 'refresh':
+            day = parse_date(sys.argv[2]) if len(sys.argv) > 2 else date.today()
+            rows = refresh_department_days(day)
+            print(f"✓ Refreshed {day} ({rows} rows)")
+        else:
+            print("Available commands:")
+            print("  python reporting.py backfill START END [WORKERS] - Rebuild rollups for a date range (YYYY-MM-DD)")
+            print("  python reporting.py refresh [DAY]                - Rebuild rollups for one day (default today)")
@@ -0,0 +1,111 @@
+"""
+Role User Counters
+Reads of the role_user_counts table, which the user insert/update/delete
+events in models.py adjust in the same transaction as the user change
+
+    for role, user_count in roles_with_user_counts(active_only=True):
+        ...
+
+Writes that bypass the ORM (bulk UPDATEs, manual SQL) are not counted;
+reconcile_role_counts() recounts from users and repairs any drift. Run it
+from cron or after bulk loads:
+
+    python role_counts.py reconcile
+"""
+
+from models import db, Role, RoleUserCount
+from sqlalchemy import func, text
+
+
+def roles_with_user_counts(active_only=False, include_active_counts=False):
+    """
+    All roles with their user counts, in one query
+
+    Args:
+        active_only: Only roles with is_active set
+        include_active_counts: Also return the count of active users
+
+    Returns:
+        List of (role, user_count) or (role, user_count, active_user_count)
+    """
+    columns = [Role, func.coalesce(RoleUserCount.user_count, 0)]
+    if include_active_counts:
+        columns.append(func.coalesce(RoleUserCount.active_user_count, 0))
+
+    query = db.session.query(*columns).outerjoin(RoleUserCount, RoleUserCount.role_id == Role.id)
+    if active_only:
+        query = query.filter(Role.is_active == True)
+    return [tuple(row) for row in query.order_by(Role.id).all()]
+
+
+def role_user_count(role_id):
+    """Number of (not soft-deleted) users holding a role"""
+    counter = db.session.get(RoleUserCount, role_id)
+    return counter.user_count if counter else 0
+
+
+def user_totals():
+    """(users, active users) across all roles"""
+    total, active = db.session.query(
+        func.coalesce(func.sum(RoleUserCount.user_count), 0),
+        func.coalesce(func.sum(RoleUserCount.active_user_count), 0)
+    ).one()
+    return int(total), int(active)
+
+
+# ============================================================================
+# RECONCILIATION
+# ============================================================================
+
+RECOUNT_SQL = """
+    INSERT INTO role_user_counts (role_id, user_count, active_user_count, updated_at)
+    SELECT r.id,
+           COUNT(u.id),
+           COUNT(u.id) FILTER (WHERE u.is_active),
+           now() at time zone 'utc'
+    FROM roles r
+    LEFT JOIN users u ON u.role_id = r.id AND u.is_deleted = false
+    GROUP BY r.id
+    ON CONFLICT (role_id) DO UPDATE SET
+        user_count = EXCLUDED.user_count,
+        active_user_count = EXCLUDED.active_user_count,
+        updated_at = EXCLUDED.updated_at
+    WHERE role_user_counts.user_count <> EXCLUDED.user_count
+       OR role_user_counts.active_user_count <> EXCLUDED.active_user_count
+    RETURNING role_id
+"""
+
+
+def reconcile_role_counts(commit=True):
+    """
+    Recount users per role and fix counters that drifted
+
+    Counter updates from other transactions wait on the table lock for the
+    duration of the recount, so none of them can be overwritten by it.
+
+    Returns:
+        List of role IDs whose counters were corrected or created
+    """
+    db.session.execute(text("LOCK TABLE role_user_counts IN EXCLUSIVE MODE"))
+    fixed = db.session.execute(text(RECOUNT_SQL)).scalars().all()
+    if commit:
+        db.session.commit()
+    return fixed
+
+
+if __name__ == '__main__':
+    from app import app
+    import sys
+
+    with app.app_context():
+        command = sys.argv[1] if len(sys.argv) > 1 else None
+
+        if command == 'reconcile':
+            fixed = reconcile_role_counts()
+            if fixed:
+                print(f"✓ Corrected user counts for {len(fixed)} role(s): {', '.join(map(str, fixed))}")
+            else:
+                print("✓ Role user counts are up to date")
+        else:
+            print("Available commands:")
+            print("  python role_counts.py reconcile - Recount users per role and repair drifted counters")
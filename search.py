@@ -0,0 +1,165 @@
+"""
+Full-Text Search
+Ranked, prefix-matching search over question text, checklist item titles and
+submitted answers, backed by a GIN index on each table
+
+    results = search('valve leak', department_ids=visible_department_ids())
+
+Answers are searched through their stored search_vector columns, so ranking
+reads the vector instead of re-parsing every matching answer; questions and
+checklist items (small tables) use expression indexes, and those expressions
+must match their index definitions in models.py character for character.
+
+Each source ranks at most max_matches matching rows, so a very common term
+costs the same as a rarer one; past that, which matches get ranked is
+arbitrary. Answers are limited to the given departments.
+"""
+
+from models import db
+from sqlalchemy import text
+import re
+
+
+SEARCH_CONFIG = 'english'
+
+MAX_PAGE = 50
+
+# type -> (FROM clause, tsvector expression, text shown in results, extra filter,
+#          department column for answers or None)
+SEARCH_SOURCES = {
+    'question': (
+        "questions t",
+        "to_tsvector('english', t.question_text)",
+        "t.question_text",
+        "t.is_deleted = false",
+        None,
+    ),
+    'checklist_item': (
+        "checklist_items t",
+        "to_tsvector('english', t.title)",
+        "t.title",
+        "t.is_active = true",
+        None,
+    ),
+    'survey_answer': (
+        "survey_answers t JOIN survey_responses r ON r.id = t.response_id",
+        "t.search_vector",
+        "t.answer_text",
+        "true",
+        "r.department_id_at_submission",
+    ),
+    'checklist_answer': (
+        "checklist_submissions t",
+        "t.search_vector",
+        "jsonb_path_query_array(t.custom_fields, '$.answers[*].answer')::text",
+        "t.status = 'completed'",
+        "t.department_id_at_submission",
+    ),
+}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_prefix_tsquery(raw_query, max_terms=8):
+    """
+    Turn free text into a prefix-matching tsquery string
+
+    "valve lea" -> "valve:* & lea:*" so partially typed words still match.
+    Only word characters survive, which keeps user input from injecting
+    tsquery operators.
+    """
+    terms = _TOKEN_RE.findall(raw_query.lower())[:max_terms]
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def _source_sql(source_type):
+    from_clause, vector, body, extra_filter, department_column = SEARCH_SOURCES[source_type]
+    department_filter = 'true'
+    if department_column:
+        department_filter = (f"(CAST(:department_ids AS integer[]) IS NULL"
+                             f" OR {department_column} = ANY(:department_ids))")
+    # The innermost query stops after :max_matches index matches; of those the
+    # :candidates best-ranked are kept (id breaks ties, so pages are stable),
+    # which bounds the rows carried into the union and the final sort.
+    return f"""
+        SELECT '{source_type}' AS type, id, body, rank
+        FROM (
+            SELECT m.id, m.body, ts_rank_cd(m.vector, to_tsquery('{SEARCH_CONFIG}', :tsquery)) AS rank
+            FROM (
+                SELECT t.id, {body} AS body, {vector} AS vector
+                FROM {from_clause}
+                WHERE {vector} @@ to_tsquery('{SEARCH_CONFIG}', :tsquery)
+                  AND {extra_filter} AND {department_filter}
+                LIMIT :max_matches
+            ) AS m
+            ORDER BY rank DESC, m.id
+            LIMIT :candidates
+        ) AS {source_type}_matches
+    """
+
+
+def search(raw_query, types=None, page=1, per_page=20, candidates=2000, max_matches=10000,
+           department_ids=None):
+    """
+    Search questions, checklist items and answers
+
+    Args:
+        raw_query: User-entered search text
+        types: Optional list of source types to search (see SEARCH_SOURCES)
+        page: 1-based page number (clamped to MAX_PAGE)
+        per_page: Results per page
+        candidates: Maximum matches kept per source after ranking
+        max_matches: Maximum matches ranked per source
+        department_ids: Only answers submitted in these departments (default: all)
+
+    Returns:
+        Dict with results (type, id, rank, highlighted snippet) and paging info
+    """
+    tsquery = build_prefix_tsquery(raw_query)
+    page = min(max(page, 1), MAX_PAGE)
+    types = [t for t in (types or SEARCH_SOURCES) if t in SEARCH_SOURCES]
+
+    if not tsquery or not types:
+        return {'results': [], 'page': page, 'per_page': per_page, 'has_more': False}
+
+    offset = (page - 1) * per_page
+    union = ' UNION ALL '.join(_source_sql(t) for t in types)
+
+    # One extra row tells us whether there is a next page without a COUNT(*).
+    # Highlighting runs only on the rows of the requested page.
+    sql = text(f"""
+        WITH ranked AS ({union})
+        SELECT page.type, page.id, page.rank,
+               ts_headline('{SEARCH_CONFIG}', COALESCE(page.body, ''), to_tsquery('{SEARCH_CONFIG}', :tsquery),
+                           'MaxWords=25, MinWords=8, MaxFragments=2') AS snippet
+        FROM (
+            SELECT * FROM ranked
+            ORDER BY rank DESC, type, id
+            LIMIT :limit OFFSET :offset
+        ) AS page
+        ORDER BY page.rank DESC, page.type, page.id
+    """)
+
+    rows = db.session.execute(sql, {
+        'tsquery': tsquery,
+        'candidates': max(candidates, offset + per_page + 1),
+        'max_matches': max(max_matches, offset + per_page + 1),
+        'department_ids': None if department_ids is None else list(department_ids),
+        'limit': per_page + 1,
+        'offset': offset,
+    }).all()
+
+    results = [{
+        'type': row.type,
+        'id': row.id,
+        'rank': float(row.rank),
+        'snippet': row.snippet,
+    } for row in rows[:per_page]]
+
+    return {
+        'query': raw_query,
+        'results': results,
+        'page': page,
+        'per_page': per_page,
+        'has_more': len(rows) > per_page,
+    }
@@ -0,0 +1,415 @@
+"""
+Server-Side Sessions
+The session cookie carries only a signed, random session id; the session data
+lives in a store, so sessions can be revoked and bulk-invalidated by user or role
+
+Stores (SESSION_TYPE):
+    'postgres' - UNLOGGED server_sessions table (see models.ServerSession)
+    'redis'    - any Redis-protocol server (Redis, Valkey, KeyDB...) at SESSION_REDIS_URL
+    'cookie'   - Flask's default signed-cookie sessions (no server-side store)
+
+Reads go through a small LRU per web worker. A cached session is trusted for
+SESSION_LOCAL_CACHE_TTL seconds, which is also the longest a session revoked
+by another worker can keep working here. The store is only written when the
+session changed or has used up half of its lifetime.
+
+A user's sessions are revoked when a commit deactivates or deletes the user
+or changes their password (the User events at the bottom), and a role's when
+the role is deactivated (update_role).
+"""
+
+from flask import current_app, has_app_context, session
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from itsdangerous import Signer, BadSignature
+from collections import OrderedDict
+from datetime import datetime
+from models import db, User
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session, object_session
+import json_provider
+import secrets
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - only needed for SESSION_TYPE=redis
+    redis = None
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it was changed"""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.modified = False
+
+
+# ============================================================================
+# STORES
+# ============================================================================
+
+class PostgresSessionStore:
+    """Sessions in the UNLOGGED server_sessions table"""
+
+    def __init__(self, purge_interval=600):
+        self.purge_interval = purge_interval
+        self._last_purge = time.monotonic()
+
+    def load(self, sid):
+        # Own connection: the request's db.session must not be committed by session I/O
+        with db.engine.connect() as conn:
+            row = conn.execute(text("""
+                SELECT data, expires_at FROM server_sessions
+                WHERE sid = :sid AND expires_at > :now
+            """), {'sid': sid, 'now': datetime.utcnow()}).first()
+        return (row.data, row.expires_at) if row else None
+
+    def save(self, sid, data, user_id, role_id, expires_at):
+        with db.engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO server_sessions (sid, user_id, role_id, data, expires_at, updated_at)
+                VALUES (:sid, :user_id, :role_id, CAST(:data AS jsonb), :expires_at, :now)
+                ON CONFLICT (sid) DO UPDATE SET
+                    user_id = EXCLUDED.user_id,
+                    role_id = EXCLUDED.role_id,
+                    data = EXCLUDED.data,
+                    expires_at = EXCLUDED.expires_at,
+                    updated_at = EXCLUDED.updated_at
+            """), {
+                'sid': sid, 'user_id': user_id, 'role_id': role_id,
+                'data': json_provider.dumps(data), 'expires_at': expires_at,
+                'now': datetime.utcnow(),
+            })
+
+        if time.monotonic() - self._last_purge > self.purge_interval:
+            self._last_purge = time.monotonic()
+            self.purge_expired()
+
+    def delete(self, sid):
+        with db.engine.begin() as conn:
+            conn.execute(text("DELETE FROM server_sessions WHERE sid = :sid"), {'sid': sid})
+
+    def _delete_where(self, column, value):
+        with db.engine.begin() as conn:
+            rows = conn.execute(text(
+                f"DELETE FROM server_sessions WHERE {column} = :value RETURNING sid"
+            ), {'value': value}).all()
+        return [row.sid for row in rows]
+
+    def delete_by_user(self, user_id):
+        return self._delete_where('user_id', user_id)
+
+    def delete_by_role(self, role_id):
+        return self._delete_where('role_id', role_id)
+
+    def purge_expired(self):
+        with db.engine.begin() as conn:
+            result = conn.execute(text("DELETE FROM server_sessions WHERE expires_at <= :now"),
+                                  {'now': datetime.utcnow()})
+        return result.rowcount
+
+
+class RedisSessionStore:
+    """
+    Sessions as Redis keys with a TTL, plus one set of session ids per user and per role
+
+    Set membership is not cleaned up when a session's user or role changes,
+    so a bulk invalidation may also end sessions that have since moved on;
+    both cases call for a fresh login anyway.
+    """
+
+    def __init__(self, url, prefix='session:'):
+        if redis is None:
+            raise RuntimeError("SESSION_TYPE=redis requires the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, sid):
+        return f'{self.prefix}{sid}'
+
+    def load(self, sid):
+        payload = self.client.get(self._key(sid))
+        if payload is None:
+            return None
+        record = json_provider.loads(payload)
+        return record['data'], datetime.fromisoformat(record['expires_at'])
+
+    def save(self, sid, data, user_id, role_id, expires_at):
+        ttl = max(int((expires_at - datetime.utcnow()).total_seconds()), 1)
+        pipe = self.client.pipeline()
+        pipe.set(self._key(sid), json_provider.dumps({'data': data, 'expires_at': expires_at}), ex=ttl)
+        for index_key in self._index_keys(user_id, role_id):
+            pipe.sadd(index_key, sid)
+            pipe.expire(index_key, ttl)
+        pipe.execute()
+
+    def _index_keys(self, user_id, role_id):
+        keys = []
+        if user_id is not None:
+            keys.append(f'{self.prefix}user:{user_id}')
+        if role_id is not None:
+            keys.append(f'{self.prefix}role:{role_id}')
+        return keys
+
+    def delete(self, sid):
+        self.client.delete(self._key(sid))
+
+    def _delete_indexed(self, index_key):
+        sids = [sid.decode('utf-8') for sid in self.client.smembers(index_key)]
+        if sids:
+            self.client.delete(*[self._key(sid) for sid in sids])
+        self.client.delete(index_key)
+        return sids
+
+    def delete_by_user(self, user_id):
+        return self._delete_indexed(f'{self.prefix}user:{user_id}')
+
+    def delete_by_role(self, role_id):
+        return self._delete_indexed(f'{self.prefix}role:{role_id}')
+
+    def purge_expired(self):
+        return 0  # Redis expires keys on its own
+
+
+# ============================================================================
+# FLASK SESSION INTERFACE
+# ============================================================================
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface over a session store with a per-worker LRU"""
+
+    session_class = ServerSideSession
+    salt = 'server-session'
+
+    def __init__(self, store, local_cache_ttl=5, local_cache_size=10000):
+        self.store = store
+        self.local_cache_ttl = local_cache_ttl
+        self.local_cache_size = local_cache_size
+        self._cache = OrderedDict()     # sid -> (serialized data, expires_at, trusted_until)
+        self._cache_lock = threading.Lock()
+
+    # ---- local LRU ---------------------------------------------------------
+
+    def _cache_get(self, sid):
+        with self._cache_lock:
+            entry = self._cache.get(sid)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                del self._cache[sid]
+                return None
+            self._cache.move_to_end(sid)
+        # Each request gets its own copy of the data
+        return json_provider.loads(entry[0]), entry[1]
+
+    def _cache_put(self, sid, data, expires_at):
+        if not self.local_cache_ttl:
+            return
+        entry = (json_provider.dumps(data), expires_at, time.monotonic() + self.local_cache_ttl)
+        with self._cache_lock:
+            self._cache[sid] = entry
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.local_cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, sids):
+        with self._cache_lock:
+            for sid in sids:
+                self._cache.pop(sid, None)
+
+    # ---- store access ------------------------------------------------------
+
+    def load(self, sid):
+        record = self._cache_get(sid)
+        if record is None:
+            record = self.store.load(sid)
+            if record is not None:
+                self._cache_put(sid, *record)
+        return record
+
+    def save(self, sid, data, expires_at):
+        user = data.get('user') or {}
+        self.store.save(sid, data, user.get('id'), user.get('role_id'), expires_at)
+        self._cache_put(sid, data, expires_at)
+
+    def delete(self, sid):
+        self.store.delete(sid)
+        self._cache_drop([sid])
+
+    def invalidate_user(self, user_id):
+        sids = self.store.delete_by_user(user_id)
+        self._cache_drop(sids)
+        return len(sids)
+
+    def invalidate_role(self, role_id):
+        sids = self.store.delete_by_role(role_id)
+        self._cache_drop(sids)
+        return len(sids)
+
+    # ---- SessionInterface --------------------------------------------------
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('utf-8')
+            except BadSignature:
+                sid = None
+            if sid:
+                record = self.load(sid)
+                if record is not None:
+                    data, expires_at = record
+                    return self.session_class(data, sid=sid, expires_at=expires_at)
+
+        return self.session_class(sid=secrets.token_urlsafe(32))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if not session:
+            if session.modified:
+                # Cleared (logout): drop the stored copy and the cookie
+                self.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        response.vary.add('Cookie')
+
+        lifetime = app.permanent_session_lifetime
+        now = datetime.utcnow()
+        half_used = session.expires_at is None or session.expires_at - now < lifetime / 2
+        if not (session.modified or half_used):
+            return
+
+        expires_at = now + lifetime
+        self.save(session.sid, dict(session), expires_at)
+        session.expires_at = expires_at
+
+        response.set_cookie(
+            name, self._signer(app).sign(session.sid).decode('utf-8'),
+            expires=self.get_expiration_time(app, session), httponly=httponly,
+            domain=domain, path=path, secure=secure, samesite=samesite,
+        )
+
+
+# ============================================================================
+# SETUP & HELPERS
+# ============================================================================
+
+def init_session_store(app):
+    """Install the server-side session interface selected by SESSION_TYPE"""
+    session_type = app.config.get('SESSION_TYPE', 'postgres')
+
+    if session_type == 'postgres':
+        store = PostgresSessionStore(purge_interval=app.config.get('SESSION_PURGE_INTERVAL', 600))
+    elif session_type == 'redis':
+        store = RedisSessionStore(app.config['SESSION_REDIS_URL'])
+    elif session_type == 'cookie':
+        print("⚠ SESSION_TYPE=cookie: signed-cookie sessions, logins cannot be revoked")
+        return None
+    else:
+        raise ValueError(f"Unknown SESSION_TYPE '{session_type}' (use 'postgres', 'redis' or 'cookie')")
+
+    app.session_interface = ServerSessionInterface(
+        store,
+        local_cache_ttl=app.config.get('SESSION_LOCAL_CACHE_TTL', 5),
+        local_cache_size=app.config.get('SESSION_LOCAL_CACHE_SIZE', 10000),
+    )
+    return app.session_interface
+
+
+def _server_interface():
+    interface = current_app.session_interface
+    return interface if isinstance(interface, ServerSessionInterface) else None
+
+
+def rotate_session_id():
+    """Give the current session a fresh id (call on login to prevent fixation)"""
+    interface = _server_interface()
+    if interface is None or not isinstance(session, ServerSideSession):
+        return
+    old_sid = session.sid
+    session.sid = secrets.token_urlsafe(32)
+    session.expires_at = None
+    session.modified = True
+    interface.delete(old_sid)
+
+
+def invalidate_user_sessions(user_id):
+    """Log a user out everywhere; returns the number of sessions removed"""
+    interface = _server_interface()
+    return interface.invalidate_user(user_id) if interface else 0
+
+
+def invalidate_role_sessions(role_id):
+    """Log out everyone holding a role; returns the number of sessions removed"""
+    interface = _server_interface()
+    return interface.invalidate_role(role_id) if interface else 0
+
+
+def purge_expired_sessions():
+    interface = _server_interface()
+    return interface.store.purge_expired() if interface else 0
+
+
+def record_password_rehash(user_id):
+    """
+    Mark the pending password_hash change of a user as a rehash of the same
+    password (bcrypt cost upgrade at login), which keeps their sessions
+    """
+    db.session.info.setdefault('password_rehash', set()).add(user_id)
+
+
+# ============================================================================
+# REVOCATION EVENTS
+# ============================================================================
+
+def _changed(state, key):
+    return state.attrs[key].history.has_changes()
+
+
+def _user_changed(mapper, connection, target):
+    state = inspect(target)
+    target_session = object_session(target)
+    password_changed = _changed(state, 'password_hash') and \
+        target.id not in target_session.info.get('password_rehash', ())
+    deactivated = _changed(state, 'is_active') and not target.is_active
+    deleted = _changed(state, 'is_deleted') and target.is_deleted
+
+    if password_changed or deactivated or deleted:
+        target_session.info.setdefault('revoke_user_sessions', set()).add(target.id)
+
+
+def _after_commit(committed_session):
+    committed_session.info.pop('password_rehash', None)
+    user_ids = committed_session.info.pop('revoke_user_sessions', ())
+    if user_ids and has_app_context():
+        for user_id in user_ids:
+            invalidate_user_sessions(user_id)
+
+
+def _after_rollback(rolled_back_session):
+    rolled_back_session.info.pop('password_rehash', None)
+    rolled_back_session.info.pop('revoke_user_sessions', None)
+
+
+event.listen(User, 'after_update', _user_changed)
+event.listen(Session, 'after_commit', _after_commit)
+event.listen(Session, 'after_rollback', _after_rollback)
@@ -10,6 +10,8 @@ from models import (
     ChecklistItemResponse, UserLocation, AuditLog
 )
 from sqlalchemy import and_, or_, func
+from hierarchy_cache import get_snapshots, apply_snapshot
+from reporting import refresh_for_submission
 from datetime import datetime
 import json
 
@@ -67,12 +69,9 @@ def get_user_departments(user_id):
     if not user or not user.department:
         return []
     
-    # Return user's department and all its sub-departments
-    departments = [user.department]
-    if user.department.sub_departments:
-        departments.extend(user.department.sub_departments)
-    
-    return departments
+    # Return user's department and all its sub-departments (any depth)
+    from org_closure import get_department_subtree
+    return get_department_subtree(user.department_id, active_only=False)
 
 
 # ============================================================================
@@ -247,21 +246,29 @@ def create_checklist_assignment(template_id, user_id, location_data, created_by_
     return assignment
 
 
-def submit_checklist_answers(assignment_id, answers, user_location):
-    """Submit checklist answers"""
+def submit_checklist_answers(assignment_id, answers, user_location, user_id=None):
+    """
+    Submit checklist answers
+
+    Args:
+        user_id: Submitting user (default: the user the assignment is assigned to)
+    """
     assignment = ChecklistAssignment.query.get(assignment_id)
     if not assignment:
         return False
+    user_id = user_id or assignment.assigned_to_user_id
     
-    # Create submission
+    # Create submission, stamped with the user's department and team
+    # (the current user is normally already in the session: no query)
     submission = ChecklistSubmission(
         assignment_id=assignment_id,
-        user_id=assignment.assigned_to_user_id,
-        department_id_at_submission=assignment.assigned_to_user.department_id,
-        team_id_at_submission=assignment.assigned_to_user.team_id,
+        user_id=user_id,
         status='completed',
         custom_fields={'answers': answers, 'location': user_location}
     )
+    user = db.session.get(User, user_id)
+    if user is not None:
+        apply_snapshot(submission, user, None)
     
     db.session.add(submission)
     
@@ -271,9 +278,63 @@ def submit_checklist_answers(assignment_id, answers, user_location):
     
     db.session.commit()
     
+    # Keep the department daily rollups current
+    try:
+        refresh_for_submission(submission)
+    except Exception as e:
+        db.session.rollback()
+        print(f"✗ Error refreshing daily stats: {e}")
+    
     return True
 
 
+def create_survey_responses(survey_id, entries, commit=True):
+    """
+    Create survey responses in bulk, each stamped with the submitting user's
+    hierarchy path, department, team and role at submission time
+
+    Args:
+        survey_id: ID of the survey
+        entries: List of dicts with user_id and optional answers
+                 (SurveyAnswer column values, e.g. [{'question_id': 1, 'answer_text': 'Yes'}]),
+                 completion_time_seconds, location_id, custom_fields
+        commit: Commit when done
+
+    Returns:
+        List of created SurveyResponse objects
+    """
+    # One query for the users' current department/team/role and one snapshot
+    # lookup for their hierarchy paths (no per-submission tree walk)
+    user_ids = {entry['user_id'] for entry in entries}
+    users = {row.id: row for row in db.session.query(
+        User.id, User.department_id, User.team_id, User.role_id
+    ).filter(User.id.in_(user_ids))}
+    snapshots = get_snapshots(user_ids)
+    
+    responses = []
+    for entry in entries:
+        response = SurveyResponse(
+            survey_id=survey_id,
+            user_id=entry['user_id'],
+            location_id=entry.get('location_id'),
+            completion_time_seconds=entry.get('completion_time_seconds'),
+            status='completed',
+            custom_fields=entry.get('custom_fields') or {}
+        )
+        if entry['user_id'] in users:
+            apply_snapshot(response, users[entry['user_id']], snapshots.get(entry['user_id']))
+        
+        for answer in entry.get('answers', []):
+            response.answers.append(SurveyAnswer(**answer))
+        responses.append(response)
+    
+    db.session.add_all(responses)
+    if commit:
+        db.session.commit()
+    
+    return responses
+
+
 def delete_checklist(checklist_id):
     """Delete a checklist assignment"""
     assignment = ChecklistAssignment.query.get(checklist_id)
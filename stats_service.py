@@ -0,0 +1,203 @@
+"""
+Statistics Service
+Hierarchy and activity statistics for admin dashboards, computed with one
+grouped query per table and cached per worker
+
+    stats = get_hierarchy_stats()
+    activity = get_activity_summary(days=30)
+
+Results are fresh for STATS_CACHE_TTL seconds. After that the cached value
+is still returned (for up to STATS_MAX_STALE seconds) while a background
+thread recomputes it, so a dashboard request never waits on counting large
+tables unless nothing has been computed yet.
+
+Activity is counted per day over the last STATS_ACTIVITY_WINDOW_DAYS days in
+a single query per table; any shorter summary is summed from those buckets.
+"""
+
+from models import db, Department, SurveyResponse, ChecklistSubmission, Message, UserLocation
+from role_counts import roles_with_user_counts
+from sqlalchemy import Date, cast, func
+from datetime import datetime, timedelta
+import copy
+import threading
+import time
+
+
+_settings = {
+    'ttl': 60,
+    'max_stale': 3600,
+    'activity_window_days': 90,
+}
+_app = None
+_cache = {}                 # key -> (computed_at, value)
+_refreshing = set()
+_lock = threading.Lock()
+
+
+def init_stats_service(app):
+    """Read the cache settings from the app config and keep the app for background refreshes"""
+    global _app
+    _app = app
+    _settings['ttl'] = app.config.get('STATS_CACHE_TTL', _settings['ttl'])
+    _settings['max_stale'] = app.config.get('STATS_MAX_STALE', _settings['max_stale'])
+    _settings['activity_window_days'] = app.config.get('STATS_ACTIVITY_WINDOW_DAYS', _settings['activity_window_days'])
+
+
+# ============================================================================
+# QUERIES
+# ============================================================================
+
+# Summary name -> (model, extra conditions)
+ACTIVITY_SOURCES = {
+    'survey_responses': (SurveyResponse, ()),
+    'checklist_submissions': (ChecklistSubmission, ()),
+    'messages_sent': (Message, (Message.is_deleted == False,)),
+    'location_updates': (UserLocation, ()),
+}
+
+
+def compute_hierarchy_stats():
+    """User and department totals plus users per role (two queries)"""
+    total_departments, active_departments = db.session.query(
+        func.count(Department.id),
+        func.count(Department.id).filter(Department.is_active == True)
+    ).filter(Department.is_deleted == False).one()
+
+    stats = {
+        'total_users': 0,
+        'active_users': 0,
+        'total_departments': total_departments,
+        'active_departments': active_departments,
+        'users_by_role': {}
+    }
+    for role, user_count, active_count in roles_with_user_counts(include_active_counts=True):
+        stats['total_users'] += user_count
+        stats['active_users'] += active_count
+        stats['users_by_role'][role.display_name] = user_count
+
+    return stats
+
+
+def compute_daily_activity(window_days):
+    """
+    Per-day counts for each activity source over the last window_days days
+
+    Returns:
+        Dict of source name -> {date: count}
+    """
+    since = datetime.combine(datetime.utcnow().date() - timedelta(days=window_days - 1), datetime.min.time())
+
+    daily = {}
+    for name, (model, conditions) in ACTIVITY_SOURCES.items():
+        day = cast(model.created_at, Date)
+        rows = db.session.query(day, func.count()) \
+            .filter(model.created_at >= since, *conditions) \
+            .group_by(day) \
+            .all()
+        daily[name] = dict(rows)
+    return daily
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+def _store(key, value):
+    with _lock:
+        _cache[key] = (time.monotonic(), value)
+
+
+def _refresh(key, compute):
+    try:
+        with _app.app_context():
+            _store(key, compute())
+    except Exception as e:
+        print(f"✗ Error refreshing {key[0]} stats: {e}")
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+
+def _refresh_in_background(key, compute):
+    """Start one refresh per key; later callers keep getting the stale value"""
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    threading.Thread(target=_refresh, args=(key, compute), name=f'stats-refresh-{key[0]}', daemon=True).start()
+
+
+def _cached(key, compute):
+    with _lock:
+        entry = _cache.get(key)
+
+    if entry is not None:
+        age = time.monotonic() - entry[0]
+        if age < _settings['ttl']:
+            return entry[1]
+        if age < _settings['max_stale'] and _app is not None:
+            _refresh_in_background(key, compute)
+            return entry[1]
+
+    value = compute()
+    _store(key, value)
+    return value
+
+
+def invalidate_stats():
+    """Drop every cached statistic in this worker"""
+    with _lock:
+        _cache.clear()
+
+
+def get_stats_cache_info():
+    now = time.monotonic()
+    with _lock:
+        return {
+            'entries': {key[0]: round(now - computed_at, 1) for key, (computed_at, _) in _cache.items()},
+            'refreshing': len(_refreshing),
+            **_settings
+        }
+
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+
+def get_hierarchy_stats():
+    """Statistics about the organizational hierarchy"""
+    return copy.deepcopy(_cached(('hierarchy',), compute_hierarchy_stats))
+
+
+def get_activity_summary(days=30):
+    """
+    Activity counts for the last `days` days
+
+    Days are whole UTC calendar days, today included.
+    """
+    days = max(1, int(days))
+    window = max(days, _settings['activity_window_days'])
+    daily = _cached(('activity', window), lambda: compute_daily_activity(window))
+
+    cutoff = datetime.utcnow().date() - timedelta(days=days - 1)
+    return {
+        name: sum(count for day, count in counts.items() if day >= cutoff)
+        for name, counts in daily.items()
+    }
+
+
+if __name__ == '__main__':
+    from app import app
+    import sys
+
+    with app.app_context():
+        command = sys.argv[1] if len(sys.argv) > 1 else None
+
+        if command == 'show':
+            days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+            print(f"Hierarchy: {compute_hierarchy_stats()}")
+            print(f"Activity ({days} days): {get_activity_summary(days)}")
+        else:
+            print("Available commands:")
+            print("  python stats_service.py show [DAYS] - Print hierarchy and activity statistics")
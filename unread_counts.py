@@ -0,0 +1,177 @@
+"""
+Unread Counters
+Unread notification and message badges read from user_unread_counts, one
+primary-key lookup per request instead of counting notifications/messages
+
+    counts = get_unread_counts(user_id)     # {'notifications': 3, 'messages': 1}
+
+The counters are adjusted by the Notification/Message events in models.py
+and by notifications.fan_out_notification(). Marking as read goes through
+mark_notifications_read() / mark_messages_read(), which update the rows and
+the counter in the same transaction. reconcile_unread_counts() recounts from
+the source tables if anything wrote around them.
+"""
+
+from flask import g, session
+from models import db, Notification, Message, UserUnreadCount, adjust_unread_counts, adjust_thread_unread
+from sqlalchemy import select, text
+from collections import Counter
+from datetime import datetime
+
+
+def init_unread_counts(app):
+    """Expose unread_counts to every template for the logged-in user"""
+
+    @app.context_processor
+    def inject_unread_counts():
+        user = session.get('user')
+        if not user:
+            return {}
+        return {'unread_counts': get_unread_counts(user['id'])}
+
+
+def get_unread_counts(user_id):
+    """Unread notification and message counts for a user (memoized per request)"""
+    cache = g.setdefault('unread_counts', {})
+    if user_id not in cache:
+        row = db.session.execute(
+            select(UserUnreadCount.notifications_unread, UserUnreadCount.messages_unread)
+            .where(UserUnreadCount.user_id == user_id)
+        ).first()
+        cache[user_id] = {
+            'notifications': row.notifications_unread if row else 0,
+            'messages': row.messages_unread if row else 0,
+        }
+    return cache[user_id]
+
+
+def _forget(user_id):
+    g.get('unread_counts', {}).pop(user_id, None)
+
+
+# ============================================================================
+# MARK AS READ
+# ============================================================================
+
+def mark_notifications_read(user_id, notification_ids=None, commit=True):
+    """
+    Mark a user's unread notifications as read
+
+    Args:
+        user_id: Recipient
+        notification_ids: Only these notifications (default: all of them)
+        commit: Commit the transaction
+
+    Returns:
+        Number of notifications that changed from unread to read
+    """
+    table = Notification.__table__
+    now = datetime.utcnow()
+    stmt = table.update().where(table.c.user_id == user_id, table.c.is_read == False) \
+        .values(is_read=True, read_at=now, updated_at=now)
+    if notification_ids is not None:
+        stmt = stmt.where(table.c.id.in_(notification_ids))
+
+    changed = db.session.execute(stmt).rowcount
+    adjust_unread_counts(db.session.connection(), user_id, notifications=-changed)
+    if commit:
+        db.session.commit()
+    _forget(user_id)
+    return changed
+
+
+def mark_messages_read(user_id, message_ids=None, thread_id=None, commit=True):
+    """
+    Mark messages received by a user as read
+
+    Args:
+        user_id: Recipient
+        message_ids: Only these messages
+        thread_id: Only messages in this thread
+        commit: Commit the transaction
+
+    Returns:
+        Number of messages that changed from unread to read
+    """
+    table = Message.__table__
+    now = datetime.utcnow()
+    stmt = table.update().where(
+        table.c.recipient_id == user_id, table.c.is_read == False, table.c.is_deleted == False
+    ).values(is_read=True, read_at=now, updated_at=now)
+    if message_ids is not None:
+        stmt = stmt.where(table.c.id.in_(message_ids))
+    if thread_id is not None:
+        stmt = stmt.where(table.c.thread_id == thread_id)
+
+    # Per-thread unread counts in the inbox drop along with the user's total
+    threads = Counter(db.session.execute(stmt.returning(table.c.thread_id)).scalars().all())
+    changed = sum(threads.values())
+    connection = db.session.connection()
+    adjust_unread_counts(connection, user_id, messages=-changed)
+    adjust_thread_unread(connection, user_id, {thread: -count for thread, count in threads.items()})
+    if commit:
+        db.session.commit()
+    _forget(user_id)
+    return changed
+
+
+# ============================================================================
+# RECONCILIATION
+# ============================================================================
+
+RECOUNT_SQL = """
+    INSERT INTO user_unread_counts (user_id, notifications_unread, messages_unread, updated_at)
+    SELECT u.id,
+           (SELECT COUNT(*) FROM notifications n WHERE n.user_id = u.id AND n.is_read = false),
+           (SELECT COUNT(*) FROM messages m
+            WHERE m.recipient_id = u.id AND m.is_read = false AND m.is_deleted = false),
+           now() at time zone 'utc'
+    FROM users u
+    {user_filter}
+    ON CONFLICT (user_id) DO UPDATE SET
+        notifications_unread = EXCLUDED.notifications_unread,
+        messages_unread = EXCLUDED.messages_unread,
+        updated_at = EXCLUDED.updated_at
+    WHERE user_unread_counts.notifications_unread <> EXCLUDED.notifications_unread
+       OR user_unread_counts.messages_unread <> EXCLUDED.messages_unread
+    RETURNING user_id
+"""
+
+
+def reconcile_unread_counts(user_ids=None, commit=True):
+    """
+    Recount unread notifications and messages and fix counters that drifted
+
+    Counter updates from other transactions wait on the table lock for the
+    duration of the recount, so none of them can be overwritten by it.
+
+    Args:
+        user_ids: Only these users (default: everyone)
+
+    Returns:
+        List of user IDs whose counters were corrected or created
+    """
+    user_filter, params = '', {}
+    if user_ids is not None:
+        user_filter, params = 'WHERE u.id = ANY(:user_ids)', {'user_ids': list(user_ids)}
+
+    db.session.execute(text("LOCK TABLE user_unread_counts IN EXCLUSIVE MODE"))
+    fixed = db.session.execute(text(RECOUNT_SQL.format(user_filter=user_filter)), params).scalars().all()
+    if commit:
+        db.session.commit()
+    return fixed
+
+
+if __name__ == '__main__':
+    from app import app
+    import sys
+
+    with app.app_context():
+        command = sys.argv[1] if len(sys.argv) > 1 else None
+
+        if command == 'reconcile':
+            fixed = reconcile_unread_counts()
+            print(f"✓ Corrected unread counters for {len(fixed)} user(s)")
+        else:
+            print("Available commands:")
+            print("  python unread_counts.py reconcile - Recount unread notifications/messages and repair drifted counters")
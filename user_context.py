@@ -0,0 +1,137 @@
+"""
+Request-Scoped Current User
+Resolves the logged-in user (with role and department) once per request and
+keeps a short-lived copy per web worker so most pages load it without a query
+
+    current_user = get_current_user()   # memoized in g.current_user
+
+The per-worker cache holds detached users keyed by id, so a hit costs no
+query at all. Each request gets its own copy through session.merge(load=False),
+so nothing is shared between threads. Entries are evicted as soon as the user,
+role or department is changed from this worker; a change made by another
+worker is picked up within CURRENT_USER_CACHE_TTL seconds, like role
+permissions (PERMISSION_CACHE_TTL). Deactivating a user or changing their
+password also revokes their sessions (session_store.py), so a stale cached
+copy never outlives their login.
+"""
+
+from flask import g, session
+from models import db, User, Role, Department
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, joinedload
+import threading
+import time
+
+
+_settings = {
+    'ttl': 30,              # seconds a cached user is trusted (0 disables the cache)
+    'max_entries': 5000,
+}
+_cache = {}                 # user_id -> (expires_at, detached User)
+_cache_lock = threading.Lock()
+
+
+def init_user_context(app):
+    """Read the cache settings from the app config"""
+    _settings['ttl'] = app.config.get('CURRENT_USER_CACHE_TTL', _settings['ttl'])
+    _settings['max_entries'] = app.config.get('CURRENT_USER_CACHE_SIZE', _settings['max_entries'])
+
+
+# ============================================================================
+# LOADING
+# ============================================================================
+
+def _load_detached(user_id):
+    """Load a user with role and department in one query, outside the request session"""
+    with Session(db.engine, expire_on_commit=False) as load_session:
+        user = load_session.execute(
+            select(User)
+            .options(joinedload(User.role), joinedload(User.department))
+            .where(User.id == user_id, User.is_deleted == False)
+        ).unique().scalar_one_or_none()
+    # Closing the session detaches the user with its loaded state intact
+    return user
+
+
+def load_user(user_id):
+    """
+    Get a user bound to the current db.session, from the cache when possible
+
+    Args:
+        user_id: ID of the user
+
+    Returns:
+        User or None if missing/deleted
+    """
+    now = time.monotonic()
+    cached = None
+
+    if _settings['ttl']:
+        with _cache_lock:
+            entry = _cache.get(user_id)
+        if entry and entry[0] > now:
+            cached = entry[1]
+
+    if cached is None:
+        cached = _load_detached(user_id)
+        if cached is None:
+            return None
+        if _settings['ttl']:
+            with _cache_lock:
+                if len(_cache) >= _settings['max_entries']:
+                    _cache.clear()
+                _cache[user_id] = (now + _settings['ttl'], cached)
+
+    # Copy into the request session without a SELECT; role and department
+    # follow through the relationships' merge cascade
+    return db.session.merge(cached, load=False)
+
+
+def get_current_user():
+    """
+    The logged-in user for this request, resolved at most once
+
+    Returns:
+        User or None when nobody is logged in
+    """
+    if 'current_user' not in g:
+        user_session = session.get('user')
+        g.current_user = load_user(user_session['id']) if user_session else None
+    return g.current_user
+
+
+# ============================================================================
+# INVALIDATION
+# ============================================================================
+
+def invalidate_user(user_id):
+    """Drop one user from this worker's cache"""
+    with _cache_lock:
+        _cache.pop(user_id, None)
+
+
+def clear_user_cache():
+    """Drop every cached user (roles or departments changed)"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def get_user_cache_stats():
+    with _cache_lock:
+        return {'entries': len(_cache), **_settings}
+
+
+def _user_changed(mapper, connection, target):
+    invalidate_user(target.id)
+
+
+def _org_changed(mapper, connection, target):
+    clear_user_cache()
+
+
+event.listen(User, 'after_update', _user_changed)
+event.listen(User, 'after_delete', _user_changed)
+event.listen(Role, 'after_update', _org_changed)
+event.listen(Role, 'after_delete', _org_changed)
+event.listen(Department, 'after_update', _org_changed)
+event.listen(Department, 'after_delete', _org_changed)
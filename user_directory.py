@@ -0,0 +1,219 @@
+"""
+User Directory
+Keyset-paginated, filtered and projected user listing behind /api/users, so
+admin pages fetch one page of users at a time instead of the whole table
+
+    page = list_users(fields=['id', 'name', 'role'], filters={'role_id': 3},
+                      sort='-created_at', cursor=request.args.get('cursor'), limit=50)
+
+Only the requested columns are selected, and the roles/departments tables
+are joined only when a requested field or filter needs them.
+
+search_users() backs the /api/users/search typeahead with the pg_trgm GIN
+indexes over username, full_name and company_number.
+"""
+
+from models import db, User, Role, Department
+from pagination import encode_cursor, decode_cursor, keyset_filter
+from sqlalchemy import func, literal, or_, select
+from datetime import datetime
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Public field name -> (column expression, table it needs beyond users)
+DIRECTORY_FIELDS = {
+    'id': (User.id, None),
+    'uuid': (User.uuid, None),
+    'username': (User.username, None),
+    'company_number': (User.company_number, None),
+    'full_name': (User.full_name, None),
+    'name': (func.coalesce(User.full_name, User.username), None),
+    'email': (User.email, None),
+    'phone': (User.phone, None),
+    'is_active': (User.is_active, None),
+    'is_verified': (User.is_verified, None),
+    'role_id': (User.role_id, None),
+    'role': (Role.display_name, Role),
+    'role_name': (Role.name, Role),
+    'department_id': (User.department_id, None),
+    'department': (Department.name, Department),
+    'team_id': (User.team_id, None),
+    'parent_id': (User.parent_id, None),
+    'last_login': (User.last_login, None),
+    'last_activity': (User.last_activity, None),
+    'created_at': (User.created_at, None),
+}
+
+DEFAULT_FIELDS = ('id', 'company_number', 'username', 'full_name', 'role', 'department', 'is_active', 'last_login')
+
+# Sort name -> expression; NULLs are coalesced so the keyset comparison is total.
+# name and created_at are backed by the idx_users_directory_* indexes.
+DIRECTORY_SORTS = {
+    'name': func.lower(func.coalesce(User.full_name, User.username)),
+    'username': User.username,
+    'company_number': func.coalesce(User.company_number, ''),
+    'created_at': User.created_at,
+    'last_login': func.coalesce(User.last_login, literal(_EPOCH)),
+    'last_activity': func.coalesce(User.last_activity, literal(_EPOCH)),
+}
+
+
+SEARCH_FIELDS = ('id', 'company_number', 'username', 'name', 'role', 'department')
+
+# Queries shorter than this match too many trigrams to be worth running
+MIN_SEARCH_LENGTH = 2
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _parse_ids(value):
+    if isinstance(value, (list, tuple)):
+        return [int(v) for v in value]
+    return [int(v) for v in str(value).split(',') if v.strip()]
+
+
+def list_users(fields=None, filters=None, sort='name', cursor=None, limit=50):
+    """
+    One page of the user directory
+
+    Args:
+        fields: Field names from DIRECTORY_FIELDS (default DEFAULT_FIELDS)
+        filters: Dict with any of role_id, role (name), department_id, team_id
+                 (single id or comma-separated list), is_active, has_department
+        sort: Sort name from DIRECTORY_SORTS, prefixed with '-' for descending
+        cursor: next_cursor of the previous page
+        limit: Page size
+
+    Returns:
+        Dict with users (list of dicts), next_cursor, fields and sort
+
+    Raises:
+        ValueError: unknown field/sort or malformed filter/cursor
+    """
+    fields = list(fields or DEFAULT_FIELDS)
+    unknown = [f for f in fields if f not in DIRECTORY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    descending = sort.startswith('-')
+    sort_name = sort.lstrip('-')
+    if sort_name not in DIRECTORY_SORTS:
+        raise ValueError(f"Unknown sort: '{sort_name}'")
+    sort_key = DIRECTORY_SORTS[sort_name]
+
+    filters = filters or {}
+    joins = {DIRECTORY_FIELDS[f][1] for f in fields} - {None}
+    if filters.get('role'):
+        joins.add(Role)
+
+    query = select(*[DIRECTORY_FIELDS[f][0].label(f) for f in fields], sort_key.label('sort_value_'), User.id.label('sort_id_')) \
+        .where(User.is_deleted == False)
+    if Role in joins:
+        query = query.join(Role, Role.id == User.role_id)
+    if Department in joins:
+        query = query.outerjoin(Department, Department.id == User.department_id)
+
+    if filters.get('role_id'):
+        query = query.where(User.role_id.in_(_parse_ids(filters['role_id'])))
+    if filters.get('role'):
+        query = query.where(Role.name == filters['role'])
+    if filters.get('department_id'):
+        query = query.where(User.department_id.in_(_parse_ids(filters['department_id'])))
+    if filters.get('team_id'):
+        query = query.where(User.team_id.in_(_parse_ids(filters['team_id'])))
+    if filters.get('is_active') not in (None, ''):
+        query = query.where(User.is_active == _parse_bool(filters['is_active']))
+    if filters.get('has_department') not in (None, ''):
+        has_department = _parse_bool(filters['has_department'])
+        query = query.where(User.department_id.isnot(None) if has_department else User.department_id.is_(None))
+
+    query = keyset_filter(query, [sort_key, User.id], decode_cursor(cursor), descending=descending)
+    order = [sort_key.desc(), User.id.desc()] if descending else [sort_key, User.id]
+    rows = db.session.execute(query.order_by(*order).limit(limit + 1)).all()
+
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]._mapping
+        next_cursor = encode_cursor([last['sort_value_'], last['sort_id_']])
+
+    return {
+        'users': [{f: row._mapping[f] for f in fields} for row in page],
+        'next_cursor': next_cursor,
+        'fields': fields,
+        'sort': sort,
+    }
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_users(q, limit=10, role=None, role_id=None, department_id=None, active_only=True):
+    """
+    Top matches for a typeahead query on name, username or company number
+
+    Substring matches (ILIKE) and fuzzy matches (the pg_trgm % operator) are
+    both answered from the idx_users_trgm_* GIN indexes, then ranked by the
+    best trigram similarity across the three columns, so the cost depends
+    on how many users match rather than on the size of the table.
+
+    Args:
+        q: Search text
+        limit: Maximum number of matches
+        role: Role name, or comma-separated names (e.g. 'operator')
+        role_id: Role id(s)
+        department_id: Department id(s)
+        active_only: Leave out inactive users
+
+    Returns:
+        List of dicts with the SEARCH_FIELDS
+    """
+    q = (q or '').strip()
+    if len(q) < MIN_SEARCH_LENGTH:
+        return []
+
+    pattern = f"%{_escape_like(q)}%"
+    full_name = func.coalesce(User.full_name, '')
+    company_number = func.coalesce(User.company_number, '')
+    score = func.greatest(
+        func.similarity(User.username, q),
+        func.similarity(full_name, q),
+        func.similarity(company_number, q),
+    )
+
+    query = select(*[DIRECTORY_FIELDS[f][0].label(f) for f in SEARCH_FIELDS]) \
+        .join(Role, Role.id == User.role_id) \
+        .outerjoin(Department, Department.id == User.department_id) \
+        .where(
+            User.is_deleted == False,
+            or_(
+                User.username.ilike(pattern),
+                User.full_name.ilike(pattern),
+                User.company_number.ilike(pattern),
+                User.username.op('%')(q),
+                User.full_name.op('%')(q),
+            )
+        )
+
+    if active_only:
+        query = query.where(User.is_active == True)
+    if role:
+        query = query.where(Role.name.in_([r.strip() for r in str(role).split(',') if r.strip()]))
+    if role_id:
+        query = query.where(User.role_id.in_(_parse_ids(role_id)))
+    if department_id:
+        query = query.where(User.department_id.in_(_parse_ids(department_id)))
+
+    # Exact company number hits first, then best similarity
+    exact = (func.lower(company_number) == q.lower())
+    rows = db.session.execute(
+        query.order_by(exact.desc(), score.desc(), User.username).limit(limit)
+    ).all()
+
+    return [{f: row._mapping[f] for f in SEARCH_FIELDS} for row in rows]